@@ -1,12 +1,10 @@
-from typing import List
-
-import pandas as pd
 import click
 import logging
 from dbtest.testdb import TestDb
 from sorsched import db, models
 from sorsched.data import Instrument
-from sorsched.models import Show, Slot, Student, ShowPreference, ShowInstrument, StudentInstrument, SlotAvailable
+from sorsched.ingest import load_signups
+from sorsched.models import Show, Slot, ShowInstrument
 from sorsched.views import run_optimization
 
 # shows
@@ -85,62 +83,18 @@ def populate_db(session):
     session.add_all(instruments + shows + slots + show_instruments)
 
 
-def parse_slot_availabilities(student_name,row)->List[SlotAvailable]:
-    x=[]
-    for col,slot_name in slot_map.items():
-        if row[col]<5:
-            x.append(SlotAvailable(student_name=student_name,slot_name=slot_name))
-    return x
-
-
-def parse_show_preferences(student_name,row)->List[ShowPreference]:
-    show_preferences=[]
-    raw_preference={}
-    n_shows = len(show_map)
-    for col, show in show_map.items():
-        p = n_shows + 1 -row[col]
-        raw_preference[col]=p
-
-    for col, show in show_map.items():
-        show_preferences.append(ShowPreference(student_name=student_name, show_name=show.name, preference=raw_preference[col]))
-    return show_preferences
-
-
-def load_preferences(session, file):
-    x=pd.read_csv(file,index_col='Name')
-    students = [Student(name=name) for name in x.index]
-
-    instrument_map = {
-        'G':Instrument.Guitar,
-        'B':Instrument.Bass,
-        'V':Instrument.Vocals,
-        'D':Instrument.Drums,
-        'K':Instrument.Keys,
-    }
-
-    show_preferences = []
-    student_instruments=[]
-    slot_availabilities=[]
-    for student_name,row in x.iterrows():
-        # show preferences
-        show_preferences+=parse_show_preferences(student_name=student_name,row=row)
-
-        # student instrument
-        instrument_name = instrument_map[row.Instrument[0]].value
-        student_instruments.append(StudentInstrument(student_name=student_name,instrument_name=instrument_name))
-
-        # slot availability
-        slot_availabilities+=parse_slot_availabilities(student_name=student_name,row=row)
-
-    session.add_all(students + show_preferences + student_instruments+ slot_availabilities)
-
+def load_preferences(session, file, chunksize=1000):
+    show_columns = dict([(col, show.name) for col, show in show_map.items()])
+    return load_signups(session=session, file=file, show_columns=show_columns, slot_columns=slot_map,
+                        chunksize=chunksize)
 
 
 @click.command()
 @click.option('--filename',default='signups.csv')
-def main(filename):
+@click.option('--chunksize',default=1000)
+def main(filename, chunksize):
     populate_db(db.session)
-    load_preferences(session=db.session,file=filename)
+    load_preferences(session=db.session,file=filename,chunksize=chunksize)
     run_optimization(db.session)
     db.session.commit()
 
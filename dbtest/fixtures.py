@@ -0,0 +1,71 @@
+import typing
+from typing import Tuple
+from unittest.mock import MagicMock
+
+from sorsched.data import Instrument, Slot, Student, Show
+from sorsched.input_config import ConfigImp
+
+
+def mock_config(preferences: typing.Dict[str, typing.Dict[str, float]],
+                instruments: typing.Dict[str, Instrument],
+                available_slots: typing.Dict[str, typing.List[str]],
+                show_min_max: typing.Dict[str, Tuple[int, int]],
+                slot_max_shows: typing.Dict[str, int],
+                instrument_bounds: typing.Dict[str, dict] = None) -> ConfigImp:
+    """
+    Build a config out of mocks for testing
+    """
+    instrument_bounds = instrument_bounds or {}
+    Show.__abstractmethods__ = frozenset()
+    shows = []
+    for show_name, min_max in show_min_max.items():
+        show = Show()
+        show.name = MagicMock(return_value=show_name)
+        show.student_min_max = MagicMock(return_value=min_max)
+        show.instrument_min_max = MagicMock(return_value=instrument_bounds.get(show_name, {}))
+        shows.append(show)
+
+    Slot.__abstractmethods__ = frozenset()
+    slots = []
+    for slot_name, max_shows in slot_max_shows.items():
+        slot = Slot()
+        slot.name = MagicMock(return_value=slot_name)
+        slot.max_shows = MagicMock(return_value=max_shows)
+        slots.append(slot)
+
+    Student.__abstractmethods__ = frozenset()
+    students = []
+    for student_name, student_preferences in preferences.items():
+        student = Student()
+        student.name = MagicMock(return_value=student_name)
+        student.instruments = MagicMock(return_value=[instruments[student_name]])
+        student.show_preferences = MagicMock(return_value=student_preferences)
+        student.available_slots = MagicMock(return_value=available_slots[student_name])
+        students.append(student)
+    return ConfigImp(shows=shows, slots=slots, students=students)
+
+
+def weekend_config() -> ConfigImp:
+    return mock_config(
+        preferences={
+            'Ramona': {'Led': 1, 'Met': 3, 'GNR': 2},
+            'Jennifer': {'Led': 3, 'Met': 1, 'GNR': 2},
+            'Chao': {'Led': 2, 'Met': 2, 'GNR': 3},
+            'Wes': {'Led': 3, 'Met': 2, 'GNR': 1},
+            'Ann': {'Led': 1, 'Met': 2, 'GNR': 3},
+        },
+        instruments={
+            'Ramona': Instrument.Vocals, 'Jennifer': Instrument.Drums, 'Chao': Instrument.Guitar,
+            'Wes': Instrument.Guitar, 'Ann': Instrument.Drums,
+        },
+        available_slots={
+            'Ramona': ['Wed', 'Sat-1', 'Sat-2'],
+            'Jennifer': ['Sat-1', 'Sat-2'],
+            'Chao': ['Wed'],
+            'Wes': ['Wed', 'Sat-1', 'Sat-2'],
+            'Ann': ['Wed', 'Sat-1', 'Sat-2'],
+        },
+        show_min_max={'Led': (1, 2), 'Met': (1, 2), 'GNR': (1, 2)},
+        slot_max_shows={'Wed': 1, 'Sat-1': 1, 'Sat-2': 1},
+        instrument_bounds={'GNR': {Instrument.Guitar: (1, 1)}},
+    )
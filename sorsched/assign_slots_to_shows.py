@@ -1,34 +1,231 @@
-import copy
 import typing
-from unittest.mock import MagicMock
+from collections import OrderedDict, Counter
+from math import factorial
 
-from sorsched.data import Show, SlotAssignment, Slot
+from sorsched.data import Show, SlotAssignment, Slot, Student, Instrument
+
+
+class PruningStats(object):
+    """
+    Counts what happened to the show->slot placements tried while enumerating slot assignments
+    """
+
+    def __init__(self):
+        self.placements = 0
+        # the slot already had its max shows
+        self.full = 0
+        # the slot's shows would need more students than are available in it
+        self.students = 0
+        # same for the players of an instrument
+        self.instruments = 0
+        self.yielded = 0
+
+    def pruned(self) -> int:
+        return self.students + self.instruments
+
+    def __repr__(self):
+        return '<PruningStats: placements={}, full={}, students={}, instruments={}, yielded={}>'.format(
+            self.placements, self.full, self.students, self.instruments, self.yielded)
+
+
+class SlotCapacity(object):
+    """
+    What is left of each slot as shows are placed during enumeration: room for more shows and, if students are
+    given, the students and players of each instrument available in the slot that the mins of its shows don't
+    already claim. A student can only be in one show, so a placement that leaves a count negative can't lead to a
+    feasible assignment
+    """
+
+    def __init__(self, slots: typing.List[Slot], shows: typing.List[Show], students: typing.List[Student] = None):
+        self.shows_left = dict([(slot.name(), slot.max_shows()) for slot in slots])
+        self.students_left = None
+        self.players_left = None
+        # show name -> student min, and instrument -> min for the instruments with one
+        self.needs = {}
+        if students is None:
+            return
+        self.students_left = dict([(slot.name(), 0) for slot in slots])
+        self.players_left = dict([(slot.name(), Counter()) for slot in slots])
+        for student in students:
+            for slot_name in student.available_slots():
+                if slot_name in self.students_left:
+                    self.students_left[slot_name] += 1
+                    self.players_left[slot_name].update(student.instruments())
+        for show in shows:
+            self.needs[show.name()] = (show.student_min_max()[0], dict(
+                [(instrument, lo) for instrument, (lo, _) in show.instrument_min_max().items() if lo > 0]))
+
+    def why_not(self, show_name: str, slot_name: str) -> typing.Optional[str]:
+        """
+        :param show_name:
+        :param slot_name:
+        :return: 'full', 'students' or 'instruments' if the show can't go to the slot, None if it can
+        """
+        if self.shows_left[slot_name] <= 0:
+            return 'full'
+        if self.students_left is None or show_name not in self.needs:
+            return None
+        min_students, min_players = self.needs[show_name]
+        if min_students > self.students_left[slot_name]:
+            return 'students'
+        players_left = self.players_left[slot_name]
+        if any(lo > players_left[instrument] for instrument, lo in min_players.items()):
+            return 'instruments'
+        return None
+
+    def place(self, show_name: str, slot_name: str, n=1):
+        """
+        :param show_name:
+        :param slot_name:
+        :param n: -1 to take the show back out
+        :return:
+        """
+        self.shows_left[slot_name] -= n
+        if self.students_left is None or show_name not in self.needs:
+            return
+        min_students, min_players = self.needs[show_name]
+        self.students_left[slot_name] -= n * min_students
+        for instrument, lo in min_players.items():
+            self.players_left[slot_name][instrument] -= n * lo
 
 
 def enumerate_slot_assignments(slots: typing.List[Slot], shows: typing.List[Show],
-                               initial_assignment: SlotAssignment = SlotAssignment()) -> typing.Iterable[
-    SlotAssignment]:
+                               initial_assignment: SlotAssignment = SlotAssignment(),
+                               students: typing.List[Student] = None,
+                               stats: PruningStats = None) -> typing.Iterable[SlotAssignment]:
     """
-    Assign days to shows. Obey max shows for each day.
+    Assign days to shows. Obey max shows for each day. With students, branches are also cut as soon as the shows of
+    a slot need more students, or players of an instrument, than are available in the slot
     :param initial_assignment:
     :param slots:
     :param shows:
+    :param students:
+    :param stats: filled with counts of placements tried and cut
     :return:
     """
+    stats = stats if stats is not None else PruningStats()
+    capacity = SlotCapacity(slots=slots, shows=shows, students=students)
+    show_slots = dict(initial_assignment.show_slots())
+    for show_name, slot_name in show_slots.items():
+        capacity.place(show_name, slot_name)
+    yield from _enumerate(slots=slots, shows=shows, capacity=capacity, show_slots=show_slots, stats=stats)
+
+
+def can_place(show: Show, slot: Slot, capacity: SlotCapacity, stats: PruningStats) -> bool:
+    stats.placements += 1
+    why_not = capacity.why_not(show.name(), slot.name())
+    if why_not is not None:
+        setattr(stats, why_not, getattr(stats, why_not) + 1)
+    return why_not is None
+
+
+def _enumerate(slots, shows, capacity: SlotCapacity, show_slots: typing.Dict[str, str], stats: PruningStats):
+    """
+    Depth first over the placements of the first show. capacity and show_slots are updated on the way down and
+    restored on the way back up, so nothing is copied until an assignment is yielded
+    """
     if len(shows) == 0:
-        yield initial_assignment
+        stats.yielded += 1
+        yield SlotAssignment(d=dict(show_slots))
         return
     show = shows[0]
     other_shows = shows[1:] if len(shows) > 1 else []
     for slot in slots:
-        if initial_assignment.num_shows(day_name=slot.name()) >= slot.max_shows():
+        if not can_place(show, slot, capacity=capacity, stats=stats):
             continue
-        assignment = copy.deepcopy(initial_assignment)
-        assignment.add(day_name=slot.name(), show_name=show.name())
-        yield from enumerate_slot_assignments(slots=slots, shows=other_shows, initial_assignment=assignment)
+        capacity.place(show.name(), slot.name())
+        show_slots[show.name()] = slot.name()
+        try:
+            yield from _enumerate(slots=slots, shows=other_shows, capacity=capacity, show_slots=show_slots,
+                                  stats=stats)
+        finally:
+            del show_slots[show.name()]
+            capacity.place(show.name(), slot.name(), n=-1)
+
+
+def slot_equivalence_classes(slots: typing.List[Slot], students: typing.List[Student]) -> typing.List[
+    typing.List[Slot]]:
+    """
+    Group slots that are interchangeable: same max shows and exactly the same students available.
+    Swapping two such slots in a slot assignment gives a subproblem with the same optimal utility
+    :param slots:
+    :param students:
+    :return: list of classes, each a list of slots in the original order
+    """
+    classes = OrderedDict()
+    for slot in slots:
+        available_students = frozenset(
+            [student.name() for student in students if slot.name() in student.available_slots()])
+        classes.setdefault((slot.max_shows(), available_students), []).append(slot)
+    return list(classes.values())
+
+
+def enumerate_canonical_slot_assignments(slots: typing.List[Slot], shows: typing.List[Show],
+                                         students: typing.List[Student], prune=True,
+                                         stats: PruningStats = None) -> typing.Iterable[
+    typing.Tuple[SlotAssignment, int]]:
+    """
+    Like enumerate_slot_assignments, but yield only one slot assignment for each set of assignments that differ by
+    swapping interchangeable slots. Within a class, slots are opened in order: a show may go to a slot already used or
+    to the first unused one. The yielded assignment is the first of its set in enumerate_slot_assignments order.
+    :param slots:
+    :param shows:
+    :param students:
+    :param prune: cut branches where a slot's shows need more students or players than it has, like
+    enumerate_slot_assignments
+    :param stats: filled with counts of placements tried and cut
+    :return: (slot assignment, number of raw slot assignments it stands for)
+    """
+    stats = stats if stats is not None else PruningStats()
+    capacity = SlotCapacity(slots=slots, shows=shows, students=students if prune else None)
+    classes = slot_equivalence_classes(slots=slots, students=students)
+    slot_class = {}
+    slot_rank = {}
+    for class_index, members in enumerate(classes):
+        for rank, slot in enumerate(members):
+            slot_class[slot.name()] = class_index
+            slot_rank[slot.name()] = rank
+
+    for assignment in _enumerate_canonical(slots=slots, shows=shows, slot_class=slot_class, slot_rank=slot_rank,
+                                           opened=(0,) * len(classes), capacity=capacity, show_slots={},
+                                           stats=stats):
+        used = set(assignment.show_slots().values())
+        multiplicity = 1
+        for members in classes:
+            n_used = len([slot for slot in members if slot.name() in used])
+            multiplicity *= factorial(len(members)) // factorial(len(members) - n_used)
+        yield assignment, multiplicity
+
+
+def _enumerate_canonical(slots, shows, slot_class, slot_rank, opened, capacity: SlotCapacity,
+                         show_slots: typing.Dict[str, str], stats: PruningStats):
+    if len(shows) == 0:
+        stats.yielded += 1
+        yield SlotAssignment(d=dict(show_slots))
+        return
+    show = shows[0]
+    other_shows = shows[1:] if len(shows) > 1 else []
+    for slot in slots:
+        class_index = slot_class[slot.name()]
+        rank = slot_rank[slot.name()]
+        if rank > opened[class_index]:
+            continue
+        if not can_place(show, slot, capacity=capacity, stats=stats):
+            continue
+        capacity.place(show.name(), slot.name())
+        show_slots[show.name()] = slot.name()
+        now_opened = opened[:class_index] + (max(opened[class_index], rank + 1),) + opened[class_index + 1:]
+        try:
+            yield from _enumerate_canonical(slots=slots, shows=other_shows, slot_class=slot_class,
+                                            slot_rank=slot_rank, opened=now_opened, capacity=capacity,
+                                            show_slots=show_slots, stats=stats)
+        finally:
+            del show_slots[show.name()]
+            capacity.place(show.name(), slot.name(), n=-1)
 
 
 def test_enumerate_day_assignments_1():
+    from unittest.mock import MagicMock
     Slot.__abstractmethods__ = frozenset()
     mon = Slot()
     mon.name = MagicMock(return_value='Mon')
@@ -52,6 +249,7 @@ def test_enumerate_day_assignments_1():
 
 
 def test_enumerate_day_assignments_2():
+    from unittest.mock import MagicMock
     Slot.__abstractmethods__ = frozenset()
     mon = Slot()
     mon.name = MagicMock(return_value='Mon')
@@ -71,3 +269,110 @@ def test_enumerate_day_assignments_2():
     assert len(result) == 2
     assert result[0].show_slot('Led') == 'Mon', result
     assert result[0].show_slot('Met') == 'Wed', result
+
+
+
+def test_enumerate_canonical_slot_assignments():
+    from unittest.mock import MagicMock
+    Slot.__abstractmethods__ = frozenset()
+    slots = []
+    for name in ['Wed', 'Sat-1', 'Sat-2']:
+        slot = Slot()
+        slot.name = MagicMock(return_value=name)
+        slot.max_shows = MagicMock(return_value=1)
+        slots.append(slot)
+
+    Show.__abstractmethods__ = frozenset()
+    led = Show()
+    led.name = MagicMock(return_value='Led')
+    met = Show()
+    met.name = MagicMock(return_value='Met')
+    shows = [led, met]
+    for show in shows:
+        show.student_min_max = MagicMock(return_value=(0, 5))
+        show.instrument_min_max = MagicMock(return_value={})
+
+    Student.__abstractmethods__ = frozenset()
+    ramona = Student()
+    ramona.name = MagicMock(return_value='Ramona')
+    ramona.available_slots = MagicMock(return_value=['Sat-1', 'Sat-2'])
+    chao = Student()
+    chao.name = MagicMock(return_value='Chao')
+    chao.available_slots = MagicMock(return_value=['Wed', 'Sat-1', 'Sat-2'])
+    students = [ramona, chao]
+
+    assert [[s.name() for s in c] for c in slot_equivalence_classes(slots, students)] == [['Wed'], ['Sat-1', 'Sat-2']]
+
+    raw = [x.show_slots() for x in enumerate_slot_assignments(slots, shows)]
+    result = [x for x in enumerate_canonical_slot_assignments(slots, shows, students)]
+    assert [x.show_slots() for x, _ in result] == [
+        {'Led': 'Wed', 'Met': 'Sat-1'},
+        {'Led': 'Sat-1', 'Met': 'Wed'},
+        {'Led': 'Sat-1', 'Met': 'Sat-2'},
+    ], result
+    assert [n for _, n in result] == [2, 2, 2]
+    assert sum([n for _, n in result]) == len(raw)
+
+
+def test_enumerate_slot_assignments_prunes():
+    from unittest.mock import MagicMock
+    Slot.__abstractmethods__ = frozenset()
+    slots = []
+    for name in ['Mon', 'Tue', 'Wed']:
+        slot = Slot()
+        slot.name = MagicMock(return_value=name)
+        slot.max_shows = MagicMock(return_value=2)
+        slots.append(slot)
+
+    Show.__abstractmethods__ = frozenset()
+    shows = []
+    for name, min_students, drums in [('Led', 2, 1), ('Met', 1, 2), ('GNR', 2, 0)]:
+        show = Show()
+        show.name = MagicMock(return_value=name)
+        show.student_min_max = MagicMock(return_value=(min_students, 5))
+        show.instrument_min_max = MagicMock(return_value={Instrument.Drums: (drums, 5)})
+        shows.append(show)
+
+    Student.__abstractmethods__ = frozenset()
+    students = []
+    for name, instrument, available_slots in [('Ramona', Instrument.Drums, ['Mon', 'Tue']),
+                                              ('Jennifer', Instrument.Drums, ['Mon', 'Wed']),
+                                              ('Chao', Instrument.Guitar, ['Mon', 'Tue', 'Wed']),
+                                              ('Wes', Instrument.Guitar, ['Tue'])]:
+        student = Student()
+        student.name = MagicMock(return_value=name)
+        student.instruments = MagicMock(return_value=[instrument])
+        student.available_slots = MagicMock(return_value=available_slots)
+        students.append(student)
+
+    def feasible_counts(show_slots):
+        # slot's shows can't claim more students or drummers than are available in the slot
+        for slot in slots:
+            here = [show for show in shows if show_slots[show.name()] == slot.name()]
+            available = [s for s in students if slot.name() in s.available_slots()]
+            drummers = [s for s in available if Instrument.Drums in s.instruments()]
+            if sum(show.student_min_max()[0] for show in here) > len(available):
+                return False
+            if sum(show.instrument_min_max()[Instrument.Drums][0] for show in here) > len(drummers):
+                return False
+        return True
+
+    raw_stats = PruningStats()
+    raw = [x.show_slots() for x in enumerate_slot_assignments(slots, shows, stats=raw_stats)]
+    stats = PruningStats()
+    pruned = [x.show_slots() for x in enumerate_slot_assignments(slots, shows, students=students, stats=stats)]
+    # same assignments as filtering afterwards, in the same order
+    assert pruned == [x for x in raw if feasible_counts(x)]
+    assert 0 < len(pruned) < len(raw)
+    # Met needs both drummers, and only Mon has them
+    assert set(x['Met'] for x in pruned) == {'Mon'}
+    assert stats.instruments > 0 and stats.students > 0
+    assert stats.yielded == len(pruned)
+    # the tree walked is smaller too
+    assert stats.placements < raw_stats.placements
+
+    canonical_stats = PruningStats()
+    canonical = [x.show_slots() for x, _ in
+                 enumerate_canonical_slot_assignments(slots, shows, students, stats=canonical_stats)]
+    assert canonical and all(x in pruned for x in canonical)
+    assert canonical_stats.pruned() > 0
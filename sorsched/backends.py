@@ -0,0 +1,442 @@
+import json
+import logging
+import math
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import traceback
+import typing
+from functools import partial
+from multiprocessing.connection import wait
+
+import numpy as np
+import pulp
+
+from sorsched.data import FixedDayInput, FixedSlotSolution, ShowAssignmentsImp, SlotAssignment
+from sorsched.fixed_day_input import FixedDayInputImp
+from sorsched.input_config import Config, ConfigImp
+from sorsched.highs_solver import ThreadSessions
+from sorsched.matrix_model import solve_fixed_day_matrix
+from sorsched.problem import Problem
+from sorsched.profiling import timer, count
+from sorsched.solver2 import TOLERANCE, SearchStats, solve_fixed_day, solve, solve_min_pref, \
+    get_fixed_day_configs
+
+logger = logging.getLogger(__name__)
+
+# name -> fixed-day solver, all with the interface of solve_fixed_day
+FIXED_DAY_BACKENDS = {
+    # CBC, with min-cost flow for subproblems without binding instrument bounds
+    'cbc': solve_fixed_day,
+    'cbc-milp': partial(solve_fixed_day, use_flow=False),
+    # HiGHS on the numpy matrices, no pulp model
+    'highs': solve_fixed_day_matrix,
+    # one in-process HiGHS model per thread, reused across slot assignments: no process spawn or model file
+    'highs-session': ThreadSessions(),
+}
+
+DEFAULT_PORTFOLIO = ('cbc', 'highs')
+
+
+def register_backend(name, fixed_day_solver):
+    FIXED_DAY_BACKENDS[name] = fixed_day_solver
+
+
+_pulp_backends_lock = threading.Lock()
+_pulp_backends_registered = False
+
+
+def register_pulp_backends():
+    """
+    Register every other MILP solver pulp finds installed, as pulp-<solver name>. Finding them runs the solver
+    binaries, so it's done once, and only when a backend is asked for that isn't registered yet
+    :return:
+    """
+    global _pulp_backends_registered
+    with _pulp_backends_lock:
+        if _pulp_backends_registered:
+            return
+        for solver_name in pulp.listSolvers(onlyAvailable=True):
+            if solver_name != pulp.PULP_CBC_CMD.name:
+                register_backend('pulp-{}'.format(solver_name.lower()),
+                                 partial(solve_fixed_day, use_flow=False, solver_name=solver_name))
+        _pulp_backends_registered = True
+
+
+def require_backends(names: typing.Iterable[str]):
+    """
+    Make sure the backends are registered, looking for pulp's solvers if some aren't
+    :param names:
+    :return:
+    """
+    if any(name not in FIXED_DAY_BACKENDS for name in names):
+        register_pulp_backends()
+
+
+def size_class(conf: FixedDayInput, min_weight=0) -> str:
+    """
+    Group of similar subproblems that backend wins are counted in: the number of student-show pairs that get a
+    variable, rounded up to a power of two, and whether any instrument bound binds
+    :param conf:
+    :param min_weight:
+    :return:
+    """
+    problem = conf.problem()
+    pairs = int((conf.available() & (problem.utility >= min_weight)).sum())
+    binding = 'binding' if problem.binding_instrument_bounds().any() else 'free'
+    return '{}-{}'.format(2 ** math.ceil(math.log2(max(pairs, 1))), binding)
+
+
+def is_proven(solution: FixedSlotSolution) -> bool:
+    """
+    Whether the solver proved the solution optimal, or proved there is none
+    :param solution:
+    :return:
+    """
+    bound = solution.bound() if isinstance(solution, ShowAssignmentsImp) else solution.utility()
+    return bound <= solution.utility() + TOLERANCE
+
+
+class BackendStats(object):
+    """
+    Which backend won the races on each size class. Kept in a JSON file if a path is given, so later runs can pick a
+    backend without racing
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path
+        self.lock = threading.Lock()
+        # size class -> backend -> wins and total seconds to win
+        self.wins = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.wins = json.load(f)
+
+    def record(self, size: str, backend: str, seconds: float):
+        with self.lock:
+            entry = self.wins.setdefault(size, {}).setdefault(backend, {'wins': 0, 'seconds': 0.})
+            entry['wins'] += 1
+            entry['seconds'] += seconds
+        self.save()
+
+    def races(self, size: str) -> int:
+        return sum(x['wins'] for x in self.wins.get(size, {}).values())
+
+    def best(self, size: str, min_races=5, backends=None) -> typing.Optional[str]:
+        """
+        Backend that won the most races of the size class, the faster one on ties
+        :param size:
+        :param min_races: None until this many races were won by the backends
+        :param backends: only consider these
+        :return:
+        """
+        entries = [(name, x) for name, x in self.wins.get(size, {}).items() if backends is None or name in backends]
+        if sum(x['wins'] for _, x in entries) < min_races:
+            return None
+        return max(entries, key=lambda e: (e[1]['wins'], -e[1]['seconds'] / e[1]['wins']))[0]
+
+    def save(self):
+        if not self.path:
+            return
+        with self.lock:
+            data = json.dumps(self.wins, indent=2, sort_keys=True)
+        # write to a temp file and rename, so readers never see half a file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(data)
+        os.replace(tmp, self.path)
+
+
+def start_method() -> str:
+    """
+    Never fork: the solvers run in job worker threads, and a forked child can hang on a lock another thread held
+    :return:
+    """
+    return 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+def _serve(connection, backend: str, conf: Config, problem: Problem):
+    """
+    Loop of a backend worker process: solve each (show slots, solver arguments) it is sent, and send back
+    (utility, assignments, bound), or the traceback if it failed. Backends registered with register_backend in the
+    parent process are not known here, pulp's are looked for again
+    """
+    require_backends([backend])
+    while True:
+        try:
+            show_slots, kwargs = connection.recv()
+        except EOFError:
+            return
+        try:
+            fixed_day_config = FixedDayInputImp(conf=conf, slot_assignment=SlotAssignment(d=show_slots),
+                                                problem=problem)
+            solution = FIXED_DAY_BACKENDS[backend](conf=fixed_day_config, **kwargs)
+            bound = solution.bound() if isinstance(solution, ShowAssignmentsImp) else solution.utility()
+            result = (solution.utility(), solution.student_show_assignment(), bound)
+        except Exception:
+            result = traceback.format_exc()
+        try:
+            connection.send(result)
+        except BrokenPipeError:
+            # the parent closed the portfolio while this one was still racing
+            return
+
+
+class BackendWorker(object):
+    """
+    Long-lived process that solves the subproblems of one Problem with one backend. It gets the config and Problem
+    once when it starts, and then only the show->slot mapping of each subproblem
+    """
+
+    def __init__(self, backend: str, context):
+        self.backend = backend
+        self.context = context
+        self.process = None
+        self.connection = None
+        self.problem = None
+        # still working on a subproblem nobody waits for anymore
+        self.busy = False
+
+    def start(self, conf: Config, problem: Problem):
+        self.stop()
+        self.connection, child = self.context.Pipe()
+        self.process = self.context.Process(target=_serve, args=(child, self.backend, conf, problem), daemon=True)
+        self.process.start()
+        child.close()
+        self.problem = problem
+
+    def submit(self, conf: Config, problem: Problem, show_slots: typing.Dict[str, str], kwargs: dict):
+        """
+        :param conf: snapshot sent to the process if it has to be started
+        :param problem:
+        :param show_slots:
+        :param kwargs: solver arguments
+        :return:
+        """
+        if self.busy:
+            if self.connection.poll():
+                # lost the last race, but is done with it
+                self.connection.recv()
+                self.busy = False
+            else:
+                count('portfolio_restarts')
+                self.stop()
+        if self.process is None or self.problem is not problem:
+            self.start(conf=conf, problem=problem)
+        self.connection.send((show_slots, kwargs))
+        self.busy = True
+
+    def receive(self):
+        """
+        :return: the result, or the error text if the process failed or died
+        """
+        try:
+            result = self.connection.recv()
+        except EOFError:
+            self.stop()
+            return 'backend {} died'.format(self.backend)
+        self.busy = False
+        return result
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join()
+            self.connection.close()
+        self.process = None
+        self.connection = None
+        self.problem = None
+        self.busy = False
+
+
+class PortfolioSolver(object):
+    """
+    Fixed-day solver that races several backends on the same subproblem, each in a long-lived worker process of its
+    own, and keeps the first answer that is proven optimal. The winner is recorded by size class in stats. A loser
+    still running when the next race starts is restarted. Workers are shared, so races run one at a time
+    """
+
+    def __init__(self, backends: typing.Sequence[str] = DEFAULT_PORTFOLIO, stats: BackendStats = None):
+        self.backends = list(backends)
+        self.stats = stats if stats is not None else BackendStats()
+        context = multiprocessing.get_context(start_method())
+        if start_method() == 'forkserver':
+            # the forkserver imports the solvers once, so workers start fast
+            context.set_forkserver_preload([__name__])
+        self.workers = [BackendWorker(backend, context=context) for backend in self.backends]
+        self.lock = threading.Lock()
+        # problem the workers were started with, and the config snapshot that goes with it
+        self.problem = None
+        self.conf = None
+
+    def __call__(self, conf: FixedDayInput, min_weight=0, cutoff=None,
+                 initial_assignments: typing.Dict[str, str] = None, time_limit=None, gap=None) -> FixedSlotSolution:
+        kwargs = dict([(k, v) for k, v in [('min_weight', min_weight), ('cutoff', cutoff),
+                                            ('initial_assignments', initial_assignments), ('time_limit', time_limit),
+                                            ('gap', gap)] if v is not None])
+        count('portfolio_races')
+        with self.lock, timer('portfolio'):
+            problem = conf.problem()
+            if problem is not self.problem:
+                # slots come with the Problem, the workers only need the shows and students
+                self.conf = ConfigImp.snapshot(ConfigImp(shows=conf.shows(), slots=[], students=conf.students()))
+                self.problem = problem
+            start = time.perf_counter()
+            running = {}
+            for worker in self.workers:
+                worker.submit(conf=self.conf, problem=problem, show_slots=conf.slot_assignment.show_slots(),
+                              kwargs=kwargs)
+                running[worker.connection] = worker
+            return self.race(conf, min_weight=min_weight, running=running, start=start)
+
+    def race(self, conf: FixedDayInput, min_weight, running: dict, start: float) -> FixedSlotSolution:
+        # best unproven answer, in case no backend proves one
+        fallback = None
+        error = None
+        while running:
+            for connection in wait(list(running)):
+                worker = running.pop(connection)
+                result = worker.receive()
+                if isinstance(result, str):
+                    logger.warning('Backend %s failed: %s', worker.backend, result)
+                    count('portfolio_failures')
+                    error = result
+                    continue
+                utility, assignments, bound = result
+                solution = ShowAssignmentsImp(utility=utility, assignments=assignments, bound=bound)
+                if is_proven(solution):
+                    self.stats.record(size_class(conf, min_weight=min_weight), backend=worker.backend,
+                                      seconds=time.perf_counter() - start)
+                    return solution
+                if fallback is None:
+                    fallback = solution
+                else:
+                    best = solution if utility > fallback.utility() else fallback
+                    fallback = ShowAssignmentsImp(utility=best.utility(),
+                                                  assignments=best.student_show_assignment(),
+                                                  bound=min(bound, fallback.bound()))
+        if fallback is None:
+            raise RuntimeError('Every backend failed, the last one with: {}'.format(error))
+        return fallback
+
+    def close(self):
+        with self.lock:
+            for worker in self.workers:
+                worker.stop()
+
+
+class AutoBackend(object):
+    """
+    Fixed-day solver that runs the backend that won the most portfolio races on subproblems of the same size class.
+    Races the portfolio until the size class has enough races to tell
+    """
+
+    def __init__(self, portfolio: PortfolioSolver, min_races=5):
+        self.portfolio = portfolio
+        self.min_races = min_races
+
+    def __call__(self, conf: FixedDayInput, min_weight=0, **kwargs) -> FixedSlotSolution:
+        backend = self.portfolio.stats.best(size_class(conf, min_weight=min_weight), min_races=self.min_races,
+                                            backends=self.portfolio.backends)
+        if backend is None:
+            return self.portfolio(conf=conf, min_weight=min_weight, **kwargs)
+        count('backend_{}'.format(backend))
+        return FIXED_DAY_BACKENDS[backend](conf=conf, min_weight=min_weight, **kwargs)
+
+
+def get_fixed_day_solver(backend: str, portfolio: typing.Sequence[str] = DEFAULT_PORTFOLIO,
+                         stats: BackendStats = None):
+    """
+    :param backend: name in FIXED_DAY_BACKENDS, 'portfolio' to race the portfolio on every subproblem, or 'auto' to
+    pick one of the portfolio's backends from past races
+    :param portfolio: backend names
+    :param stats: where races are recorded
+    :return: function (conf, min_weight, cutoff, initial_assignments, time_limit, gap) -> FixedSlotSolution
+    """
+    require_backends(portfolio if backend in ('portfolio', 'auto') else [backend])
+    if backend == 'portfolio':
+        return PortfolioSolver(backends=portfolio, stats=stats)
+    if backend == 'auto':
+        return AutoBackend(PortfolioSolver(backends=portfolio, stats=stats))
+    return FIXED_DAY_BACKENDS[backend]
+
+
+def solve_backend(conf: Config, backend='auto', portfolio: typing.Sequence[str] = DEFAULT_PORTFOLIO,
+                  backend_stats: BackendStats = None, stats: SearchStats = None) -> typing.Tuple[object, object]:
+    """
+    Same as solve, with the fixed-day subproblems solved by the backend
+    :param conf:
+    :param backend: see get_fixed_day_solver
+    :param portfolio:
+    :param backend_stats:
+    :param stats: search stats
+    :return:
+    """
+    fixed_day_solver = get_fixed_day_solver(backend, portfolio=portfolio, stats=backend_stats)
+    try:
+        return solve(conf, min_pref_solver=partial(solve_min_pref, fixed_day_solver=fixed_day_solver, stats=stats))
+    finally:
+        for portfolio_solver in [fixed_day_solver, getattr(fixed_day_solver, 'portfolio', None)]:
+            if isinstance(portfolio_solver, PortfolioSolver):
+                portfolio_solver.close()
+
+
+def test_portfolio_matches_cbc():
+    from dbtest.fixtures import weekend_config
+    conf = weekend_config()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'backends.json')
+        portfolio = PortfolioSolver(backends=['cbc-milp', 'highs'], stats=BackendStats(path))
+        configs = [c for _, c in get_fixed_day_configs(conf)]
+        pids = None
+        for fixed_day_config in configs:
+            expected = solve_fixed_day(fixed_day_config, min_weight=1)
+            assert portfolio(fixed_day_config, min_weight=1).utility() == expected.utility()
+            # a cutoff no solution reaches is proven too
+            assert portfolio(fixed_day_config, min_weight=1, cutoff=expected.utility() + 1).utility() == -np.inf
+            # the subproblems share one Problem, so the workers keep running, unless one lost a race still running
+            pids = pids or [w.process.pid for w in portfolio.workers]
+        assert len(set(pids)) == 2
+        portfolio.close()
+        assert all(w.process is None for w in portfolio.workers)
+        wins = BackendStats(path).wins
+        assert sum(x['wins'] for by_backend in wins.values() for x in by_backend.values()) == 2 * len(configs)
+        assert set(b for by_backend in wins.values() for b in by_backend) <= {'cbc-milp', 'highs'}
+
+
+def test_auto_backend():
+    from unittest.mock import patch
+    from dbtest.fixtures import weekend_config
+    conf = weekend_config()
+    fixed_day_config = next(c for _, c in get_fixed_day_configs(conf))
+    stats = BackendStats()
+    for _ in range(3):
+        stats.record(size_class(fixed_day_config, min_weight=1), backend='highs', seconds=0.1)
+    assert stats.best(size_class(fixed_day_config, min_weight=1), min_races=3) == 'highs'
+    assert stats.best(size_class(fixed_day_config, min_weight=1), min_races=4) is None
+
+    def fail(**kwargs):
+        raise AssertionError('should have picked highs')
+
+    auto = AutoBackend(PortfolioSolver(backends=['cbc', 'highs'], stats=stats), min_races=3)
+    with patch.dict(FIXED_DAY_BACKENDS, cbc=fail):
+        assert auto(fixed_day_config, min_weight=1).utility() == solve_fixed_day(fixed_day_config,
+                                                                                 min_weight=1).utility()
+    auto.portfolio.close()
+
+    _, expected = solve(conf)
+    _, solution = solve_backend(conf, backend='auto', backend_stats=BackendStats())
+    assert solution.utility() == expected.utility()
+
+
+def test_pulp_backends_registered_lazily():
+    from unittest.mock import patch
+    with patch.dict(FIXED_DAY_BACKENDS), patch(__name__ + '._pulp_backends_registered', False), \
+            patch('pulp.listSolvers', return_value=[pulp.PULP_CBC_CMD.name, 'GUROBI']) as list_solvers:
+        get_fixed_day_solver('highs')
+        assert not list_solvers.called
+        assert get_fixed_day_solver('pulp-gurobi') is FIXED_DAY_BACKENDS['pulp-gurobi']
+        get_fixed_day_solver('pulp-gurobi')
+        assert list_solvers.call_count == 1
@@ -0,0 +1,251 @@
+import json
+import platform
+import resource
+import time
+import tracemalloc
+import typing
+from datetime import datetime, timezone
+from functools import partial
+from itertools import product
+
+import click
+import highspy
+import numpy as np
+
+from sorsched.assign_slots_to_shows import enumerate_slot_assignments, enumerate_canonical_slot_assignments, \
+    PruningStats
+from sorsched.backends import solve_backend
+from sorsched.data import Instrument, ShowSnapshot, SlotSnapshot, StudentSnapshot
+from sorsched.heuristic import solve_heuristic
+from sorsched.highs_solver import solve_highs
+from sorsched.input_config import ConfigImp
+from sorsched.matrix_model import build_fixed_day_model, fixed_day_arrays, solve_matrix
+from sorsched.problem import Problem
+from sorsched.profiling import profile_run
+from sorsched.solver2 import SOLVERS, get_fixed_day_configs, SearchStats
+
+# share of each instrument in signups.csv
+INSTRUMENT_WEIGHTS = {
+    Instrument.Guitar: 12,
+    Instrument.Drums: 10,
+    Instrument.Vocals: 3,
+    Instrument.Bass: 2,
+    Instrument.Keys: 1,
+}
+
+BENCHMARK_SOLVERS = dict(SOLVERS, highs=solve_highs, matrix=solve_matrix, heuristic=solve_heuristic,
+                         portfolio=partial(solve_backend, backend='portfolio'))
+
+
+def synthetic_config(n_students, n_shows, n_slots, max_shows=1, availability=0.8, seed=0) -> ConfigImp:
+    """
+    Random config shaped like signups.csv: every student ranks all the shows, plays one instrument and can make each
+    slot with probability availability. Shows need guitars and drums like in bin/winter-2017.py, scaled down when
+    there are too few students to go around
+    :param n_students:
+    :param n_shows:
+    :param n_slots:
+    :param max_shows: max shows per slot
+    :param availability:
+    :param seed:
+    :return:
+    """
+    random = np.random.RandomState(seed)
+    show_names = ['Show {}'.format(j + 1) for j in range(n_shows)]
+    slot_names = ['Slot {}'.format(k + 1) for k in range(n_slots)]
+    instruments = list(INSTRUMENT_WEIGHTS.keys())
+    weights = np.array(list(INSTRUMENT_WEIGHTS.values()), dtype=float)
+    weights /= weights.sum()
+
+    per_show = n_students / n_shows
+    student_min_max = (int(per_show // 2), int(np.ceil(per_show * 1.5)) + 1)
+    instrument_min_max = {}
+    for instrument in [Instrument.Guitar, Instrument.Drums]:
+        share = per_show * INSTRUMENT_WEIGHTS[instrument] / sum(INSTRUMENT_WEIGHTS.values())
+        instrument_min_max[instrument] = (min(2, int(share // 2)), student_min_max[1])
+    shows = [ShowSnapshot(name=name, student_min_max=student_min_max, instrument_min_max=dict(instrument_min_max))
+             for name in show_names]
+    slots = [SlotSnapshot(name=name, max_shows=max_shows) for name in slot_names]
+
+    students = []
+    for i in range(n_students):
+        # rank 1 is the favorite, and gets the highest preference
+        ranks = random.permutation(n_shows) + 1
+        available = random.rand(n_slots) < availability
+        if not available.any():
+            available[random.randint(n_slots)] = True
+        students.append(StudentSnapshot(
+            name='Student {}'.format(i + 1),
+            show_preferences=dict([(name, n_shows + 1 - int(rank)) for name, rank in zip(show_names, ranks)]),
+            available_slots=[name for name, a in zip(slot_names, available) if a],
+            instruments=[instruments[random.choice(len(instruments), p=weights)]]))
+    return ConfigImp(shows=shows, slots=slots, students=students)
+
+
+def measure(fn, trace_memory=True) -> typing.Tuple[object, float, typing.Optional[int]]:
+    """
+    :param fn: function () -> result
+    :param trace_memory: also record the peak python memory allocated while fn runs. Slows fn down
+    :return: result, wall seconds, peak bytes or None
+    """
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = fn()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def solve_models(models) -> int:
+    """
+    Solve already built fixed-day models with HiGHS
+    :param models:
+    :return: number that were optimal
+    """
+    n_optimal = 0
+    for model in models:
+        highs = highspy.Highs()
+        highs.setOptionValue('output_flag', False)
+        highs.passModel(model.to_highs())
+        highs.run()
+        n_optimal += highs.getModelStatus() == highspy.HighsModelStatus.kOptimal
+    return n_optimal
+
+
+def run_instance(n_students, n_shows, n_slots, max_shows, seed=0, solver='matrix', sample=20,
+                 trace_memory=True) -> dict:
+    """
+    Time each phase of solving one synthetic instance
+    :param n_students:
+    :param n_shows:
+    :param n_slots:
+    :param max_shows:
+    :param seed:
+    :param solver: name in BENCHMARK_SOLVERS used for the end-to-end solve
+    :param sample: number of fixed-day subproblems to build and solve on their own
+    :param trace_memory:
+    :return:
+    """
+    conf = synthetic_config(n_students=n_students, n_shows=n_shows, n_slots=n_slots, max_shows=max_shows, seed=seed)
+    timings = {}
+    peak_memory = {}
+
+    def phase(name, fn):
+        result, timings[name], peak_memory[name] = measure(fn, trace_memory=trace_memory)
+        return result
+
+    problem = phase('problem', lambda: Problem.from_config(conf))
+    n_slot_assignments = phase('enumerate', lambda: sum(
+        1 for _ in enumerate_slot_assignments(slots=conf.slots(), shows=conf.shows())))
+    pruning = PruningStats()
+    n_canonical = phase('enumerate_canonical', lambda: sum(1 for _ in enumerate_canonical_slot_assignments(
+        slots=conf.slots(), shows=conf.shows(), students=conf.students(), stats=pruning)))
+
+    fixed_day_configs = [c for _, (_, c) in zip(range(sample), get_fixed_day_configs(conf, problem=problem))]
+    models = phase('model_build', lambda: [build_fixed_day_model(fixed_day_arrays(c), min_weight=1)
+                                           for c in fixed_day_configs])
+    n_optimal = phase('fixed_day_solve', lambda: solve_models(models))
+    summary = phase('solve', lambda: profile_run(lambda conf, stats: BENCHMARK_SOLVERS[solver](conf), conf=conf,
+                                                 stats=SearchStats()))
+    solution = summary.solution
+
+    return {
+        'n_students': n_students,
+        'n_shows': n_shows,
+        'n_slots': n_slots,
+        'max_shows': max_shows,
+        'seed': seed,
+        'solver': solver,
+        'n_slot_assignments': n_slot_assignments,
+        'n_canonical': n_canonical,
+        'n_pruned_placements': pruning.pruned(),
+        'n_sampled': len(models),
+        'n_sampled_optimal': int(n_optimal),
+        'mean_cols': float(np.mean([m.num_cols() for m in models])) if models else 0.,
+        'mean_rows': float(np.mean([m.num_rows() for m in models])) if models else 0.,
+        'utility': solution.utility() if solution.utility() > -np.inf else None,
+        'seconds': timings,
+        'peak_memory': peak_memory,
+        # where the end-to-end solve spent its time
+        'solve_timers': dict(summary.timers),
+        'solve_counters': dict(summary.counters),
+    }
+
+
+def run_benchmark(students: typing.List[int], shows: typing.List[int], slots: typing.List[int],
+                  max_shows: typing.List[int], seeds: typing.List[int], solver='matrix', sample=20,
+                  trace_memory=True) -> dict:
+    """
+    Run every combination of sizes. Combinations where the slots can't hold all the shows are skipped
+    :return: results, ready to be dumped as JSON
+    """
+    results = []
+    for n_students, n_shows, n_slots, n_max_shows, seed in product(students, shows, slots, max_shows, seeds):
+        if n_slots * n_max_shows < n_shows:
+            continue
+        results.append(run_instance(n_students=n_students, n_shows=n_shows, n_slots=n_slots, max_shows=n_max_shows,
+                                    seed=seed, solver=solver, sample=sample, trace_memory=trace_memory))
+    return {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'trace_memory': trace_memory,
+        # kilobytes on linux
+        'max_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'results': results,
+    }
+
+
+def int_list(ctx, param, value) -> typing.List[int]:
+    return [int(x) for x in value.split(',')]
+
+
+@click.command()
+@click.option('--students', default='30,60', callback=int_list, help='comma separated sizes')
+@click.option('--shows', default='4,5', callback=int_list)
+@click.option('--slots', default='4', callback=int_list)
+@click.option('--max-shows', default='1,2', callback=int_list)
+@click.option('--seeds', default='0', callback=int_list)
+@click.option('--solver', default='matrix', type=click.Choice(sorted(BENCHMARK_SOLVERS.keys())))
+@click.option('--sample', default=20, help='fixed-day subproblems to time on their own')
+@click.option('--trace-memory/--no-trace-memory', default=True)
+@click.option('--output', '-o', default='benchmark.json', type=click.File('w'))
+def main(students, shows, slots, max_shows, seeds, solver, sample, trace_memory, output):
+    results = run_benchmark(students=students, shows=shows, slots=slots, max_shows=max_shows, seeds=seeds,
+                            solver=solver, sample=sample, trace_memory=trace_memory)
+    json.dump(results, output, indent=2)
+    output.write('\n')
+
+
+def test_synthetic_config():
+    conf = synthetic_config(n_students=100, n_shows=4, n_slots=5, seed=1)
+    again = synthetic_config(n_students=100, n_shows=4, n_slots=5, seed=1)
+    assert [s.show_preferences() for s in conf.students()] == [s.show_preferences() for s in again.students()]
+    for student in conf.students():
+        assert sorted(student.show_preferences().values()) == [1, 2, 3, 4]
+        assert len(student.instruments()) == 1
+        assert student.available_slots()
+    problem = Problem.from_config(conf)
+    assert 0.7 < problem.available.mean() < 0.9
+
+
+def test_run_benchmark():
+    results = run_benchmark(students=[12], shows=[3], slots=[2, 3], max_shows=[1], seeds=[0], sample=3)
+    # 2 slots can't hold 3 shows
+    assert len(results['results']) == 1
+    result = json.loads(json.dumps(results))['results'][0]
+    assert result['n_slot_assignments'] == 6
+    assert result['n_sampled'] == min(3, result['n_canonical'])
+    assert set(result['seconds'].keys()) == {'problem', 'enumerate', 'enumerate_canonical', 'model_build',
+                                             'fixed_day_solve', 'solve'}
+    assert all(peak > 0 for peak in result['peak_memory'].values())
+    assert result['solve_counters']['fixed_day_solves'] > 0
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import typing
+from collections import OrderedDict
+
+import numpy as np
+
+from sorsched.data import FixedDayInput, FixedSlotSolution, ShowAssignmentsImp
+from sorsched.matrix_model import fixed_day_arrays, FixedDayArrays
+from sorsched.solver2 import solve_fixed_day, get_fixed_day_configs
+
+
+def subproblem_key(arrays: FixedDayArrays, min_weight) -> str:
+    """
+    Hash of everything the fixed-day solution depends on. Utilities of pairs that can't be assigned (student not
+    available, or below min weight) don't matter, so they are blanked out first
+    :param arrays:
+    :param min_weight:
+    :return:
+    """
+    allowed = arrays.available & (arrays.utility >= min_weight)
+    utility = np.where(allowed, arrays.utility, -np.inf)
+    h = hashlib.sha256()
+    h.update(repr((utility.shape, arrays.plays.shape, float(min_weight))).encode())
+    for a in [utility, arrays.plays, arrays.student_min_max, arrays.instrument_min_max]:
+        h.update(np.ascontiguousarray(a, dtype=float).tobytes())
+    return h.hexdigest()
+
+
+class FixedDayCache(object):
+    """
+    Wraps a fixed-day solver and remembers its results by the content of the subproblem, so identical subproblems are
+    solved once. Results are kept by student and show index, and named with the config they are looked up for.
+    Keeps the most recently used results in memory, and all of them in a directory if one is given
+    """
+
+    def __init__(self, fixed_day_solver=None, maxsize=1024, directory: str = None):
+        self.fixed_day_solver = fixed_day_solver or solve_fixed_day
+        self.maxsize = maxsize
+        self.directory = directory
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, conf: FixedDayInput, min_weight=0, cutoff=None,
+                 initial_assignments: typing.Dict[str, str] = None, time_limit=None, gap=None) -> FixedSlotSolution:
+        key = subproblem_key(fixed_day_arrays(conf), min_weight=min_weight)
+        result = self.get(key)
+        if result is None:
+            limits = dict([(k, v) for k, v in [('time_limit', time_limit), ('gap', gap)] if v is not None])
+            solution = self.fixed_day_solver(conf=conf, min_weight=min_weight, cutoff=cutoff,
+                                             initial_assignments=initial_assignments, **limits)
+            if cutoff is not None and solution.utility() == -np.inf:
+                # might just be worse than the cutoff
+                return solution
+            if limits:
+                # might not be optimal
+                return solution
+            result = (solution.utility(), self.to_indexes(conf, solution))
+            self.put(key, result)
+        else:
+            self.hits += 1
+
+        utility, pairs = result
+        if cutoff is not None and utility < cutoff:
+            return ShowAssignmentsImp(utility=-np.inf)
+        return conf.problem().to_solution(utility=utility, students=[i for i, _ in pairs],
+                                          shows=[j for _, j in pairs])
+
+    @classmethod
+    def to_indexes(cls, conf: FixedDayInput, solution: FixedSlotSolution) -> typing.List[typing.Tuple[int, int]]:
+        if solution.utility() == -np.inf:
+            return []
+        problem = conf.problem()
+        return [(problem.student_ids[student_name], problem.show_ids[show_name]) for student_name, show_name in
+                solution.student_show_assignment().items()]
+
+    def get(self, key):
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                return self.memory[key]
+        result = self.read(key)
+        if result is None:
+            self.misses += 1
+            return None
+        with self.lock:
+            self.remember(key, result)
+        return result
+
+    def put(self, key, result):
+        with self.lock:
+            self.remember(key, result)
+        self.write(key, result)
+
+    def remember(self, key, result):
+        self.memory[key] = result
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.maxsize:
+            self.memory.popitem(last=False)
+
+    def path(self, key) -> str:
+        return os.path.join(self.directory, '{}.json'.format(key))
+
+    def read(self, key):
+        if not self.directory or not os.path.exists(self.path(key)):
+            return None
+        with open(self.path(key)) as f:
+            x = json.load(f)
+        return x['utility'], [tuple(pair) for pair in x['assignments']]
+
+    def write(self, key, result):
+        if not self.directory:
+            return
+        utility, pairs = result
+        # write to a temp file and rename, so readers never see half a file
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'utility': utility, 'assignments': [[int(i), int(j)] for i, j in pairs]}, f)
+        os.replace(tmp, self.path(key))
+
+
+def test_fixed_day_cache():
+    from dbtest.fixtures import weekend_config
+    conf = weekend_config()
+    with tempfile.TemporaryDirectory() as directory:
+        cache = FixedDayCache(maxsize=2, directory=directory)
+        configs = [fixed_day_config for _, fixed_day_config in get_fixed_day_configs(conf, symmetric=False)]
+        for fixed_day_config in configs:
+            expected = solve_fixed_day(fixed_day_config, min_weight=1)
+            result = cache(fixed_day_config, min_weight=1)
+            assert result.utility() == expected.utility()
+            assert result.student_show_assignment() == expected.student_show_assignment()
+        # Sat-1 and Sat-2 have the same students, so swapping them gives the same subproblem
+        assert cache.hits > 0
+        assert len(cache.memory) == 2
+
+        # a fresh cache finds everything on disk
+        def fail(**kwargs):
+            raise AssertionError('should have been read from disk')
+
+        cache = FixedDayCache(fixed_day_solver=fail, directory=directory)
+        for fixed_day_config in configs:
+            assert cache(fixed_day_config, min_weight=1).utility() == solve_fixed_day(fixed_day_config,
+                                                                                      min_weight=1).utility()
@@ -1,54 +1,57 @@
 from dbtest.testdb import TestDb
 from sorsched import db, models
 from sorsched.data import Instrument
-from sorsched.models import Show, Slot, Student, ShowPreference, ShowInstrument, StudentInstrument, SlotAvailable
+from sorsched.models import Show, Slot, Student, ShowPreference, ShowInstrument, StudentInstrument, SlotAvailable, \
+    DEFAULT_PROGRAM
 
 
-def seed(session):
-    # instruments
+def seed(session, program=DEFAULT_PROGRAM):
+    # instruments, shared by all programs
+    existing = set([x.name for x in session.query(models.Instrument.name)])
     instruments =[]
     for instrument in Instrument:
-        instruments.append(models.Instrument(name=instrument.value))
+        if instrument.value not in existing:
+            instruments.append(models.Instrument(name=instrument.value))
 
     # shows
-    led = Show(name='Led Zeppelin', min_students=1, max_students=2)
-    met = Show(name='Metallica', min_students=1, max_students=2)
+    led = Show(name='Led Zeppelin', min_students=1, max_students=2, program=program)
+    met = Show(name='Metallica', min_students=1, max_students=2, program=program)
     shows = [led, met]
 
     show_instruments = []
     for show in shows:
         for instrument in Instrument:
-            show_instruments.append(ShowInstrument(show_name=show.name,instrument_name=instrument.value,min_instruments=0,max_instruments=100))
+            show_instruments.append(ShowInstrument(show_name=show.name,instrument_name=instrument.value,min_instruments=0,max_instruments=100,program=program))
 
-    wed = Slot(name='Wed', max_shows=1)
-    sat1 = Slot(name='Sat-1', max_shows=1)
-    sat2 = Slot(name='Sat-2', max_shows=1)
+    wed = Slot(name='Wed', max_shows=1, program=program)
+    sat1 = Slot(name='Sat-1', max_shows=1, program=program)
+    sat2 = Slot(name='Sat-2', max_shows=1, program=program)
     slots = [wed,sat1,sat2]
 
-    ramona = Student(name='Ramona')
-    jennifer = Student(name='Jennifer')
-    chao = Student(name='Chao')
+    ramona = Student(name='Ramona', program=program)
+    jennifer = Student(name='Jennifer', program=program)
+    chao = Student(name='Chao', program=program)
     students = [ramona,jennifer,chao]
 
     show_preferences = [
-        ShowPreference(student_name=ramona.name, show_name=led.name, preference=1),
-        ShowPreference(student_name=ramona.name, show_name=met.name, preference=3),
-        ShowPreference(student_name=jennifer.name, show_name=led.name, preference=4),
-        ShowPreference(student_name=jennifer.name, show_name=met.name, preference=0),
-        ShowPreference(student_name=chao.name, show_name=led.name, preference=2),
-        ShowPreference(student_name=chao.name, show_name=met.name, preference=2)
+        ShowPreference(student_name=ramona.name, show_name=led.name, preference=1, program=program),
+        ShowPreference(student_name=ramona.name, show_name=met.name, preference=3, program=program),
+        ShowPreference(student_name=jennifer.name, show_name=led.name, preference=4, program=program),
+        ShowPreference(student_name=jennifer.name, show_name=met.name, preference=0, program=program),
+        ShowPreference(student_name=chao.name, show_name=led.name, preference=2, program=program),
+        ShowPreference(student_name=chao.name, show_name=met.name, preference=2, program=program)
     ]
 
     student_instruments = [
-        StudentInstrument(student_name=ramona.name, instrument_name=Instrument.Vocals.value),
-        StudentInstrument(student_name=jennifer.name, instrument_name=Instrument.Drums.value),
-        StudentInstrument(student_name=chao.name, instrument_name=Instrument.Guitar.value)
+        StudentInstrument(student_name=ramona.name, instrument_name=Instrument.Vocals.value, program=program),
+        StudentInstrument(student_name=jennifer.name, instrument_name=Instrument.Drums.value, program=program),
+        StudentInstrument(student_name=chao.name, instrument_name=Instrument.Guitar.value, program=program)
     ]
 
     slot_availabilities = []
     for student in students:
         for slot in slots:
-            slot_availabilities.append(SlotAvailable(student_name=student.name, slot_name=slot.name))
+            slot_availabilities.append(SlotAvailable(student_name=student.name, slot_name=slot.name, program=program))
 
     session.add_all(instruments + shows + slots + students + show_instruments + show_preferences + student_instruments+ slot_availabilities)
 
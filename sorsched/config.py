@@ -4,5 +4,25 @@ SQLALCHEMY_DATABASE_URI = os.environ['SCHEDULER_DB_URL']
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 WTF_CSRF_ENABLED = True
 SECRET_KEY = 'you-will-never-guess'
+# enumerate is the one that goes through the fixed-day cache and backend, and reports progress; see views.get_solver
+SOLVER_METHOD = os.environ.get('SCHEDULER_SOLVER', 'enumerate')
+SOLVER_WORKERS = int(os.environ.get('SCHEDULER_SOLVER_WORKERS', os.cpu_count()))
+SOLVER_CACHE_SIZE = int(os.environ.get('SCHEDULER_SOLVER_CACHE_SIZE', 4096))
+SOLVER_CACHE_DIR = os.environ.get('SCHEDULER_SOLVER_CACHE_DIR')
+# fixed-day backend of the enumerate and anytime solvers: a name in backends.FIXED_DAY_BACKENDS, portfolio or auto
+# the default keeps one in-process HiGHS model per job thread, so no CBC process or model file per subproblem
+SOLVER_BACKEND = os.environ.get('SCHEDULER_SOLVER_BACKEND', 'highs-session')
+SOLVER_PORTFOLIO = os.environ.get('SCHEDULER_SOLVER_PORTFOLIO', 'cbc,highs').split(',')
+# JSON file with the portfolio's wins, for auto to pick from on later runs
+SOLVER_BACKEND_STATS = os.environ.get('SCHEDULER_SOLVER_BACKEND_STATS')
+# seconds and relative gap for the anytime solver
+SOLVER_TIME_LIMIT = float(os.environ.get('SCHEDULER_SOLVER_TIME_LIMIT', 60))
+SOLVER_GAP = float(os.environ['SCHEDULER_SOLVER_GAP']) if 'SCHEDULER_SOLVER_GAP' in os.environ else None
+# solves don't preempt each other, so fairness between programs needs at least 2: one is always kept free of the
+# program holding the others
+JOB_WORKERS = int(os.environ.get('SCHEDULER_JOB_WORKERS', 2))
+# most workers one program's jobs may hold at once, 0 for all but one of them
+JOB_WORKERS_PER_PROGRAM = int(os.environ.get('SCHEDULER_JOB_WORKERS_PER_PROGRAM', 0)) or None
+STUDENTS_PER_PAGE = int(os.environ.get('SCHEDULER_STUDENTS_PER_PAGE', 50))
 
 
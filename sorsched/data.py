@@ -79,6 +79,26 @@ class SlotImp(Slot):
         return self.model.max_shows
 
 
+class SlotSnapshot(Slot):
+    """
+    Plain copy of a slot with no database objects behind it, so it can be pickled
+    """
+
+    def __init__(self, name: str, max_shows: int):
+        self._name = name
+        self._max_shows = max_shows
+
+    @classmethod
+    def from_slot(cls, slot: Slot):
+        return cls(name=slot.name(), max_shows=slot.max_shows())
+
+    def name(self) -> str:
+        return self._name
+
+    def max_shows(self) -> int:
+        return self._max_shows
+
+
 class Student(metaclass=ABCMeta):
     """
     Represents student data object, with some convenience methods
@@ -126,6 +146,36 @@ class StudentImp(Student):
         pass
 
 
+class StudentSnapshot(Student):
+    """
+    Plain copy of a student with no database objects behind it, so it can be pickled
+    """
+
+    def __init__(self, name: str, show_preferences: Dict[str, float], available_slots: List[str],
+                 instruments: Tuple[Instrument]):
+        self._name = name
+        self._show_preferences = show_preferences
+        self._available_slots = available_slots
+        self._instruments = instruments
+
+    @classmethod
+    def from_student(cls, student: Student):
+        return cls(name=student.name(), show_preferences=dict(student.show_preferences()),
+                   available_slots=list(student.available_slots()), instruments=tuple(student.instruments()))
+
+    def show_preferences(self) -> Dict[str, float]:
+        return self._show_preferences
+
+    def available_slots(self) -> List[str]:
+        return self._available_slots
+
+    def instruments(self) -> Tuple[Instrument]:
+        return self._instruments
+
+    def name(self) -> str:
+        return self._name
+
+
 class Show(metaclass=ABCMeta):
     @abstractmethod
     def name(self) -> str:
@@ -158,10 +208,35 @@ class ShowImp(Show):
     def build_instrument_min_max(cls, model: models.Show):
         x = {}
         for imm in model.instrument_min_max:
-            x[imm.instrument_name] = (imm.min_instruments, imm.max_instruments)
+            x[Instrument(imm.instrument_name)] = (imm.min_instruments, imm.max_instruments)
         return x
 
 
+class ShowSnapshot(Show):
+    """
+    Plain copy of a show with no database objects behind it, so it can be pickled
+    """
+
+    def __init__(self, name: str, student_min_max: Tuple[int, int], instrument_min_max: dict):
+        self._name = name
+        self._student_min_max = student_min_max
+        self._instrument_min_max = instrument_min_max
+
+    @classmethod
+    def from_show(cls, show: Show):
+        return cls(name=show.name(), student_min_max=tuple(show.student_min_max()),
+                   instrument_min_max=dict(show.instrument_min_max()))
+
+    def student_min_max(self) -> Tuple[int, int]:
+        return self._student_min_max
+
+    def name(self) -> str:
+        return self._name
+
+    def instrument_min_max(self) -> dict:
+        return self._instrument_min_max
+
+
 class FixedSlotSolution(metaclass=ABCMeta):
     """
     Represents solution of optimization. Specifies show-slot assignments and student-show assignments
@@ -183,9 +258,17 @@ class ShowAssignmentsImp(FixedSlotSolution):
     def utility(self) -> float:
         return self._utility
 
-    def __init__(self, utility=None, assignments: Dict[str, str] = None):
+    def bound(self) -> float:
+        """
+        Best utility the solver could not rule out. Same as the utility unless it stopped early on a time limit or gap
+        :return:
+        """
+        return self._bound if self._bound is not None else self._utility
+
+    def __init__(self, utility=None, assignments: Dict[str, str] = None, bound=None):
         self._utility = utility
         self._assignments = assignments
+        self._bound = bound
 
     def __repr__(self):
         return '<ShowAssigmentsImp: utility={:.1f}, assignments={}>'.format(self._utility, self._assignments)
@@ -208,4 +291,26 @@ class FixedDayInput(metaclass=ABCMeta):
     def is_available(self, student_index, show_index) -> bool:
         pass
 
+    @abstractmethod
+    def available(self):
+        """
+        :return: students x shows boolean array, whether the student can make the show's slot
+        """
+        pass
+
+    @abstractmethod
+    def eligible_students(self, show_index):
+        """
+        :param show_index:
+        :return: indexes of the students who can make the show's slot
+        """
+        pass
+
+    @abstractmethod
+    def problem(self):
+        """
+        :return: the whole config as a Problem, with the same student and show indexes
+        """
+        pass
+
 
@@ -1,19 +1,32 @@
 from typing import List
 
+import numpy as np
+
 from sorsched.data import FixedDayInput, SlotAssignment, Student, Show
 from sorsched.input_config import Config
+from sorsched.problem import Problem
 
 
 class FixedDayInputImp(FixedDayInput):
     """
     Represents student/show availability. This is a subset of the original config that is consistent with
-    students' day availabilities
+    students' day availabilities. The student x show availability mask and the students available for each show are
+    worked out once, from the student x slot availability and the show->slot mapping
     """
 
-    def __init__(self, conf: Config, slot_assignment: SlotAssignment):
+    def __init__(self, conf: Config, slot_assignment: SlotAssignment, problem: Problem = None):
+        """
+        :param conf:
+        :param slot_assignment:
+        :param problem: array form of conf, shared by all the slot assignments of one config. Built if not given
+        """
         self._shows = conf.shows()
         self._students = conf.students()
+        self._problem = problem if problem is not None else Problem.from_config(conf)
         self.slot_assignment = slot_assignment
+        self._available = self._problem.availability(slot_assignment)
+        self._available.setflags(write=False)
+        self._eligible_students = [np.flatnonzero(column) for column in self._available.T]
 
     def students(self) -> List[Student]:
         return self._students
@@ -21,9 +34,17 @@ class FixedDayInputImp(FixedDayInput):
     def shows(self) -> List[Show]:
         return self._shows
 
+    def problem(self) -> Problem:
+        return self._problem
+
     def utility(self, student_index, show_index):
-        show_name = self.shows()[show_index].name()
-        return self.students()[student_index].show_preferences()[show_name]
+        return float(self._problem.utility[student_index, show_index])
+
+    def available(self) -> np.ndarray:
+        return self._available
+
+    def eligible_students(self, show_index) -> np.ndarray:
+        return self._eligible_students[show_index]
 
     def is_available(self, student_index, show_index) -> bool:
         """
@@ -32,6 +53,4 @@ class FixedDayInputImp(FixedDayInput):
         :param show_index:
         :return:
         """
-        show_name = self.shows()[show_index].name()
-        slot_name = self.slot_assignment.show_slot(show=show_name)
-        return slot_name in self.students()[student_index].available_slots()
\ No newline at end of file
+        return bool(self._available[student_index, show_index])
@@ -0,0 +1,137 @@
+import typing
+
+import numpy as np
+
+from sorsched.data import FixedDayInput, FixedSlotSolution, ShowAssignmentsImp
+from sorsched.profiling import timer, count
+
+# shortest paths closer than this are considered equal
+FLOW_TOLERANCE = 1e-9
+
+
+class ShiftMatrix(object):
+    """
+    Cheapest way to shift one student between each pair of shows under the current assignment: cost[a, b] is the
+    least utility lost by moving a student of show a to show b, and student[a, b] the student to move. A row only
+    changes when its show's students do
+    """
+
+    def __init__(self, cost: np.ndarray, show_of: np.ndarray):
+        """
+        :param cost: students x shows, minus utility where allowed and inf elsewhere
+        :param show_of: show of every student, -1 if not assigned yet
+        """
+        n_shows = cost.shape[1]
+        self.student_cost = cost
+        self.show_of = show_of
+        self.cost = np.full((n_shows, n_shows), np.inf)
+        self.student = np.zeros((n_shows, n_shows), dtype=np.int64)
+        for j in range(n_shows):
+            self.refresh(j)
+
+    def refresh(self, j):
+        students = np.flatnonzero(self.show_of == j)
+        if len(students) == 0:
+            self.cost[j] = np.inf
+            return
+        shift = self.student_cost[students] - self.student_cost[students, j][:, None]
+        cheapest = shift.argmin(axis=0)
+        self.cost[j] = shift[cheapest, np.arange(shift.shape[1])]
+        self.student[j] = students[cheapest]
+        self.cost[j, j] = np.inf
+
+
+def shortest_paths(start: np.ndarray, shift: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    Bellman-Ford over the shows. There are no negative cycles, since the assignment so far is optimal
+    :param start: cost of reaching each show directly
+    :param shift: shows x shows cost of going from a show to another
+    :return: cost of the cheapest path to each show, and the show it comes from, -1 if direct
+    """
+    n_shows = len(start)
+    dist = start.copy()
+    pred = np.full(n_shows, -1, dtype=np.int64)
+    for _ in range(n_shows):
+        via = dist[:, None] + shift
+        best = via.argmin(axis=0)
+        relaxed = via[best, np.arange(n_shows)]
+        improved = relaxed < dist - FLOW_TOLERANCE
+        if not improved.any():
+            break
+        dist[improved] = relaxed[improved]
+        pred[improved] = best[improved]
+    return dist, pred
+
+
+def min_cost_assignment(score: np.ndarray, student_min_max: np.ndarray) -> typing.Optional[np.ndarray]:
+    """
+    Highest utility assignment of every student to a show, with each show's student count within its min/max. Solved
+    as a min-cost flow by successive shortest paths: students are added one at a time along the cheapest path in the
+    residual graph, straight into a show or into a show whose students shift along a chain of shows to one with room.
+    Every student placed in a show below its min earns a reward larger than any difference in utility, so mins are met
+    whenever they can be, and the result is optimal
+    :param score: students x shows, utility where the student may go to the show and -inf elsewhere
+    :param student_min_max: shows x 2
+    :return: show of every student, None if there is no feasible assignment
+    """
+    n_students, n_shows = score.shape
+    lo, hi = student_min_max[:, 0], student_min_max[:, 1]
+    cost = np.where(np.isfinite(score), -score, np.inf)
+    finite = cost[np.isfinite(cost)]
+    reward = 1.0 + 2.0 * n_students * (np.abs(finite).max() if len(finite) else 0.0)
+
+    show_of = np.full(n_students, -1, dtype=np.int64)
+    counts = np.zeros(n_shows, dtype=np.int64)
+    shift = ShiftMatrix(cost, show_of=show_of)
+    for i in range(n_students):
+        dist, pred = shortest_paths(cost[i], shift.cost)
+        total = dist + np.where(counts < lo, -reward, np.where(counts < hi, 0.0, np.inf))
+        t = int(np.argmin(total))
+        if not np.isfinite(total[t]):
+            return None
+        path = [t]
+        while pred[path[-1]] >= 0 and len(path) <= n_shows:
+            path.append(int(pred[path[-1]]))
+        # the students to shift are picked before any of them moves
+        moves = [(shift.student[a, b], b) for a, b in zip(path[1:], path[:-1])]
+        for student, b in moves:
+            show_of[student] = b
+        show_of[i] = path[-1]
+        counts[t] += 1
+        for j in set(path):
+            shift.refresh(j)
+    if (counts < lo).any():
+        return None
+    return show_of
+
+
+def solve_fixed_day_flow(conf: FixedDayInput, min_weight=0, cutoff=None,
+                         initial_assignments: typing.Dict[str, str] = None, time_limit=None,
+                         gap=None) -> FixedSlotSolution:
+    """
+    Same interface as solve_fixed_day, for subproblems without binding instrument bounds. Exact, so the start, time
+    limit and gap are ignored
+    :param conf:
+    :param min_weight:
+    :param cutoff: only report solutions with at least this utility
+    :param initial_assignments: ignored
+    :param time_limit: ignored
+    :param gap: ignored
+    :return:
+    """
+    count('flow_solves')
+    problem = conf.problem()
+    allowed = conf.available() & (problem.utility >= min_weight)
+    if not allowed.any(axis=1).all():
+        count('infeasible_without_solver')
+        return ShowAssignmentsImp(utility=-np.inf)
+    score = np.where(allowed, problem.utility.astype(float), -np.inf)
+    with timer('flow'):
+        show_of = min_cost_assignment(score, student_min_max=problem.student_min_max)
+    if show_of is None:
+        return ShowAssignmentsImp(utility=-np.inf)
+    students = np.arange(len(show_of))
+    utility = float(score[students, show_of].sum())
+    if cutoff is not None and utility < cutoff - FLOW_TOLERANCE:
+        return ShowAssignmentsImp(utility=-np.inf)
+    return problem.to_solution(utility=utility, students=students, shows=show_of)
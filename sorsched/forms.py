@@ -47,6 +47,7 @@ class StudentForm(FlaskForm):
 
 class AssignmentForm(FlaskForm):
     run = SubmitField(label='run')
+    rerun = SubmitField(label='re-run from current assignments')
 
 
 class OverviewForm(FlaskForm):
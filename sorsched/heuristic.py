@@ -0,0 +1,278 @@
+import time
+import typing
+from functools import partial
+
+import numpy as np
+
+from sorsched.data import FixedDayInput, FixedSlotSolution, ShowAssignmentsImp, Instrument
+from sorsched.input_config import Config
+from sorsched.profiling import timer, count
+from sorsched.solver2 import TOLERANCE, upper_bound, solve, solve_min_pref, solve_fixed_day, SearchStats, \
+    get_fixed_day_configs
+
+
+def excess(counts: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """
+    :return: how far the counts are outside [lo, hi]
+    """
+    return np.maximum(lo - counts, 0) + np.maximum(counts - hi, 0)
+
+
+class LocalSearchState(object):
+    """
+    A student->show assignment of a fixed-day subproblem, with the show and instrument counts it implies. Keeps, for
+    every show, how much the total violation of the min/max bounds changes when a student joins or leaves it, so a
+    move or swap is priced in O(instruments) and applying one only updates the two shows involved
+    """
+
+    def __init__(self, score: np.ndarray, plays: np.ndarray, student_min_max: np.ndarray,
+                 instrument_min_max: np.ndarray, show_of: np.ndarray):
+        """
+        :param score: students x shows, utility where the student may go to the show and -inf elsewhere
+        :param plays: students x instruments
+        :param student_min_max: shows x 2
+        :param instrument_min_max: shows x instruments x 2
+        :param show_of: show of every student
+        """
+        n_students, n_shows = score.shape
+        self.score = score
+        self.plays = plays.astype(np.int32)
+        self.lo, self.hi = student_min_max[:, 0], student_min_max[:, 1]
+        self.instrument_lo, self.instrument_hi = instrument_min_max[:, :, 0], instrument_min_max[:, :, 1]
+        self.show_of = np.array(show_of)
+        self.counts = np.bincount(self.show_of, minlength=n_shows)
+        self.instrument_counts = np.zeros((n_shows, self.plays.shape[1]), dtype=np.int64)
+        np.add.at(self.instrument_counts, self.show_of, self.plays)
+        self.utility = float(score[np.arange(n_students), self.show_of].sum())
+        # change in violation when a student joins or leaves the show; the instrument ones count per instrument played
+        self.join = np.zeros(n_shows, dtype=np.int64)
+        self.leave = np.zeros(n_shows, dtype=np.int64)
+        self.instrument_join = np.zeros(self.instrument_counts.shape, dtype=np.int64)
+        self.instrument_leave = np.zeros(self.instrument_counts.shape, dtype=np.int64)
+        self.refresh(np.arange(n_shows))
+
+    def refresh(self, shows):
+        c = self.counts[shows]
+        lo, hi = self.lo[shows], self.hi[shows]
+        self.join[shows] = excess(c + 1, lo, hi) - excess(c, lo, hi)
+        self.leave[shows] = excess(c - 1, lo, hi) - excess(c, lo, hi)
+        c = self.instrument_counts[shows]
+        lo, hi = self.instrument_lo[shows], self.instrument_hi[shows]
+        self.instrument_join[shows] = excess(c + 1, lo, hi) - excess(c, lo, hi)
+        self.instrument_leave[shows] = excess(c - 1, lo, hi) - excess(c, lo, hi)
+
+    def violation(self) -> int:
+        return int(excess(self.counts, self.lo, self.hi).sum() +
+                   excess(self.instrument_counts, self.instrument_lo, self.instrument_hi).sum())
+
+    def move_deltas(self, i) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """
+        :param i: student
+        :return: change in utility and violation from moving the student to each show
+        """
+        a = self.show_of[i]
+        p = self.plays[i]
+        d_utility = self.score[i] - self.score[i, a]
+        d_violation = self.join + self.instrument_join @ p + self.leave[a] + self.instrument_leave[a] @ p
+        d_utility[a] = -np.inf
+        return d_utility, d_violation
+
+    def swap_deltas(self, i, others: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """
+        :param i: student
+        :param others: students in other shows
+        :return: change in utility and violation from swapping the student's show with each of the others'.
+        Show counts don't change, only the instrument counts of the players that differ
+        """
+        a = self.show_of[i]
+        b = self.show_of[others]
+        d_utility = (self.score[i, b] + self.score[others, a] - self.score[i, a] -
+                     self.score[others, b])
+        # +1 where the other student brings an instrument into a that i takes out, -1 the other way around
+        d = self.plays[others] - self.plays[i]
+        d_violation = (np.where(d > 0, self.instrument_join[a], 0) + np.where(d < 0, self.instrument_leave[a], 0) +
+                       np.where(d < 0, self.instrument_join[b], 0) + np.where(d > 0, self.instrument_leave[b],
+                                                                              0)).sum(axis=1)
+        return d_utility, d_violation
+
+    def move(self, i, b):
+        a = self.show_of[i]
+        self.utility += self.score[i, b] - self.score[i, a]
+        self.show_of[i] = b
+        self.counts[a] -= 1
+        self.counts[b] += 1
+        self.instrument_counts[a] -= self.plays[i]
+        self.instrument_counts[b] += self.plays[i]
+        self.refresh([a, b])
+
+    def swap(self, i, k):
+        a, b = self.show_of[i], self.show_of[k]
+        self.move(i, b)
+        self.move(k, a)
+
+
+def best_improvement(d_utility: np.ndarray, d_violation: np.ndarray) -> typing.Optional[int]:
+    """
+    Improving means less violation, or the same violation and more utility. Options with -inf utility change go to
+    a show the student can't go to
+    :return: index of the best improving option, None if there is none
+    """
+    improving = (d_violation < 0) | ((d_violation == 0) & (d_utility > TOLERANCE))
+    better = np.flatnonzero(improving & (d_utility > -np.inf))
+    if len(better) == 0:
+        return None
+    return better[np.lexsort((-d_utility[better], d_violation[better]))[0]]
+
+
+def greedy_assignment(score: np.ndarray, plays: np.ndarray, student_min_max: np.ndarray,
+                      instrument_min_max: np.ndarray) -> np.ndarray:
+    """
+    Students with the most to lose go first, each to their favorite show that has room for them and their
+    instruments, or their favorite show if none has. Show and instrument minimums are left to the local search
+    :param score: students x shows, -inf where the student can't go
+    :param plays:
+    :param student_min_max:
+    :param instrument_min_max:
+    :return: show of every student
+    """
+    n_students, n_shows = score.shape
+    ranked = -np.sort(-score, axis=1)
+    regret = ranked[:, 0] - (ranked[:, 1] if n_shows > 1 else -np.inf)
+    plays = plays.astype(bool)
+    room = student_min_max[:, 1].astype(np.int64).copy()
+    instrument_room = instrument_min_max[:, :, 1].astype(np.int64).copy()
+    show_of = np.zeros(n_students, dtype=np.int64)
+    for i in np.argsort(-regret, kind='stable'):
+        fits = (room > 0) & (instrument_room[:, plays[i]] > 0).all(axis=1) & (score[i] > -np.inf)
+        j = int(np.argmax(np.where(fits, score[i], -np.inf))) if fits.any() else int(np.argmax(score[i]))
+        show_of[i] = j
+        room[j] -= 1
+        instrument_room[j, plays[i]] -= 1
+    return show_of
+
+
+def local_search(state: LocalSearchState, max_moves=None, deadline=None) -> int:
+    """
+    Apply improving moves, and swaps for students that can't improve by moving, until none is left
+    :param state:
+    :param max_moves:
+    :param deadline: time.monotonic() at which to stop
+    :return: number of moves and swaps applied
+    """
+    n_students = len(state.show_of)
+    students = np.arange(n_students)
+    moves = 0
+    improved = True
+    while improved:
+        improved = False
+        for i in range(n_students):
+            if (max_moves is not None and moves >= max_moves) or (deadline is not None and time.monotonic() > deadline):
+                return moves
+            b = best_improvement(*state.move_deltas(i))
+            if b is not None:
+                state.move(i, b)
+                moves += 1
+                improved = True
+                continue
+            a = state.show_of[i]
+            others = students[state.show_of != a]
+            if state.violation() == 0:
+                # a swap can only improve utility, so only price the ones that do
+                d_utility = (state.score[i, state.show_of[others]] + state.score[others, a] - state.score[i, a] -
+                             state.score[others, state.show_of[others]])
+                others = others[d_utility > TOLERANCE]
+            if len(others) == 0:
+                continue
+            k = best_improvement(*state.swap_deltas(i, others))
+            if k is not None:
+                state.swap(i, others[k])
+                moves += 1
+                improved = True
+    return moves
+
+
+def solve_fixed_day_heuristic(conf: FixedDayInput, min_weight=0, cutoff=None,
+                              initial_assignments: typing.Dict[str, str] = None, time_limit=None, gap=None,
+                              max_moves=None) -> FixedSlotSolution:
+    """
+    Same interface as solve_fixed_day, but builds a greedy assignment and improves it with moves and swaps instead of
+    solving the MILP. Fast on large rosters, but not exact: the solution may be worse than optimal, and a subproblem
+    can be reported infeasible when the search doesn't find a way to meet every min. The solution's bound is the cheap
+    upper bound
+    :param conf:
+    :param min_weight:
+    :param cutoff: only report solutions with at least this utility
+    :param initial_assignments: student->show assignments to start from instead of the greedy one where allowed
+    :param time_limit: seconds for the local search
+    :param gap: ignored, there is no gap to close
+    :param max_moves: stop the local search after this many moves and swaps
+    :return:
+    """
+    count('fixed_day_solves')
+    deadline = time.monotonic() + time_limit if time_limit is not None else None
+    problem = conf.problem()
+    allowed = conf.available() & (problem.utility >= min_weight)
+    if not allowed.any(axis=1).all():
+        count('infeasible_without_solver')
+        return ShowAssignmentsImp(utility=-np.inf)
+    bound = upper_bound(conf=conf, min_weight=min_weight)
+    score = np.where(allowed, problem.utility.astype(float), -np.inf)
+
+    with timer('greedy'):
+        show_of = greedy_assignment(score, plays=problem.plays, student_min_max=problem.student_min_max,
+                                    instrument_min_max=problem.instrument_min_max)
+        for student_name, show_name in (initial_assignments or {}).items():
+            i, j = problem.student_ids.get(student_name), problem.show_ids.get(show_name)
+            if i is not None and j is not None and allowed[i, j]:
+                show_of[i] = j
+    with timer('local_search'):
+        state = LocalSearchState(score, plays=problem.plays, student_min_max=problem.student_min_max,
+                                 instrument_min_max=problem.instrument_min_max, show_of=show_of)
+        count('local_search_moves', local_search(state, max_moves=max_moves, deadline=deadline))
+
+    utility = float(score[np.arange(len(show_of)), state.show_of].sum())
+    if state.violation() > 0 or (cutoff is not None and utility < cutoff - TOLERANCE):
+        return ShowAssignmentsImp(utility=-np.inf, bound=bound)
+    return problem.to_solution(utility=utility, students=np.arange(len(show_of)), shows=state.show_of, bound=bound)
+
+
+def solve_heuristic(conf: Config, stats: SearchStats = None) -> typing.Tuple[object, object]:
+    """
+    Same as solve, but every fixed-day subproblem is solved by the local search
+    :param conf:
+    :param stats: filled with counts of evaluated and pruned subproblems
+    :return:
+    """
+    return solve(conf=conf, min_pref_solver=partial(solve_min_pref, fixed_day_solver=solve_fixed_day_heuristic,
+                                                    stats=stats))
+
+
+def test_heuristic_matches_cbc():
+    from dbtest.fixtures import weekend_config
+    conf = weekend_config()
+    for min_weight in [3, 2, 1]:
+        for slot_assignment, fixed_day_config in get_fixed_day_configs(conf):
+            expected = solve_fixed_day(fixed_day_config, min_weight=min_weight).utility()
+            assert solve_fixed_day_heuristic(fixed_day_config, min_weight=min_weight).utility() == expected
+    assert solve_heuristic(conf)[1].utility() == solve(conf)[1].utility()
+
+
+def test_heuristic_meets_bounds():
+    # everyone wants Metallica, but it only takes one drummer and Gaga needs two players with a singer
+    from dbtest.fixtures import mock_config
+    conf = mock_config(
+        preferences=dict([(name, {'Metallica': 3, 'Gaga': 1}) for name in ['A', 'B', 'C', 'D', 'E']]),
+        instruments={'A': Instrument.Drums, 'B': Instrument.Drums, 'C': Instrument.Vocals, 'D': Instrument.Guitar,
+                     'E': Instrument.Guitar},
+        available_slots=dict([(name, ['Mon', 'Tue']) for name in ['A', 'B', 'C', 'D', 'E']]),
+        show_min_max={'Metallica': (1, 5), 'Gaga': (2, 5)},
+        slot_max_shows={'Mon': 1, 'Tue': 1},
+        instrument_bounds={'Metallica': {Instrument.Drums: (0, 1)}, 'Gaga': {Instrument.Vocals: (1, 1)}})
+    for slot_assignment, fixed_day_config in get_fixed_day_configs(conf):
+        expected = solve_fixed_day(fixed_day_config, min_weight=1)
+        result = solve_fixed_day_heuristic(fixed_day_config, min_weight=1)
+        assert result.utility() == expected.utility()
+        assignment = result.student_show_assignment()
+        assert assignment['C'] == 'Gaga'
+        assert [assignment['A'], assignment['B']].count('Metallica') == 1
+        assert result.bound() >= result.utility()
@@ -0,0 +1,142 @@
+import threading
+import typing
+from functools import partial
+
+import highspy
+import numpy as np
+
+from sorsched.data import FixedDayInput, FixedSlotSolution, ShowAssignmentsImp
+from sorsched.input_config import Config
+from sorsched.matrix_model import build_fixed_day_model, fixed_day_arrays, availability_mask, start_values, \
+    set_limits, read_result
+from sorsched.profiling import timer, count
+from sorsched.solver2 import TOLERANCE, get_fixed_day_configs, solve_min_pref, \
+    solve_fixed_day, solve, SearchStats
+
+
+class FixedDaySession(object):
+    """
+    Solves fixed-day subproblems with an in-process HiGHS model that is built once and reused.
+    The student/show/instrument constraints are the same for every slot assignment; only the availability changes.
+    So between calls the session only changes the upper bound of assignment variables that become (un)available, and
+    starts the MIP from the previous solution.
+    Can be passed to solve_min_pref as the fixed-day solver
+    """
+
+    def __init__(self):
+        self.highs = None
+        self.min_weight = None
+        self.problem = None
+        self.model = None
+        self.available = None
+        self.last_solution = None
+
+    def __call__(self, conf: FixedDayInput, min_weight=0, cutoff=None,
+                 initial_assignments: typing.Dict[str, str] = None, time_limit=None, gap=None) -> FixedSlotSolution:
+        count('fixed_day_solves')
+        if self.highs is None or self.min_weight != min_weight or self.problem is not conf.problem():
+            with timer('model_build'):
+                self.build(conf=conf, min_weight=min_weight)
+
+        with timer('model_update'):
+            available = availability_mask(conf)[self.model.students, self.model.shows]
+            changed = np.flatnonzero(available != self.available).astype(np.int32)
+            if len(changed):
+                self.highs.changeColsBounds(len(changed), changed, np.zeros(len(changed)),
+                                            available[changed].astype(float))
+                self.available = available
+        count('bound_changes', len(changed))
+
+        if initial_assignments is not None:
+            start = highspy.HighsSolution()
+            start.col_value = list(start_values(conf=conf, model=self.model, initial_assignments=initial_assignments))
+            self.highs.setSolution(start)
+        elif self.last_solution is not None:
+            start = highspy.HighsSolution()
+            start.col_value = list(self.last_solution * available)
+            self.highs.setSolution(start)
+        objective_bound = -cutoff + TOLERANCE if cutoff is not None else highspy.kHighsInf
+        self.highs.setOptionValue('objective_bound', objective_bound)
+        set_limits(self.highs, time_limit=time_limit, gap=gap)
+
+        with timer('solver'):
+            self.highs.run()
+        solution, x = read_result(self.highs, conf=conf, model=self.model, min_weight=min_weight, gap=gap)
+        if x is None:
+            return solution
+        self.last_solution = x
+        if cutoff is not None and solution.utility() < cutoff - TOLERANCE:
+            return ShowAssignmentsImp(utility=-np.inf)
+        return solution
+
+    def build(self, conf: FixedDayInput, min_weight):
+        """
+        Build the model with every student/show pair above min weight, all available
+        :param conf:
+        :param min_weight:
+        :return:
+        """
+        self.model = build_fixed_day_model(fixed_day_arrays(conf), min_weight=min_weight, restrict_available=False)
+        self.highs = highspy.Highs()
+        self.highs.setOptionValue('output_flag', False)
+        self.highs.passModel(self.model.to_highs())
+        count('variables', self.model.num_cols())
+        count('constraints', self.model.num_rows())
+        self.min_weight = min_weight
+        self.problem = conf.problem()
+        self.available = np.ones(self.model.num_cols(), dtype=bool)
+        self.last_solution = None
+
+
+class ThreadSessions(object):
+    """
+    Fixed-day solver with a FixedDaySession per thread, so one can be shared by the job threads and the fixed-day
+    cache. Each thread reuses its own model across the slot assignments it solves
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def __call__(self, conf: FixedDayInput, min_weight=0, **kwargs) -> FixedSlotSolution:
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = FixedDaySession()
+        return session(conf=conf, min_weight=min_weight, **kwargs)
+
+
+def solve_highs(conf: Config, stats: SearchStats = None) -> typing.Tuple[object, object]:
+    """
+    Same as solve, but every fixed-day subproblem is solved by one reused in-process HiGHS model
+    :param conf:
+    :param stats: filled with counts of evaluated and pruned subproblems
+    :return:
+    """
+    session = FixedDaySession()
+    return solve(conf=conf, min_pref_solver=partial(solve_min_pref, fixed_day_solver=session, stats=stats))
+
+
+def test_session_matches_cbc():
+    from dbtest.fixtures import weekend_config
+    conf = weekend_config()
+    session = FixedDaySession()
+    for min_weight in [3, 2, 1]:
+        for slot_assignment, fixed_day_config in get_fixed_day_configs(conf):
+            expected = solve_fixed_day(fixed_day_config, min_weight=min_weight).utility()
+            assert session(fixed_day_config, min_weight=min_weight).utility() == expected, slot_assignment
+
+    sa, sol = solve_min_pref(conf, min_weight=2)
+    session_sa, session_sol = solve_min_pref(conf, min_weight=2, fixed_day_solver=FixedDaySession())
+    assert session_sol.utility() == sol.utility()
+    assert session_sa.show_slots() == sa.show_slots()
+    assert solve_highs(conf)[1].utility() == solve(conf)[1].utility()
+
+    sessions = ThreadSessions()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(solve_min_pref(conf, min_weight=2,
+                                                                             fixed_day_solver=sessions)[1].utility()))
+               for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == [sol.utility()] * 2
@@ -0,0 +1,156 @@
+import io
+import typing
+
+import pandas as pd
+from sqlalchemy import delete
+from sqlalchemy.dialects import postgresql, sqlite
+
+from dbtest.testdb import TestDb
+from sorsched import db, models
+from sorsched.data import Instrument
+
+# first letter of the Instrument column
+INSTRUMENT_CODES = {
+    'G': Instrument.Guitar,
+    'B': Instrument.Bass,
+    'V': Instrument.Vocals,
+    'D': Instrument.Drums,
+    'K': Instrument.Keys,
+}
+# students rank the shows 1 (favorite) to 4, and 5 if they can't make the show's slot
+UNAVAILABLE_RANK = 5
+
+INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+
+def upsert(session, model, rows: typing.List[dict], update_columns: typing.Sequence[str] = ()):
+    """
+    Insert rows with one bulk statement. Rows whose primary key is already there get their update_columns
+    overwritten, or are left alone if there are none
+    :param session:
+    :param model:
+    :param rows: column name -> value
+    :param update_columns:
+    :return:
+    """
+    if not rows:
+        return
+    dialect = session.get_bind().dialect.name
+    if dialect not in INSERTS:
+        raise ValueError('upsert not supported for {}'.format(dialect))
+    table = model.__table__
+    stmt = INSERTS[dialect](table)
+    keys = [column.name for column in table.primary_key.columns]
+    if update_columns:
+        stmt = stmt.on_conflict_do_update(index_elements=keys,
+                                          set_=dict([(c, stmt.excluded[c]) for c in update_columns]))
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=keys)
+    session.execute(stmt, rows)
+
+
+def signup_rows(chunk: pd.DataFrame, show_columns: typing.Dict[str, str],
+                slot_columns: typing.Dict[str, str]) -> typing.Dict[str, typing.List[dict]]:
+    """
+    Turn signups into table rows, a column at a time. A rank r out of n shows becomes the preference n + 1 - r, so
+    the favorite gets the highest preference. A rank below UNAVAILABLE_RANK means the student can make the slot
+    :param chunk: signups indexed by student name, with an Instrument column
+    :param show_columns: column -> show name
+    :param slot_columns: column -> slot name
+    :return: table -> rows
+    """
+    names = chunk.index.rename('student_name')
+    n_shows = len(show_columns)
+    preferences = (n_shows + 1 - chunk[list(show_columns)]).rename(columns=show_columns).set_axis(names)
+    preferences = preferences.stack().rename('preference').astype(float).rename_axis(['student_name', 'show_name'])
+
+    available = (chunk[list(slot_columns)] < UNAVAILABLE_RANK).rename(columns=slot_columns).set_axis(names).stack()
+    available = available[available].rename_axis(['student_name', 'slot_name'])
+
+    instruments = chunk['Instrument'].astype(str).str[0].str.upper().map(INSTRUMENT_CODES)
+    unknown = instruments.isnull()
+    if unknown.any():
+        raise ValueError('unknown instrument for {}'.format(', '.join(chunk.index[unknown])))
+
+    return {
+        'students': [{'name': name} for name in names],
+        'preferences': preferences.reset_index().to_dict('records'),
+        'availabilities': available.index.to_frame(index=False).to_dict('records'),
+        'instruments': [{'student_name': name, 'instrument_name': instrument.value} for name, instrument in
+                        zip(names, instruments)],
+    }
+
+
+def load_signups(session, file, show_columns: typing.Dict[str, str], slot_columns: typing.Dict[str, str],
+                 chunksize=1000, program=models.DEFAULT_PROGRAM) -> int:
+    """
+    Stream a signup csv into the student tables with bulk statements, chunksize students at a time. Re-importing
+    a file updates the students that are already there: their preferences are overwritten, and their available
+    slots and instrument replaced. Everything runs in the session's transaction, so nothing is committed here
+    :param session:
+    :param file: path or file object
+    :param show_columns: column -> show name
+    :param slot_columns: column -> slot name
+    :param chunksize:
+    :param program: the students are added to
+    :return: number of students read
+    """
+    # shows and slots added through the ORM must be there before rows point at them
+    session.flush()
+    n_students = 0
+    for chunk in pd.read_csv(file, index_col='Name', chunksize=chunksize):
+        chunk = chunk[~chunk.index.duplicated(keep='last')]
+        rows = signup_rows(chunk, show_columns=show_columns, slot_columns=slot_columns)
+        for table_rows in rows.values():
+            for row in table_rows:
+                row['program'] = program
+        names = list(chunk.index)
+        upsert(session, models.Student, rows['students'])
+        for model in [models.SlotAvailable, models.StudentInstrument]:
+            table = model.__table__
+            session.execute(delete(table).where(table.c.program == program, table.c.student_name.in_(names)))
+        upsert(session, models.ShowPreference, rows['preferences'], update_columns=['preference'])
+        upsert(session, models.SlotAvailable, rows['availabilities'])
+        upsert(session, models.StudentInstrument, rows['instruments'])
+        n_students += len(chunk)
+    return n_students
+
+
+class TestLoadSignups(TestDb):
+    @classmethod
+    def base(cls):
+        return db.Model
+
+    def test_load_signups(self):
+        self.session.add_all([models.Instrument(name=instrument.value) for instrument in Instrument] + [
+            models.Show(name='Big 4 of Grunge', min_students=1, max_students=2),
+            models.Show(name='Iron Maiden', min_students=1, max_students=2),
+            models.Slot(name='Tue', max_shows=1), models.Slot(name='Fri', max_shows=1)])
+        show_columns = {'Grunge': 'Big 4 of Grunge', 'Iron': 'Iron Maiden'}
+        slot_columns = {'Grunge': 'Tue', 'Iron': 'Fri'}
+        signups = 'Name,Instrument,Grunge,Iron\nSteven,D,1,5\nShawn,Guitar,2,1\nAnn,v,1,2\n'
+        n = load_signups(self.session, io.StringIO(signups), show_columns=show_columns, slot_columns=slot_columns,
+                         chunksize=2)
+        assert n == 3
+        preferences = dict([((p.student_name, p.show_name), p.preference) for p in
+                            self.session.query(models.ShowPreference)])
+        assert preferences[('Steven', 'Big 4 of Grunge')] == 2
+        assert preferences[('Steven', 'Iron Maiden')] == -2
+        available = set([(a.student_name, a.slot_name) for a in self.session.query(models.SlotAvailable)])
+        assert available == {('Steven', 'Tue'), ('Shawn', 'Tue'), ('Shawn', 'Fri'), ('Ann', 'Tue'), ('Ann', 'Fri')}
+        assert self.session.query(models.StudentInstrument).get(('default', 'Shawn', 'guitar')) is not None
+
+        # re-importing a changed file updates in place
+        signups = 'Name,Instrument,Grunge,Iron\nSteven,G,5,1\nShawn,Guitar,2,1\nAnn,v,1,2\n'
+        load_signups(self.session, io.StringIO(signups), show_columns=show_columns, slot_columns=slot_columns)
+        self.session.expire_all()
+        assert self.session.query(models.Student).count() == 3
+        assert self.session.query(models.ShowPreference).count() == 6
+        assert self.session.query(models.ShowPreference).get(('default', 'Steven', 'Iron Maiden')).preference == 2
+        steven = set([a.slot_name for a in self.session.query(models.SlotAvailable).filter_by(student_name='Steven')])
+        assert steven == {'Fri'}
+        assert [i.instrument_name for i in
+                self.session.query(models.StudentInstrument).filter_by(student_name='Steven')] == ['guitar']
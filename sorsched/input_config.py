@@ -1,8 +1,13 @@
 import typing
 from abc import ABCMeta, abstractmethod
+from collections import defaultdict
 
-from sorsched import models
-from sorsched.data import Student, Show, Slot, ShowImp, SlotImp, StudentImp
+from sqlalchemy import event
+
+from dbtest.testdb import TestDb
+from sorsched import models, db
+from sorsched.canned_inputs import seed
+from sorsched.data import Student, Show, Slot, ShowSnapshot, SlotSnapshot, StudentSnapshot, Instrument
 
 
 class Config(metaclass=ABCMeta):
@@ -30,12 +35,23 @@ class ConfigImp(Config):
         self._students = students
 
     @classmethod
-    def load_from_db(cls, session):
-        shows = cls.load_shows(session)
-        slots = cls.load_slots(session)
-        students = cls.load_students(session)
+    def load_from_db(cls, session, program=models.DEFAULT_PROGRAM):
+        shows = cls.load_shows(session, program=program)
+        slots = cls.load_slots(session, program=program)
+        students = cls.load_students(session, program=program)
         return ConfigImp(shows=shows, slots=slots, students=students)
 
+    @classmethod
+    def snapshot(cls, conf: Config):
+        """
+        Copy the config into plain objects that don't hold on to the database session and can be pickled
+        :param conf:
+        :return:
+        """
+        return ConfigImp(shows=[ShowSnapshot.from_show(show) for show in conf.shows()],
+                         slots=[SlotSnapshot.from_slot(slot) for slot in conf.slots()],
+                         students=[StudentSnapshot.from_student(student) for student in conf.students()])
+
     def students(self) -> typing.List[Student]:
         return self._students
 
@@ -46,34 +62,87 @@ class ConfigImp(Config):
         return self._slots
 
     @classmethod
-    def load_shows(cls, session):
+    def load_shows(cls, session, program=models.DEFAULT_PROGRAM):
         """
-        Load show information into list of show objects
+        Load show information into list of show objects. One query for shows and one for their instrument min max
         :return:
         """
-        x = []
-        for show_obj in session.query(models.Show).all():
-            x.append(ShowImp(model=show_obj))
-        return x
+        instrument_min_max = defaultdict(dict)
+        for x in session.query(models.ShowInstrument.show_name, models.ShowInstrument.instrument_name,
+                               models.ShowInstrument.min_instruments, models.ShowInstrument.max_instruments).filter(
+                models.ShowInstrument.program == program):
+            instrument_min_max[x.show_name][Instrument(x.instrument_name)] = (x.min_instruments, x.max_instruments)
+        return [ShowSnapshot(name=x.name, student_min_max=(x.min_students, x.max_students),
+                             instrument_min_max=instrument_min_max[x.name])
+                for x in session.query(models.Show.name, models.Show.min_students, models.Show.max_students).filter(
+                models.Show.program == program)]
 
     @classmethod
-    def load_slots(cls, session):
+    def load_slots(cls, session, program=models.DEFAULT_PROGRAM):
         """
-        Load slot information into dict
+        Load slot information into list of slot objects
         :return:
         """
-        x = []
-        for slot in session.query(models.Slot).all():
-            x.append(SlotImp(model=slot))
-        return x
+        return [SlotSnapshot(name=x.name, max_shows=x.max_shows)
+                for x in session.query(models.Slot.name, models.Slot.max_shows).filter(models.Slot.program == program)]
 
     @classmethod
-    def load_students(cls, session):
+    def load_students(cls, session, program=models.DEFAULT_PROGRAM):
         """
-        Load student info and their preferences into dict
+        Load student info and their preferences into list of student objects. One query per table instead of lazy
+        loading relations student by student
         :return:
         """
-        x = []
-        for student in session.query(models.Student).all():
-            x.append(StudentImp(model=student))
-        return x
+        show_preferences = defaultdict(dict)
+        for x in session.query(models.ShowPreference.student_name, models.ShowPreference.show_name,
+                               models.ShowPreference.preference).filter(models.ShowPreference.program == program):
+            show_preferences[x.student_name][x.show_name] = x.preference
+        available_slots = defaultdict(list)
+        for x in session.query(models.SlotAvailable.student_name, models.SlotAvailable.slot_name).filter(
+                models.SlotAvailable.program == program):
+            available_slots[x.student_name].append(x.slot_name)
+        instruments = defaultdict(list)
+        for x in session.query(models.StudentInstrument.student_name, models.StudentInstrument.instrument_name).filter(
+                models.StudentInstrument.program == program):
+            instruments[x.student_name].append(Instrument(x.instrument_name))
+        return [StudentSnapshot(name=x.name, show_preferences=show_preferences[x.name],
+                                available_slots=available_slots[x.name], instruments=tuple(instruments[x.name]))
+                for x in session.query(models.Student.name).filter(models.Student.program == program)]
+
+
+class TestLoadFromDb(TestDb):
+    @classmethod
+    def base(cls):
+        return db.Model
+
+    def test_load_from_db(self):
+        seed(self.session)
+        self.session.flush()
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(self.session.bind, 'before_cursor_execute', count)
+        try:
+            conf = ConfigImp.load_from_db(self.session)
+        finally:
+            event.remove(self.session.bind, 'before_cursor_execute', count)
+        assert len(statements) == 7, statements
+
+        students = dict([(student.name(), student) for student in conf.students()])
+        assert students['Ramona'].show_preferences() == {'Led Zeppelin': 1, 'Metallica': 3}
+        assert list(students['Ramona'].instruments()) == [Instrument.Vocals]
+        assert sorted(students['Ramona'].available_slots()) == ['Sat-1', 'Sat-2', 'Wed']
+        shows = dict([(show.name(), show) for show in conf.shows()])
+        assert shows['Metallica'].student_min_max() == (1, 2)
+        assert shows['Metallica'].instrument_min_max()[Instrument.Drums] == (0, 100)
+        assert sorted([slot.name() for slot in conf.slots()]) == ['Sat-1', 'Sat-2', 'Wed']
+
+    def test_load_from_db_program(self):
+        seed(self.session, program='fall')
+        self.session.add(models.Student(name='Kim', program='fall'))
+        self.session.flush()
+        conf = ConfigImp.load_from_db(self.session, program='fall')
+        assert sorted([student.name() for student in conf.students()]) == ['Chao', 'Jennifer', 'Kim', 'Ramona']
+        assert len(ConfigImp.load_from_db(self.session, program='spring').shows()) == 0
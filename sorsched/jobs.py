@@ -0,0 +1,332 @@
+import hashlib
+import json
+import threading
+import time
+import traceback
+import typing
+from collections import OrderedDict, defaultdict, deque
+from uuid import uuid4
+
+from sorsched.input_config import Config, ConfigImp
+from sorsched.models import DEFAULT_PROGRAM
+from sorsched.profiling import profile_run
+from sorsched.data import SlotAssignment
+from sorsched.solver2 import SearchStats, solve, solve_incremental, count_changed
+
+
+def config_key(conf: Config) -> str:
+    """
+    Hash of the config content, so an unchanged config gives the same key
+    :param conf:
+    :return:
+    """
+
+    def name(x):
+        return getattr(x, 'value', x)
+
+    content = {
+        'shows': sorted([(show.name(), list(show.student_min_max()),
+                          sorted([(name(k), list(v)) for k, v in show.instrument_min_max().items()]))
+                         for show in conf.shows()]),
+        'slots': sorted([(slot.name(), slot.max_shows()) for slot in conf.slots()]),
+        'students': sorted([(student.name(), sorted(student.show_preferences().items()),
+                             sorted(student.available_slots()), sorted([name(x) for x in student.instruments()]))
+                            for student in conf.students()]),
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+
+class Job(object):
+    """
+    One background solve
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, key: str, program=DEFAULT_PROGRAM):
+        self.id = str(uuid4())
+        self.key = key
+        self.program = program
+        self.status = Job.QUEUED
+        self.stats = SearchStats()
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.error = None
+        self.slot_assignment = None
+        self.solution = None
+        # RunSummary once the solve is done
+        self.summary = None
+        # students whose show changed, for incremental solves
+        self.n_changed = None
+
+    def is_active(self) -> bool:
+        return self.status in (Job.QUEUED, Job.RUNNING)
+
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.
+        return (self.finished or time.time()) - self.started
+
+    def progress(self) -> dict:
+        return {
+            'id': self.id,
+            'program': self.program,
+            'status': self.status,
+            'evaluated': self.stats.done(),
+            # None until the solver enumerates slot assignments, and for solvers that don't
+            'total': self.stats.total or None,
+            'best_utility': self.stats.best_utility if self.stats.best_utility > -float('inf') else None,
+            'elapsed': self.elapsed(),
+            'error': self.error,
+            'n_changed': self.n_changed,
+            'timers': dict(self.summary.timers) if self.summary is not None else None,
+        }
+
+
+class JobManager(object):
+    """
+    Runs solves on a bounded pool of worker threads shared by all programs. A submitted config is snapshot right
+    away, so the solve holds no database session. Submitting the same config while its job is still queued or running
+    returns that job.
+    Each program has its own queue. A free worker takes the next job of the program that was served least recently,
+    and no program runs more than max_per_program jobs at once, so a program with many or long solves can't starve
+    the others
+    """
+
+    def __init__(self, max_workers=1, max_jobs=100, max_per_program=None):
+        """
+        :param max_workers:
+        :param max_jobs: finished jobs are forgotten past this many jobs
+        :param max_per_program: defaults to all workers but one, so one is always left for other programs. Jobs aren't
+        preempted, so with a single worker a long solve still makes every other program wait
+        """
+        self.max_workers = max_workers
+        self.max_per_program = max_per_program or max(1, max_workers - 1)
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+        # program -> queued (job, conf, solve_fn, on_done)
+        self.queues = defaultdict(deque)
+        self.running = defaultdict(int)
+        # program -> when a worker last took one of its jobs
+        self.served = {}
+        self.n_served = 0
+        self.workers = []
+        self.closed = False
+
+    def submit(self, conf: Config, solve_fn, on_done=None, key_suffix='', program=DEFAULT_PROGRAM) -> Job:
+        """
+        :param conf:
+        :param solve_fn: function (conf, stats) -> (slot assignment, solution)
+        :param on_done: function (job) called in the worker when the solve succeeds, e.g. to save the results
+        :param key_suffix: tells apart different kinds of solves of the same config
+        :param program: whose queue the job goes to
+        :return:
+        """
+        snapshot = ConfigImp.snapshot(conf)
+        key = '{}:{}{}'.format(program, config_key(snapshot), key_suffix)
+        with self.condition:
+            if self.closed:
+                raise RuntimeError('job manager is shut down')
+            for job in self.jobs.values():
+                if job.key == key and job.is_active():
+                    return job
+            job = Job(key=key, program=program)
+            self.jobs[job.id] = job
+            self.forget_old_jobs()
+            self.queues[program].append((job, snapshot, solve_fn, on_done))
+            if len(self.workers) < self.max_workers:
+                worker = threading.Thread(target=self.work, daemon=True)
+                self.workers.append(worker)
+                worker.start()
+            self.condition.notify()
+        return job
+
+    def submit_incremental(self, conf: Config, previous_slot_assignment: SlotAssignment,
+                           previous_assignments: typing.Dict[str, str], on_done=None,
+                           program=DEFAULT_PROGRAM, fixed_day_solver=None) -> Job:
+        """
+        Queue a re-solve starting from the previous run's assignments, see solve_incremental. The job's n_changed is
+        set before on_done is called
+        :param conf:
+        :param previous_slot_assignment:
+        :param previous_assignments: student->show
+        :param on_done:
+        :param program:
+        :param fixed_day_solver: see solve_min_pref
+        :return:
+        """
+
+        def solve_fn(conf, stats):
+            slot_assignment, solution, _ = solve_incremental(
+                conf=conf, previous_slot_assignment=previous_slot_assignment,
+                previous_assignments=previous_assignments, stats=stats, fixed_day_solver=fixed_day_solver)
+            return slot_assignment, solution
+
+        def done(job):
+            job.n_changed = count_changed(previous_assignments=previous_assignments, solution=job.solution)
+            if on_done is not None:
+                on_done(job)
+
+        return self.submit(conf=conf, solve_fn=solve_fn, on_done=done, key_suffix='-incremental', program=program)
+
+    def next_task(self):
+        """
+        Take the next job off the queues, holding the lock
+        :return: None if no program may start a job now
+        """
+        ready = [program for program, queue in self.queues.items() if
+                 queue and self.running[program] < self.max_per_program]
+        if not ready:
+            return None
+        program = min(ready, key=lambda p: self.served.get(p, -1))
+        self.served[program] = self.n_served
+        self.n_served += 1
+        self.running[program] += 1
+        task = self.queues[program].popleft()
+        if not self.queues[program]:
+            del self.queues[program]
+        return task
+
+    def work(self):
+        while True:
+            with self.condition:
+                task = self.next_task()
+                while task is None:
+                    if self.closed and not self.queues:
+                        return
+                    self.condition.wait()
+                    task = self.next_task()
+            job = task[0]
+            try:
+                self.run(*task)
+            finally:
+                with self.condition:
+                    self.running[job.program] -= 1
+                    self.condition.notify_all()
+
+    def queued(self, program=None) -> int:
+        """
+        :param program: or all programs
+        :return: number of jobs waiting for a worker
+        """
+        with self.lock:
+            if program is not None:
+                return len(self.queues.get(program, ()))
+            return sum([len(queue) for queue in self.queues.values()])
+
+    def run(self, job: Job, conf: Config, solve_fn, on_done):
+        job.status = Job.RUNNING
+        job.started = time.time()
+        try:
+            job.summary = profile_run(solve_fn, conf=conf, stats=job.stats)
+            job.slot_assignment, job.solution = job.summary.slot_assignment, job.summary.solution
+            # solvers that don't enumerate slot assignments only report at the end
+            job.stats.best_utility = max(job.stats.best_utility, job.solution.utility())
+            if on_done is not None:
+                on_done(job)
+            job.status = Job.DONE
+        except Exception:
+            job.error = traceback.format_exc()
+            job.status = Job.FAILED
+        finally:
+            job.finished = time.time()
+
+    def get(self, job_id) -> typing.Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def forget_old_jobs(self):
+        finished = [job_id for job_id, job in self.jobs.items() if not job.is_active()]
+        for job_id in finished[:max(0, len(self.jobs) - self.max_jobs)]:
+            del self.jobs[job_id]
+
+    def shutdown(self):
+        """
+        Run what's queued, then stop the workers
+        :return:
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        for worker in self.workers:
+            worker.join()
+
+
+def test_job_manager():
+    from dbtest.fixtures import weekend_config
+    conf = weekend_config()
+    manager = JobManager(max_workers=1)
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocking_solve(conf, stats):
+        started.set()
+        release.wait()
+        return solve(conf)
+
+    saved = []
+    job = manager.submit(conf, blocking_solve, on_done=saved.append)
+    started.wait()
+    assert job.progress()['status'] == Job.RUNNING
+    assert manager.submit(weekend_config(), blocking_solve) is job
+    release.set()
+    manager.shutdown()
+    assert job.status == Job.DONE, job.error
+    assert saved == [job]
+    assert job.solution.utility() == solve(conf)[1].utility()
+    assert manager.get(job.id).progress()['elapsed'] > 0
+    assert manager.get(job.id).progress()['timers']['presolve'] > 0
+    # blocking_solve doesn't enumerate into the job's stats, so there is no total to report
+    assert job.progress()['total'] is None
+
+
+def test_job_manager_incremental():
+    from dbtest.fixtures import weekend_config
+    conf = weekend_config()
+    slot_assignment, solution = solve(conf)
+    previous = dict(solution.student_show_assignment())
+    manager = JobManager()
+    saved = []
+    job = manager.submit_incremental(conf, previous_slot_assignment=slot_assignment, previous_assignments=previous,
+                                     on_done=lambda job: saved.append(job.n_changed))
+    moved = manager.submit_incremental(conf, previous_slot_assignment=slot_assignment,
+                                       previous_assignments=dict(previous, Ramona='nowhere'), program='other')
+    manager.shutdown()
+    assert job.status == Job.DONE, job.error
+    assert saved == [0]
+    assert job.progress()['n_changed'] == 0
+    assert moved.progress()['n_changed'] == 1
+
+
+def test_job_manager_fair():
+    from dbtest.fixtures import weekend_config
+    manager = JobManager(max_workers=1)
+    started = threading.Event()
+    release = threading.Event()
+    order = []
+
+    def solve_fn(name, block=False):
+        def fn(conf, stats):
+            order.append(name)
+            if block:
+                started.set()
+                release.wait()
+            return solve(conf)
+
+        return fn
+
+    manager.submit(weekend_config(), solve_fn('big-1', block=True), program='district')
+    started.wait()
+    for i in [2, 3]:
+        manager.submit(weekend_config(), solve_fn('big-{}'.format(i)), program='district', key_suffix=str(i))
+    small = manager.submit(weekend_config(), solve_fn('small'), program='school')
+    assert manager.queued() == 3 and manager.queued('school') == 1
+    release.set()
+    manager.shutdown()
+    # the small program goes before the district's backlog
+    assert order == ['big-1', 'small', 'big-2', 'big-3']
+    assert small.status == Job.DONE and small.progress()['program'] == 'school'
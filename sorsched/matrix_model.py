@@ -0,0 +1,268 @@
+import time
+import typing
+from functools import partial
+
+import highspy
+import numpy as np
+
+from sorsched.data import FixedDayInput, FixedSlotSolution, ShowAssignmentsImp
+from sorsched.input_config import Config
+from sorsched.presolve import presolve
+from sorsched.problem import INSTRUMENTS
+from sorsched.profiling import timer, count
+from sorsched.solver2 import TOLERANCE, get_fixed_day_configs, solve_fixed_day, solve, \
+    solve_min_pref, SearchStats, upper_bound
+
+# HiGHS' default
+MIP_REL_GAP = 1e-4
+
+
+class FixedDayArrays(object):
+    """
+    Fixed-day subproblem as numpy arrays
+    """
+
+    def __init__(self, utility: np.ndarray, available: np.ndarray, plays: np.ndarray, student_min_max: np.ndarray,
+                 instrument_min_max: np.ndarray):
+        # students x shows
+        self.utility = utility
+        # students x shows, whether the student can make the show's slot
+        self.available = available
+        # students x instruments
+        self.plays = plays
+        # shows x 2
+        self.student_min_max = student_min_max
+        # shows x instruments x 2
+        self.instrument_min_max = instrument_min_max
+
+
+def fixed_day_arrays(conf: FixedDayInput) -> FixedDayArrays:
+    """
+    Views of the config's Problem arrays, plus the subproblem's availability
+    :param conf:
+    :return:
+    """
+    problem = conf.problem()
+    return FixedDayArrays(utility=problem.utility, available=availability_mask(conf), plays=problem.plays,
+                          student_min_max=problem.student_min_max, instrument_min_max=problem.instrument_min_max)
+
+
+def availability_mask(conf: FixedDayInput) -> np.ndarray:
+    """
+    :param conf:
+    :return: students x shows, whether the student can make the show's slot
+    """
+    return conf.available()
+
+
+class MatrixModel(object):
+    """
+    Fixed-day MILP in matrix form: minimize cost @ x subject to row_lower <= A x <= row_upper, x binary.
+    Column k assigns student students[k] to show shows[k]. A is a 0/1 matrix in CSR form (indptr, indices).
+    Rows are one per student, then one per show, then one per (show, instrument)
+    """
+
+    def __init__(self, students: np.ndarray, shows: np.ndarray, cost: np.ndarray, row_lower: np.ndarray,
+                 row_upper: np.ndarray, indptr: np.ndarray, indices: np.ndarray):
+        self.students = students
+        self.shows = shows
+        self.cost = cost
+        self.row_lower = row_lower
+        self.row_upper = row_upper
+        self.indptr = indptr
+        self.indices = indices
+
+    def num_cols(self) -> int:
+        return len(self.cost)
+
+    def num_rows(self) -> int:
+        return len(self.row_lower)
+
+    def to_highs(self) -> highspy.HighsLp:
+        lp = highspy.HighsLp()
+        lp.num_col_ = self.num_cols()
+        lp.num_row_ = self.num_rows()
+        lp.col_cost_ = self.cost
+        lp.col_lower_ = np.zeros(self.num_cols())
+        lp.col_upper_ = np.ones(self.num_cols())
+        lp.row_lower_ = self.row_lower
+        lp.row_upper_ = self.row_upper
+        lp.a_matrix_.format_ = highspy.MatrixFormat.kRowwise
+        lp.a_matrix_.num_col_ = self.num_cols()
+        lp.a_matrix_.num_row_ = self.num_rows()
+        lp.a_matrix_.start_ = self.indptr.astype(np.int32)
+        lp.a_matrix_.index_ = self.indices.astype(np.int32)
+        lp.a_matrix_.value_ = np.ones(len(self.indices))
+        lp.integrality_ = [highspy.HighsVarType.kInteger] * self.num_cols()
+        return lp
+
+
+def build_fixed_day_model(arrays: FixedDayArrays, min_weight=0, restrict_available=True) -> MatrixModel:
+    """
+    Build the fixed-day MILP without looping over students or shows in python
+    :param arrays:
+    :param min_weight: no column for pairs below this utility
+    :param restrict_available: no column for pairs where the student can't make the show's slot
+    :return:
+    """
+    n_students, n_shows = arrays.utility.shape
+    n_instruments = arrays.plays.shape[1]
+    mask = arrays.utility >= min_weight
+    if restrict_available:
+        mask &= arrays.available
+    students, shows = np.nonzero(mask)
+    n_cols = len(students)
+    columns = np.arange(n_cols)
+
+    instrument_cols, instruments = np.nonzero(arrays.plays[students])
+    row_ids = np.concatenate([students, n_students + shows,
+                              n_students + n_shows + shows[instrument_cols] * n_instruments + instruments])
+    col_ids = np.concatenate([columns, columns, instrument_cols])
+    n_rows = n_students + n_shows + n_shows * n_instruments
+    order = np.argsort(row_ids, kind='stable')
+    indices = col_ids[order]
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(row_ids, minlength=n_rows))])
+
+    row_lower = np.concatenate([np.ones(n_students), arrays.student_min_max[:, 0],
+                                arrays.instrument_min_max[:, :, 0].ravel()]).astype(float)
+    row_upper = np.concatenate([np.ones(n_students), arrays.student_min_max[:, 1],
+                                arrays.instrument_min_max[:, :, 1].ravel()]).astype(float)
+    cost = -arrays.utility[students, shows].astype(float)
+    return MatrixModel(students=students, shows=shows, cost=cost, row_lower=row_lower,
+                       row_upper=row_upper, indptr=indptr, indices=indices)
+
+
+def start_values(conf: FixedDayInput, model: MatrixModel, initial_assignments: typing.Dict[str, str]) -> np.ndarray:
+    """
+    Column values for a MIP start from student->show assignments
+    :param conf:
+    :param model:
+    :param initial_assignments:
+    :return:
+    """
+    problem = conf.problem()
+    assigned_show = np.array([problem.show_ids.get(initial_assignments.get(student_name), -1) for student_name in
+                              problem.student_names], dtype=int).reshape(problem.n_students())
+    return (assigned_show[model.students] == model.shows).astype(float)
+
+
+def set_limits(highs: highspy.Highs, time_limit=None, gap=None):
+    """
+    :param highs:
+    :param time_limit: seconds, or None for no limit
+    :param gap: relative MIP gap, or None for the default
+    :return:
+    """
+    highs.setOptionValue('time_limit', float(time_limit) if time_limit is not None else highspy.kHighsInf)
+    highs.setOptionValue('mip_rel_gap', float(gap) if gap is not None else MIP_REL_GAP)
+
+
+def read_result(highs: highspy.Highs, conf: FixedDayInput, model: MatrixModel, min_weight, gap=None) -> typing.Tuple[
+    FixedSlotSolution, typing.Optional[np.ndarray]]:
+    """
+    Read what HiGHS found. If it ran out of time, the solution is the best one it had, if any, and the bound is the
+    lower of HiGHS' dual bound and the cheap upper bound
+    :param highs:
+    :param conf:
+    :param model:
+    :param min_weight:
+    :param gap: the gap HiGHS was given, if any
+    :return: solution, column values or None if there is no solution
+    """
+    status = highs.getModelStatus()
+    info = highs.getInfo()
+    if status == highspy.HighsModelStatus.kOptimal:
+        bound = -info.mip_dual_bound if gap is not None else None
+    elif status == highspy.HighsModelStatus.kTimeLimit:
+        count('stopped_early')
+        bound = min(-info.mip_dual_bound, upper_bound(conf=conf, min_weight=min_weight))
+        if info.primal_solution_status != highspy.SolutionStatus.kSolutionStatusFeasible:
+            return ShowAssignmentsImp(utility=-np.inf, bound=bound), None
+    else:
+        return ShowAssignmentsImp(utility=-np.inf), None
+    x = np.array(highs.getSolution().col_value)
+    chosen = np.flatnonzero(x > 0.5)
+    return conf.problem().to_solution(utility=-info.objective_function_value, students=model.students[chosen],
+                                      shows=model.shows[chosen], bound=bound), x
+
+
+def solve_fixed_day_matrix(conf: FixedDayInput, min_weight=0, cutoff=None,
+                           initial_assignments: typing.Dict[str, str] = None, time_limit=None,
+                           gap=None) -> FixedSlotSolution:
+    """
+    Same as solve_fixed_day, but builds the model from arrays and solves it with HiGHS in process. Presolve only
+    rejects subproblems its counts show are infeasible, the model is built from the full subproblem
+    :param conf:
+    :param min_weight:
+    :param cutoff: only look for solutions with at least this utility. Reported as infeasible if there is none
+    :param initial_assignments: student->show assignments to start the MIP from
+    :param time_limit: seconds HiGHS may run
+    :param gap: stop once the solution is within this relative gap of optimal
+    :return:
+    """
+    count('fixed_day_solves')
+    with timer('presolve'):
+        reduced = presolve(conf, min_weight=min_weight)
+    if reduced.infeasible is not None:
+        count('infeasible_without_solver')
+        return ShowAssignmentsImp(utility=-np.inf)
+    with timer('model_build'):
+        model = build_fixed_day_model(fixed_day_arrays(conf), min_weight=min_weight)
+    count('variables', model.num_cols())
+    count('constraints', model.num_rows())
+    highs = highspy.Highs()
+    highs.setOptionValue('output_flag', False)
+    highs.passModel(model.to_highs())
+    if initial_assignments is not None:
+        start = highspy.HighsSolution()
+        start.col_value = list(start_values(conf=conf, model=model, initial_assignments=initial_assignments))
+        highs.setSolution(start)
+    if cutoff is not None:
+        highs.setOptionValue('objective_bound', -cutoff + TOLERANCE)
+    set_limits(highs, time_limit=time_limit, gap=gap)
+    with timer('solver'):
+        highs.run()
+    solution, _ = read_result(highs, conf=conf, model=model, min_weight=min_weight, gap=gap)
+    return solution
+
+
+def solve_matrix(conf: Config, stats: SearchStats = None) -> typing.Tuple[object, object]:
+    """
+    Same as solve, but every fixed-day subproblem is built from arrays and solved by HiGHS in process
+    :param conf:
+    :param stats: filled with counts of evaluated and pruned subproblems
+    :return:
+    """
+    return solve(conf=conf, min_pref_solver=partial(solve_min_pref, fixed_day_solver=solve_fixed_day_matrix,
+                                                    stats=stats))
+
+
+def test_solve_fixed_day_matrix_matches_cbc():
+    from dbtest.fixtures import weekend_config
+    conf = weekend_config()
+    for min_weight in [3, 2, 1]:
+        for slot_assignment, fixed_day_config in get_fixed_day_configs(conf):
+            expected = solve_fixed_day(fixed_day_config, min_weight=min_weight).utility()
+            assert solve_fixed_day_matrix(fixed_day_config, min_weight=min_weight).utility() == expected, \
+                slot_assignment
+
+
+def test_build_fixed_day_model_large():
+    random = np.random.RandomState(0)
+    n_students = 2000
+    n_shows = 40
+    plays = np.zeros((n_students, len(INSTRUMENTS)), dtype=bool)
+    plays[np.arange(n_students), random.randint(len(INSTRUMENTS), size=n_students)] = True
+    arrays = FixedDayArrays(utility=random.randint(1, n_shows + 1, size=(n_students, n_shows)).astype(float),
+                            available=random.rand(n_students, n_shows) < 0.8, plays=plays,
+                            student_min_max=np.tile([5., 100.], (n_shows, 1)),
+                            instrument_min_max=np.tile([0., 9999.], (n_shows, len(INSTRUMENTS), 1)))
+    start = time.time()
+    model = build_fixed_day_model(arrays)
+    elapsed = time.time() - start
+    n_cols = arrays.available.sum()
+    assert model.num_cols() == n_cols
+    assert model.num_rows() == n_students + n_shows + n_shows * len(INSTRUMENTS)
+    # every column is in its student row, its show row and one instrument row
+    assert len(model.indices) == 3 * n_cols
+    assert elapsed < 1, elapsed
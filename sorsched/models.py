@@ -1,17 +1,38 @@
+from datetime import datetime
 from uuid import uuid4
 
 from sorsched import db
 
+# program rows belong to when none is given. Every table but instrument is scoped by program, so one database holds
+# many independent schools and terms
+DEFAULT_PROGRAM = 'default'
+
 
 def uuid4str():
     return str(uuid4())
 
 
+def program_column():
+    return db.Column(db.String(80), primary_key=True, default=DEFAULT_PROGRAM)
+
+
+def program_foreign_key(column, table):
+    """
+    Foreign key to the name of a row of the same program
+    :param column:
+    :param table:
+    :return:
+    """
+    return db.ForeignKeyConstraint(['program', column], ['{}.program'.format(table), '{}.name'.format(table)])
+
+
 class Slot(db.Model):
+    program = program_column()
     name = db.Column(db.String(80), primary_key=True)
     max_shows = db.Column(db.Integer, default=0)
 
-    def __init__(self, name, max_shows):
+    def __init__(self, name, max_shows, program=DEFAULT_PROGRAM):
+        self.program = program
         self.name = name
         self.max_shows = max_shows
 
@@ -21,6 +42,7 @@ class Slot(db.Model):
 
 class Show(db.Model):
     __tablename__ = 'show'
+    program = program_column()
     name = db.Column(db.String(80), primary_key=True)
     min_students = db.Column(db.Integer)
     max_students = db.Column(db.Integer)
@@ -36,7 +58,9 @@ class Show(db.Model):
 
     def __init__(self, name,
                  min_students, max_students,
+                 program=DEFAULT_PROGRAM,
                  ):
+        self.program = program
         self.name = name
         self.min_students = min_students
         self.max_students = max_students
@@ -44,7 +68,9 @@ class Show(db.Model):
 
 class ShowInstrument(db.Model):
     __tablename__ = 'show_instrument'
-    show_name = db.Column(db.String(80),db.ForeignKey("show.name"),primary_key=True)
+    __table_args__ = (program_foreign_key('show_name', 'show'),)
+    program = program_column()
+    show_name = db.Column(db.String(80),primary_key=True)
     instrument_name = db.Column(db.String(80), db.ForeignKey("instrument.name"), primary_key=True)
     min_instruments = db.Column(db.Integer, nullable=False)
     max_instruments = db.Column(db.Integer, nullable=False)
@@ -56,7 +82,8 @@ class ShowInstrument(db.Model):
             max_instrument=self.max_instruments,
         )
 
-    def __init__(self, show_name, instrument_name, min_instruments, max_instruments):
+    def __init__(self, show_name, instrument_name, min_instruments, max_instruments, program=DEFAULT_PROGRAM):
+        self.program=program
         self.show_name=show_name
         self.instrument_name=instrument_name
         self.min_instruments=min_instruments
@@ -65,6 +92,7 @@ class ShowInstrument(db.Model):
 
 
 class Student(db.Model):
+    program = program_column()
     name = db.Column(db.String(80), primary_key=True)
     show_preferences = db.relationship('ShowPreference', cascade="delete")
     instruments = db.relationship('StudentInstrument')
@@ -73,7 +101,8 @@ class Student(db.Model):
     def __repr__(self):
         return '<Student({name}; {preferences})>'.format(name=self.name, preferences=self.show_preferences)
 
-    def __init__(self, name):
+    def __init__(self, name, program=DEFAULT_PROGRAM):
+        self.program = program
         self.name = name
 
 
@@ -89,10 +118,13 @@ class Instrument(db.Model):
 
 class SlotAvailable(db.Model):
     __tablename__ = "slot_available"
-    student_name = db.Column(db.String(80), db.ForeignKey("student.name"), primary_key=True)
-    slot_name = db.Column(db.String(80), db.ForeignKey("slot.name"), primary_key=True)
+    __table_args__ = (program_foreign_key('student_name', 'student'), program_foreign_key('slot_name', 'slot'))
+    program = program_column()
+    student_name = db.Column(db.String(80), primary_key=True)
+    slot_name = db.Column(db.String(80), primary_key=True)
 
-    def __init__(self, student_name, slot_name):
+    def __init__(self, student_name, slot_name, program=DEFAULT_PROGRAM):
+        self.program=program
         self.student_name=student_name
         self.slot_name=slot_name
 
@@ -102,8 +134,11 @@ class SlotAvailable(db.Model):
 
 
 class ShowPreference(db.Model):
-    student_name = db.Column(db.String(80), db.ForeignKey("student.name"), primary_key=True)
-    show_name = db.Column(db.String(80), db.ForeignKey("show.name"), primary_key=True)
+    __table_args__ = (program_foreign_key('student_name', 'student'), program_foreign_key('show_name', 'show'),
+                      db.Index('ix_show_preference_show', 'program', 'show_name'))
+    program = program_column()
+    student_name = db.Column(db.String(80), primary_key=True)
+    show_name = db.Column(db.String(80), primary_key=True)
     preference = db.Column(db.Float, default=0)
 
     def __repr__(self):
@@ -113,17 +148,21 @@ class ShowPreference(db.Model):
             preference=self.preference
         )
 
-    def __init__(self, student_name, show_name, preference):
+    def __init__(self, student_name, show_name, preference, program=DEFAULT_PROGRAM):
+        self.program = program
         self.student_name = student_name
         self.show_name = show_name
         self.preference = preference
 
 
 class StudentInstrument(db.Model):
-    student_name = db.Column(db.String(80), db.ForeignKey("student.name"), primary_key=True)
+    __table_args__ = (program_foreign_key('student_name', 'student'),)
+    program = program_column()
+    student_name = db.Column(db.String(80), primary_key=True)
     instrument_name = db.Column(db.String(80), db.ForeignKey("instrument.name"), primary_key=True)
 
-    def __init__(self, student_name=None, instrument_name=None):
+    def __init__(self, student_name=None, instrument_name=None, program=DEFAULT_PROGRAM):
+        self.program = program
         self.student_name = student_name
         self.instrument_name = instrument_name
 
@@ -131,18 +170,58 @@ class StudentInstrument(db.Model):
         return "<StudentInstrument: {} - {}>".format(self.student_name,self.instrument_name)
 
 
-class ShowSlotAssignment(db.Model):
-    show_name=db.Column(db.String(80),db.ForeignKey("show.name"), primary_key=True)
-    slot_name=db.Column(db.String(80),db.ForeignKey("slot.name"), nullable=False)
+class AssignmentRun(db.Model):
+    """
+    One saved optimization result. Versions go up by one per save of the program
+    """
+    __tablename__ = 'assignment_run'
+    __table_args__ = (db.UniqueConstraint('program', 'version'),)
+    id = db.Column(db.String(36), primary_key=True, default=uuid4str)
+    program = db.Column(db.String(80), nullable=False, default=DEFAULT_PROGRAM)
+    version = db.Column(db.Integer, nullable=False)
+    created = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    utility = db.Column(db.Float)
+    # rows of the assignment tables this run changed
+    inserted = db.Column(db.Integer, default=0)
+    updated = db.Column(db.Integer, default=0)
+    deleted = db.Column(db.Integer, default=0)
+
+    def __init__(self, version, utility=None, program=DEFAULT_PROGRAM):
+        self.id = uuid4str()
+        self.program = program
+        self.version = version
+        self.utility = utility
 
-    def __init__(self,show_name,slot_name):
+    def __repr__(self):
+        return "<AssignmentRun: version {} +{} ~{} -{}>".format(self.version, self.inserted, self.updated,
+                                                               self.deleted)
+
+
+class ShowSlotAssignment(db.Model):
+    __table_args__ = (program_foreign_key('show_name', 'show'), program_foreign_key('slot_name', 'slot'))
+    program=program_column()
+    show_name=db.Column(db.String(80), primary_key=True)
+    slot_name=db.Column(db.String(80), nullable=False)
+    # run that last wrote the row
+    run_id=db.Column(db.String(36),db.ForeignKey("assignment_run.id"))
+
+    def __init__(self,show_name,slot_name,run_id=None,program=DEFAULT_PROGRAM):
+        self.program=program
         self.show_name=show_name
         self.slot_name=slot_name
+        self.run_id=run_id
 
 class StudentShowAssignment(db.Model):
-    student_name=db.Column(db.String(80),db.ForeignKey("student.name"), primary_key=True)
-    show_name=db.Column(db.String(80),db.ForeignKey("show.name"), nullable=False)
-
-    def __init__(self, student_name, show_name ):
+    __table_args__ = (program_foreign_key('student_name', 'student'), program_foreign_key('show_name', 'show'),
+                      db.Index('ix_student_show_assignment_show', 'program', 'show_name'))
+    program=program_column()
+    student_name=db.Column(db.String(80), primary_key=True)
+    show_name=db.Column(db.String(80), nullable=False)
+    # run that last wrote the row
+    run_id=db.Column(db.String(36),db.ForeignKey("assignment_run.id"))
+
+    def __init__(self, student_name, show_name, run_id=None, program=DEFAULT_PROGRAM):
+        self.program=program
         self.student_name=student_name
-        self.show_name=show_name
\ No newline at end of file
+        self.show_name=show_name
+        self.run_id=run_id
\ No newline at end of file
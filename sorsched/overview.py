@@ -0,0 +1,95 @@
+import typing
+
+from sqlalchemy import func, and_
+
+from dbtest.testdb import TestDb
+from sorsched import db
+from sorsched.canned_inputs import seed
+from sorsched.models import Show, Slot, Student, ShowPreference, StudentShowAssignment, ShowSlotAssignment, \
+    DEFAULT_PROGRAM
+
+
+def show_overview(session, program=DEFAULT_PROGRAM) -> typing.List[tuple]:
+    """
+    One row per show with its student bounds, number of assigned students and assigned slot, counted in the database
+    :param session:
+    :param program:
+    :return: rows with name, min_students, max_students, assigned_students, slot_name
+    """
+    counts = session.query(StudentShowAssignment.show_name, func.count().label('n')).filter(
+        StudentShowAssignment.program == program).group_by(StudentShowAssignment.show_name).subquery()
+    return session.query(Show.name, Show.min_students, Show.max_students,
+                         func.coalesce(counts.c.n, 0).label('assigned_students'), ShowSlotAssignment.slot_name).outerjoin(
+        counts, counts.c.show_name == Show.name).outerjoin(
+        ShowSlotAssignment, and_(ShowSlotAssignment.program == Show.program,
+                                 ShowSlotAssignment.show_name == Show.name)).filter(
+        Show.program == program).order_by(Show.name).all()
+
+
+def slot_names(session, program=DEFAULT_PROGRAM) -> typing.List[str]:
+    return [x.name for x in session.query(Slot.name).filter(Slot.program == program).order_by(Slot.name)]
+
+
+def student_page(session, page=1, per_page=50, program=DEFAULT_PROGRAM) -> typing.Tuple[typing.List[tuple], bool]:
+    """
+    One page of students, in name order, with their favorite show and assigned show. Only the page's preferences are
+    ranked, so the cost doesn't grow with the number of students
+    :param session:
+    :param page: starting at 1
+    :param per_page:
+    :param program:
+    :return: rows with name, top_show, top_preference, assigned_show; and whether there is a next page
+    """
+    students = session.query(Student.name).filter(Student.program == program).order_by(Student.name).limit(
+        per_page + 1).offset((page - 1) * per_page).subquery()
+    ranked = session.query(
+        ShowPreference.student_name, ShowPreference.show_name, ShowPreference.preference,
+        func.row_number().over(partition_by=ShowPreference.student_name,
+                               order_by=(ShowPreference.preference.desc(), ShowPreference.show_name)).label('rank')
+    ).filter(ShowPreference.program == program,
+             ShowPreference.student_name.in_(session.query(students.c.name))).subquery()
+    rows = session.query(students.c.name, ranked.c.show_name.label('top_show'),
+                         ranked.c.preference.label('top_preference'),
+                         StudentShowAssignment.show_name.label('assigned_show')).outerjoin(
+        ranked, and_(ranked.c.student_name == students.c.name, ranked.c.rank == 1)).outerjoin(
+        StudentShowAssignment, and_(StudentShowAssignment.program == program,
+                                    StudentShowAssignment.student_name == students.c.name)).order_by(
+        students.c.name).all()
+    return rows[:per_page], len(rows) > per_page
+
+
+class TestOverview(TestDb):
+    @classmethod
+    def base(cls):
+        return db.Model
+
+    def test_overview(self):
+        seed(self.session)
+        self.session.add_all([StudentShowAssignment(student_name='Ramona', show_name='Metallica'),
+                              StudentShowAssignment(student_name='Chao', show_name='Metallica'),
+                              ShowSlotAssignment(show_name='Metallica', slot_name='Wed')])
+        self.session.flush()
+
+        shows = dict([(x.name, x) for x in show_overview(self.session)])
+        assert shows['Metallica'].assigned_students == 2
+        assert shows['Metallica'].slot_name == 'Wed'
+        assert shows['Led Zeppelin'].assigned_students == 0
+        assert shows['Led Zeppelin'].slot_name is None
+        assert slot_names(self.session) == ['Sat-1', 'Sat-2', 'Wed']
+
+        rows, has_next = student_page(self.session, page=1, per_page=2)
+        assert [x.name for x in rows] == ['Chao', 'Jennifer']
+        assert has_next
+        # Chao likes both shows the same, ties go by show name
+        assert (rows[0].top_show, rows[0].top_preference, rows[0].assigned_show) == ('Led Zeppelin', 2, 'Metallica')
+        assert (rows[1].top_show, rows[1].assigned_show) == ('Led Zeppelin', None)
+        rows, has_next = student_page(self.session, page=2, per_page=2)
+        assert [(x.name, x.top_show) for x in rows] == [('Ramona', 'Metallica')]
+        assert not has_next
+
+        # other programs don't show up
+        seed(self.session, program='fall')
+        self.session.flush()
+        assert [x.assigned_students for x in show_overview(self.session, program='fall')] == [0, 0]
+        assert show_overview(self.session)[1].assigned_students == 2
+        assert len(student_page(self.session, per_page=10)[0]) == 3
@@ -0,0 +1,115 @@
+import typing
+
+import numpy as np
+
+from sorsched.data import FixedDayInput
+from sorsched.problem import INSTRUMENTS
+from sorsched.profiling import count
+
+
+class Presolved(object):
+    """
+    Fixed-day subproblem after presolve. Students with a single eligible show are taken out of the model, and the
+    bounds left are what the other students still have to meet
+    """
+
+    def __init__(self, allowed: np.ndarray, fixed_show: np.ndarray, student_min_max: np.ndarray,
+                 instrument_min_max: np.ndarray, binding: np.ndarray, infeasible: typing.Optional[str] = None,
+                 pairs_dropped=0, bounds_dropped=0):
+        # students x shows, pairs of students who aren't fixed that get a variable
+        self.allowed = allowed
+        # show of each student fixed by presolve, -1 for the others
+        self.fixed_show = fixed_show
+        # shows x 2, left for the students who aren't fixed
+        self.student_min_max = student_min_max
+        # shows x instruments x 2, left for the students who aren't fixed
+        self.instrument_min_max = instrument_min_max
+        # shows x instruments, instrument bounds that can still rule out an assignment
+        self.binding = binding
+        # why there is no feasible assignment, None if presolve couldn't tell
+        self.infeasible = infeasible
+        self.pairs_dropped = pairs_dropped
+        self.bounds_dropped = bounds_dropped
+
+    def fixed(self) -> np.ndarray:
+        return self.fixed_show >= 0
+
+    def students_fixed(self) -> int:
+        return int(self.fixed().sum())
+
+    def __repr__(self):
+        return '<Presolved: pairs_dropped={}, students_fixed={}, bounds_dropped={}, infeasible={}>'.format(
+            self.pairs_dropped, self.students_fixed(), self.bounds_dropped, self.infeasible)
+
+
+def counting_infeasibility(problem, allowed: np.ndarray, fixed_count: np.ndarray, eligible_count: np.ndarray,
+                           fixed_players: np.ndarray, eligible_players: np.ndarray) -> typing.Optional[str]:
+    """
+    Necessary conditions on the number of students who can go to each show, and play each instrument in it
+    :return: the first condition that fails, None if they all hold
+    """
+    student_lo, student_hi = problem.student_min_max[:, 0], problem.student_min_max[:, 1]
+    instrument_lo, instrument_hi = problem.instrument_min_max[:, :, 0], problem.instrument_min_max[:, :, 1]
+    if not allowed.any(axis=1).all():
+        return 'student {} has no show to go to'.format(
+            problem.student_names[int(np.argmin(allowed.any(axis=1)))])
+    checks = [(eligible_count < student_lo, 'show {} has fewer students available than its min'),
+              (fixed_count > student_hi, 'show {} has more students with nowhere else to go than its max'),
+              (eligible_players < instrument_lo, 'show {} has fewer {} players available than its min'),
+              (fixed_players > instrument_hi, 'show {} has more {} players with nowhere else to go than its max')]
+    for failed, message in checks:
+        if failed.any():
+            index = np.argwhere(failed)[0]
+            return message.format(problem.show_names[index[0]], *[INSTRUMENTS[m].name for m in index[1:]])
+    n_students = allowed.shape[0]
+    if student_lo.sum() > n_students:
+        return 'the shows need more students than there are'
+    if np.minimum(student_hi, eligible_count).sum() < n_students:
+        return 'the shows have room for fewer students than there are'
+    return None
+
+
+def presolve(conf: FixedDayInput, min_weight=0) -> Presolved:
+    """
+    Reduce the fixed-day subproblem before a model is built: drop the pairs where the student can't make the show's
+    slot or is below min weight, fix students left with a single show, drop the instrument bounds no assignment can
+    break, and check counting conditions that rule out any assignment. The statistics go to the active profile
+    :param conf:
+    :param min_weight:
+    :return:
+    """
+    problem = conf.problem()
+    plays = problem.plays.astype(np.int64)
+    allowed = conf.available() & (problem.utility >= min_weight)
+    fixed = allowed.sum(axis=1) == 1
+    fixed_show = np.where(fixed, allowed.argmax(axis=1), -1)
+
+    n_shows = allowed.shape[1]
+    eligible_count = allowed.sum(axis=0)
+    fixed_count = np.bincount(fixed_show[fixed], minlength=n_shows)
+    eligible_players = allowed.T.astype(np.int64) @ plays
+    fixed_players = allowed[fixed].T.astype(np.int64) @ plays[fixed]
+
+    # what the students who aren't fixed still have to meet
+    student_min_max = np.stack([np.maximum(problem.student_min_max[:, 0] - fixed_count, 0),
+                                problem.student_min_max[:, 1] - fixed_count], axis=1)
+    instrument_min_max = np.stack([np.maximum(problem.instrument_min_max[:, :, 0] - fixed_players, 0),
+                                   problem.instrument_min_max[:, :, 1] - fixed_players], axis=2)
+    # a max can't be broken if there aren't enough players left, or the show can't take that many students
+    free_players = eligible_players - fixed_players
+    binding = (instrument_min_max[:, :, 0] > 0) | (
+            instrument_min_max[:, :, 1] < np.minimum(free_players, student_min_max[:, 1:]))
+
+    infeasible = counting_infeasibility(problem, allowed=allowed, fixed_count=fixed_count,
+                                        eligible_count=eligible_count, fixed_players=fixed_players,
+                                        eligible_players=eligible_players)
+    result = Presolved(allowed=allowed & ~fixed[:, None], fixed_show=fixed_show, student_min_max=student_min_max,
+                       instrument_min_max=instrument_min_max, binding=binding, infeasible=infeasible,
+                       pairs_dropped=int(allowed.size - allowed.sum()),
+                       bounds_dropped=int(problem.binding_instrument_bounds().sum() - binding.sum()))
+    count('presolve_pairs_dropped', result.pairs_dropped)
+    count('presolve_students_fixed', result.students_fixed())
+    count('presolve_bounds_dropped', result.bounds_dropped)
+    if infeasible is not None:
+        count('presolve_infeasible')
+    return result
@@ -0,0 +1,177 @@
+import pickle
+import typing
+
+import numpy as np
+
+from sorsched.data import Instrument, Show, ShowAssignmentsImp, SlotAssignment, ShowSnapshot, SlotSnapshot, \
+    StudentSnapshot
+from sorsched.input_config import ConfigImp
+
+INSTRUMENTS = tuple(Instrument)
+# max students playing an instrument in a show when the show doesn't say
+UNBOUNDED = 9999
+
+
+def instrument_min_max(show: Show, instrument: Instrument) -> typing.Tuple[int, int]:
+    """
+    Get the min and max number of students playing the instrument in the show. Unconstrained if not specified
+    :param show:
+    :param instrument:
+    :return:
+    """
+    return show.instrument_min_max()[instrument] if instrument in show.instrument_min_max() else (0, UNBOUNDED)
+
+
+class Problem(object):
+    """
+    Immutable array form of a config. Students, shows, slots and instruments are numbered by their position, so the
+    solvers index arrays instead of calling methods and looking up names
+    """
+    __slots__ = ('student_names', 'show_names', 'slot_names', 'utility', 'available', 'plays', 'student_min_max',
+                 'instrument_min_max', 'max_shows', 'student_ids', 'show_ids', 'slot_ids')
+
+    def __init__(self, student_names: typing.Sequence[str], show_names: typing.Sequence[str],
+                 slot_names: typing.Sequence[str], utility: np.ndarray, available: np.ndarray, plays: np.ndarray,
+                 student_min_max: np.ndarray, instrument_min_max: np.ndarray, max_shows: np.ndarray):
+        """
+        :param student_names:
+        :param show_names:
+        :param slot_names:
+        :param utility: students x shows, -inf where the student has no preference for the show
+        :param available: students x slots
+        :param plays: students x instruments
+        :param student_min_max: shows x 2
+        :param instrument_min_max: shows x instruments x 2
+        :param max_shows: slots
+        """
+        values = dict(student_names=tuple(student_names), show_names=tuple(show_names), slot_names=tuple(slot_names),
+                      utility=np.asarray(utility, dtype=np.float32), available=np.asarray(available, dtype=bool),
+                      plays=np.asarray(plays, dtype=bool), student_min_max=np.asarray(student_min_max, dtype=np.int32),
+                      instrument_min_max=np.asarray(instrument_min_max, dtype=np.int32),
+                      max_shows=np.asarray(max_shows, dtype=np.int32))
+        values['student_ids'] = dict([(name, i) for i, name in enumerate(values['student_names'])])
+        values['show_ids'] = dict([(name, j) for j, name in enumerate(values['show_names'])])
+        values['slot_ids'] = dict([(name, k) for k, name in enumerate(values['slot_names'])])
+        for name, value in values.items():
+            if isinstance(value, np.ndarray):
+                value.setflags(write=False)
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, key, value):
+        raise AttributeError('Problem is immutable')
+
+    def __getstate__(self):
+        return dict([(name, getattr(self, name)) for name in self.__slots__])
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
+    def __repr__(self):
+        return '<Problem: {} students, {} shows, {} slots>'.format(self.n_students(), self.n_shows(),
+                                                                  len(self.slot_names))
+
+    @classmethod
+    def from_config(cls, conf) -> 'Problem':
+        """
+        :param conf: Config
+        :return:
+        """
+        students = conf.students()
+        shows = conf.shows()
+        slots = conf.slots()
+        show_names = [show.name() for show in shows]
+        slot_names = [slot.name() for slot in slots]
+        utility = np.full((len(students), len(shows)), -np.inf, dtype=np.float32)
+        available = np.zeros((len(students), len(slots)), dtype=bool)
+        plays = np.zeros((len(students), len(INSTRUMENTS)), dtype=bool)
+        slot_ids = dict([(name, k) for k, name in enumerate(slot_names)])
+        instrument_ids = dict([(instrument, m) for m, instrument in enumerate(INSTRUMENTS)])
+        for i, student in enumerate(students):
+            preferences = student.show_preferences()
+            utility[i] = [preferences.get(name, -np.inf) for name in show_names]
+            available[i, [slot_ids[name] for name in student.available_slots() if name in slot_ids]] = True
+            plays[i, [instrument_ids[instrument] for instrument in student.instruments()]] = True
+        student_min_max = np.array([show.student_min_max() for show in shows], dtype=np.int32).reshape(len(shows), 2)
+        bounds = np.array([[instrument_min_max(show=show, instrument=instrument) for instrument in INSTRUMENTS]
+                           for show in shows], dtype=np.int32).reshape(len(shows), len(INSTRUMENTS), 2)
+        return cls(student_names=[student.name() for student in students], show_names=show_names,
+                   slot_names=slot_names, utility=utility, available=available, plays=plays,
+                   student_min_max=student_min_max, instrument_min_max=bounds,
+                   max_shows=[slot.max_shows() for slot in slots])
+
+    def n_students(self) -> int:
+        return len(self.student_names)
+
+    def n_shows(self) -> int:
+        return len(self.show_names)
+
+    def binding_instrument_bounds(self) -> np.ndarray:
+        """
+        :return: shows x instruments, whether the instrument min/max can rule out an assignment the show's student
+        min/max allows
+        """
+        lo, hi = self.instrument_min_max[:, :, 0], self.instrument_min_max[:, :, 1]
+        return (lo > 0) | (hi < self.student_min_max[:, 1:])
+
+    def show_slot_ids(self, slot_assignment: SlotAssignment) -> np.ndarray:
+        """
+        :param slot_assignment:
+        :return: slot id for each show
+        """
+        show_slots = slot_assignment.show_slots()
+        return np.array([self.slot_ids[show_slots[name]] for name in self.show_names], dtype=np.int32)
+
+    def availability(self, slot_assignment: SlotAssignment) -> np.ndarray:
+        """
+        :param slot_assignment:
+        :return: students x shows, whether the student can make the show's slot
+        """
+        return self.available[:, self.show_slot_ids(slot_assignment)]
+
+    def to_solution(self, utility: float, students: np.ndarray, shows: np.ndarray, bound=None) -> ShowAssignmentsImp:
+        """
+        Name the student->show assignments
+        :param utility:
+        :param students: student ids
+        :param shows: show ids, one per student id
+        :param bound: see ShowAssignmentsImp
+        :return:
+        """
+        return ShowAssignmentsImp(utility=utility, bound=bound, assignments=dict(
+            [(self.student_names[i], self.show_names[j]) for i, j in zip(students, shows)]))
+
+
+def test_problem_from_config():
+    conf = ConfigImp(
+        shows=[ShowSnapshot(name='Led', student_min_max=(1, 2), instrument_min_max={Instrument.Guitar: (1, 1)}),
+               ShowSnapshot(name='Met', student_min_max=(0, 3), instrument_min_max={})],
+        slots=[SlotSnapshot(name='Wed', max_shows=1), SlotSnapshot(name='Sat', max_shows=2)],
+        students=[StudentSnapshot(name='Ramona', show_preferences={'Led': 2, 'Met': 1}, available_slots=['Sat'],
+                                  instruments=[Instrument.Vocals]),
+                  StudentSnapshot(name='Chao', show_preferences={'Led': 1}, available_slots=['Wed', 'Sat'],
+                                  instruments=[Instrument.Guitar])])
+    problem = Problem.from_config(conf)
+    assert problem.utility.tolist() == [[2, 1], [1, -np.inf]]
+    assert problem.available.tolist() == [[False, True], [True, True]]
+    assert problem.plays[1, INSTRUMENTS.index(Instrument.Guitar)] and problem.plays.sum() == 2
+    assert problem.student_min_max.tolist() == [[1, 2], [0, 3]]
+    assert problem.instrument_min_max[0, INSTRUMENTS.index(Instrument.Guitar)].tolist() == [1, 1]
+    assert problem.instrument_min_max[1, 0].tolist() == [0, UNBOUNDED]
+    assert problem.max_shows.tolist() == [1, 2]
+    assert problem.binding_instrument_bounds().tolist() == [
+        [instrument == Instrument.Guitar for instrument in INSTRUMENTS], [False] * len(INSTRUMENTS)]
+
+    slot_assignment = SlotAssignment(d={'Led': 'Wed', 'Met': 'Sat'})
+    assert problem.availability(slot_assignment).tolist() == [[False, True], [True, True]]
+    solution = problem.to_solution(utility=2, students=[0, 1], shows=[1, 0])
+    assert solution.student_show_assignment() == {'Ramona': 'Met', 'Chao': 'Led'}
+
+    copy = pickle.loads(pickle.dumps(problem))
+    assert copy.show_ids == problem.show_ids and (copy.utility == problem.utility).all()
+    try:
+        problem.utility = None
+        assert False, 'should be immutable'
+    except AttributeError:
+        pass
+    assert not problem.utility.flags.writeable
@@ -0,0 +1,203 @@
+import cProfile
+import io
+import logging
+import pstats
+import resource
+import time
+import tracemalloc
+import typing
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current = ContextVar('profile', default=None)
+
+
+class Profile(object):
+    """
+    Timers and counters for one run. The solvers report to the profile that is active in the current context, so
+    nothing has to be passed down to them. The hook, if given, is called with (kind, name, value) on every timer and
+    counter update, kind being 'timer' or 'count'. A logger can be given instead, and gets the updates at debug level
+    """
+
+    def __init__(self, hook=None):
+        self.timers = defaultdict(float)
+        self.counters = defaultdict(int)
+        if isinstance(hook, logging.Logger):
+            logger = hook
+            hook = lambda kind, name, value: logger.debug('%s %s %s', kind, name, value)
+        self.hook = hook
+
+    def add_time(self, name, seconds):
+        self.timers[name] += seconds
+        if self.hook is not None:
+            self.hook('timer', name, seconds)
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+        if self.hook is not None:
+            self.hook('count', name, n)
+
+    @contextmanager
+    def activate(self):
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+
+@contextmanager
+def timer(name):
+    """
+    Add the time spent in the block to the active profile, if any
+    :param name:
+    :return:
+    """
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_time(name, time.perf_counter() - start)
+
+
+def add_time(name, seconds):
+    """
+    Add to a timer of the active profile, if any
+    :param name:
+    :param seconds:
+    :return:
+    """
+    profile = _current.get()
+    if profile is not None:
+        profile.add_time(name, seconds)
+
+
+def count(name, n=1):
+    """
+    Add to a counter of the active profile, if any
+    :param name:
+    :param n:
+    :return:
+    """
+    profile = _current.get()
+    if profile is not None:
+        profile.count(name, n)
+
+
+def process_peak_rss() -> int:
+    """
+    :return: peak resident memory of this process so far, in kilobytes. This is the high-water mark of everything the
+    process ran, not of one run
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class RunSummary(object):
+    """
+    What a profiled solve found and where it spent its time
+    """
+
+    def __init__(self, slot_assignment, solution, stats, timers: typing.Dict[str, float],
+                 counters: typing.Dict[str, int], elapsed: float, process_peak_rss: int,
+                 peak_memory: typing.Optional[int] = None, cprofile: str = None):
+        self.slot_assignment = slot_assignment
+        self.solution = solution
+        # SearchStats of the slot assignment search
+        self.stats = stats
+        self.timers = timers
+        self.counters = counters
+        self.elapsed = elapsed
+        # kilobytes, high-water mark of the whole process since it started
+        self.process_peak_rss = process_peak_rss
+        # bytes, peak python memory allocated during the run. None if it wasn't traced
+        self.peak_memory = peak_memory
+        # cProfile report, if asked for
+        self.cprofile = cprofile
+
+    def to_dict(self) -> dict:
+        utility = self.solution.utility() if self.solution is not None else -float('inf')
+        return {
+            'utility': utility if utility > -float('inf') else None,
+            'elapsed': self.elapsed,
+            'timers': dict(self.timers),
+            'counters': dict(self.counters),
+            'search': {
+                'total': self.stats.total,
+                'evaluated': self.stats.evaluated,
+                'pruned': self.stats.pruned,
+                'infeasible': self.stats.infeasible,
+                'improved': self.stats.improved,
+            },
+            'process_peak_rss': self.process_peak_rss,
+            'peak_memory': self.peak_memory,
+        }
+
+    def __repr__(self):
+        timers = ', '.join(['{}={:.3f}s'.format(k, v) for k, v in sorted(self.timers.items())])
+        return '<RunSummary: elapsed={:.3f}s, {}, {}>'.format(self.elapsed, timers, self.stats)
+
+
+def profile_run(solve_fn, conf, stats, hook=None, cprofile=False, cprofile_lines=30,
+                trace_memory=False) -> RunSummary:
+    """
+    Run a solve with a fresh profile active
+    :param solve_fn: function (conf, stats) -> (slot assignment, solution)
+    :param conf:
+    :param stats: SearchStats passed to solve_fn, and kept in the summary
+    :param hook: function (kind, name, value) or logger, see Profile
+    :param cprofile: also run under cProfile, and keep the top functions by cumulative time
+    :param cprofile_lines: number of functions to keep
+    :param trace_memory: also record the peak python memory allocated during the run, as benchmark.measure does.
+    Slows the run down, and is skipped if memory is already being traced, by another run or the caller
+    :return:
+    """
+    profile = Profile(hook=hook)
+    profiler = cProfile.Profile() if cprofile else None
+    # tracing is process-wide, so only the run that started it can read its peak
+    trace_memory = trace_memory and not tracemalloc.is_tracing()
+    peak_memory = None
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with profile.activate():
+        if profiler is not None:
+            profiler.enable()
+        try:
+            slot_assignment, solution = solve_fn(conf, stats)
+            if trace_memory:
+                peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            if trace_memory:
+                tracemalloc.stop()
+    elapsed = time.perf_counter() - start
+
+    report = None
+    if profiler is not None:
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(cprofile_lines)
+        report = out.getvalue()
+    return RunSummary(slot_assignment=slot_assignment, solution=solution, stats=stats, timers=profile.timers,
+                      counters=profile.counters, elapsed=elapsed, process_peak_rss=process_peak_rss(),
+                      peak_memory=peak_memory, cprofile=report)
+
+
+def test_profile():
+    events = []
+    profile = Profile(hook=lambda kind, name, value: events.append((kind, name)))
+    count('ignored')
+    with profile.activate():
+        with timer('build'):
+            count('variables', 3)
+        count('variables', 2)
+    with timer('ignored'):
+        pass
+    assert profile.counters == {'variables': 5}
+    assert list(profile.timers.keys()) == ['build']
+    assert events == [('count', 'variables'), ('timer', 'build'), ('count', 'variables')]
@@ -0,0 +1,161 @@
+import typing
+
+from sqlalchemy import func, delete, update, insert, bindparam, select, and_
+from sqlalchemy.exc import IntegrityError
+
+from dbtest.testdb import TestDb
+from sorsched import db
+from sorsched.canned_inputs import seed
+from sorsched.data import SlotAssignment, FixedSlotSolution, ShowAssignmentsImp
+from sorsched.models import AssignmentRun, ShowSlotAssignment, StudentShowAssignment, DEFAULT_PROGRAM
+
+
+def apply_diff(session, model, key: str, column: str, wanted: typing.Dict[str, str], run_id: str,
+               program=DEFAULT_PROGRAM) -> typing.Tuple[int, int, int]:
+    """
+    Make the program's rows of the table map key to column as in wanted, with one bulk statement each for the
+    deletes, updates and inserts. Rows that are already right are left alone
+    :param session:
+    :param model:
+    :param key: primary key column, besides program
+    :param column: value column
+    :param wanted: key -> value
+    :param run_id: written to the rows that change
+    :param program:
+    :return: number of rows inserted, updated and deleted
+    """
+    table = model.__table__
+    in_program = table.c.program == program
+    stored = dict([(k, v) for k, v in session.execute(select(table.c[key], table.c[column]).where(in_program))])
+    inserts = [{'program': program, key: k, column: v, 'run_id': run_id} for k, v in wanted.items() if
+               k not in stored]
+    updates = [{'b_key': k, 'b_value': v} for k, v in wanted.items() if k in stored and stored[k] != v]
+    deletes = [k for k in stored if k not in wanted]
+    if deletes:
+        session.execute(delete(table).where(in_program, table.c[key].in_(deletes)))
+    if updates:
+        session.execute(update(table).where(in_program, table.c[key] == bindparam('b_key')).values(
+            {column: bindparam('b_value'), 'run_id': run_id}), updates)
+    if inserts:
+        session.execute(insert(table), inserts)
+    return len(inserts), len(updates), len(deletes)
+
+
+def latest_run(session, program=DEFAULT_PROGRAM) -> typing.Optional[AssignmentRun]:
+    """
+    The program's last saved run, locked until the transaction ends so concurrent saves of the program take turns
+    :param session:
+    :param program:
+    :return: None if the program has none
+    """
+    return session.query(AssignmentRun).filter(AssignmentRun.program == program).order_by(
+        AssignmentRun.version.desc()).with_for_update().first()
+
+
+def add_run(session, utility, program=DEFAULT_PROGRAM, attempts=3) -> AssignmentRun:
+    """
+    Add the program's next run. A program's first run has no row to lock, and a save waiting on the lock still sees
+    the version it locked, so a save that loses the race for a version retries with the next one
+    :param session:
+    :param utility:
+    :param program:
+    :param attempts:
+    :return:
+    """
+    for attempt in range(attempts):
+        latest = latest_run(session, program=program)
+        run = AssignmentRun(version=(latest.version if latest is not None else 0) + 1, utility=utility,
+                            program=program)
+        try:
+            with session.begin_nested():
+                session.add(run)
+            return run
+        except IntegrityError:
+            if attempt == attempts - 1:
+                raise
+
+
+def save_assignments(session, slot_assignment: SlotAssignment, optimal_solution: FixedSlotSolution,
+                     program=DEFAULT_PROGRAM) -> AssignmentRun:
+    """
+    Save the assignments as a new run of the program, only writing the rows that changed since its last one. Nothing
+    is committed here; commit once so readers see the whole run or none of it
+    :param session:
+    :param slot_assignment:
+    :param optimal_solution:
+    :param program:
+    :return:
+    """
+    run = add_run(session, utility=optimal_solution.utility(), program=program)
+    counts = [apply_diff(session, ShowSlotAssignment, key='show_name', column='slot_name',
+                         wanted=slot_assignment.show_slots(), run_id=run.id, program=program),
+              apply_diff(session, StudentShowAssignment, key='student_name', column='show_name',
+                         wanted=optimal_solution.student_show_assignment(), run_id=run.id, program=program)]
+    run.inserted, run.updated, run.deleted = [sum(x) for x in zip(*counts)]
+    return run
+
+
+def load_assignments(session, program=DEFAULT_PROGRAM) -> typing.Tuple[typing.Optional[int], typing.List[tuple]]:
+    """
+    Read the program's saved assignments and the version of the run they come from with a single statement, so a run
+    being saved at the same time is either all in or all out
+    :param session:
+    :param program:
+    :return: version or None if nothing is saved, and rows with student_name, show_name, slot_name
+    """
+    version = select(func.max(AssignmentRun.version)).where(AssignmentRun.program == program).scalar_subquery()
+    rows = session.query(StudentShowAssignment.student_name, StudentShowAssignment.show_name,
+                         ShowSlotAssignment.slot_name, version.label('version')).outerjoin(
+        ShowSlotAssignment, and_(ShowSlotAssignment.program == StudentShowAssignment.program,
+                                 ShowSlotAssignment.show_name == StudentShowAssignment.show_name)).filter(
+        StudentShowAssignment.program == program).order_by(StudentShowAssignment.student_name).all()
+    if not rows:
+        return session.query(func.max(AssignmentRun.version)).filter(AssignmentRun.program == program).scalar(), []
+    return rows[0].version, rows
+
+
+class TestSaveAssignments(TestDb):
+    @classmethod
+    def base(cls):
+        return db.Model
+
+    def test_save_assignments(self):
+        seed(self.session)
+        self.session.flush()
+        slot_assignment = SlotAssignment(d={'Led Zeppelin': 'Wed', 'Metallica': 'Sat-1'})
+        run = save_assignments(self.session, slot_assignment, ShowAssignmentsImp(utility=9, assignments={
+            'Ramona': 'Metallica', 'Jennifer': 'Led Zeppelin', 'Chao': 'Led Zeppelin'}))
+        assert (run.version, run.inserted, run.updated, run.deleted) == (1, 5, 0, 0)
+
+        slot_assignment = SlotAssignment(d={'Led Zeppelin': 'Wed', 'Metallica': 'Sat-2'})
+        run = save_assignments(self.session, slot_assignment, ShowAssignmentsImp(utility=8, assignments={
+            'Ramona': 'Metallica', 'Jennifer': 'Metallica'}))
+        # Metallica and Jennifer moved, Chao is gone
+        assert (run.version, run.inserted, run.updated, run.deleted) == (2, 0, 2, 1)
+
+        version, rows = load_assignments(self.session)
+        assert version == 2
+        assert [(x.student_name, x.show_name, x.slot_name) for x in rows] == [
+            ('Jennifer', 'Metallica', 'Sat-2'), ('Ramona', 'Metallica', 'Sat-2')]
+        ramona = self.session.query(StudentShowAssignment).get(('default', 'Ramona'))
+        self.session.refresh(ramona)
+        assert ramona.run_id != run.id
+
+        # another program has its own versions and rows
+        seed(self.session, program='fall')
+        self.session.flush()
+        run = save_assignments(self.session, slot_assignment, ShowAssignmentsImp(utility=1, assignments={
+            'Chao': 'Metallica'}), program='fall')
+        assert (run.version, run.inserted, run.updated, run.deleted) == (1, 3, 0, 0)
+        assert [x.student_name for x in load_assignments(self.session, program='fall')[1]] == ['Chao']
+        assert load_assignments(self.session)[0] == 2
+
+        # a save that lost the race for version 3 takes version 4
+        from unittest.mock import patch
+        stale = latest_run(self.session)
+        self.session.add(AssignmentRun(version=3, program='default'))
+        self.session.flush()
+        with patch('sorsched.results.latest_run', side_effect=[stale, latest_run(self.session)]):
+            run = save_assignments(self.session, slot_assignment, ShowAssignmentsImp(utility=8, assignments={
+                'Ramona': 'Metallica', 'Jennifer': 'Metallica'}))
+        assert (run.version, run.inserted, run.updated, run.deleted) == (4, 0, 0, 0)
@@ -1,82 +1,179 @@
-import tempfile
+import logging
+import time
+import tracemalloc
 import typing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from itertools import product
 from typing import Tuple
-from unittest.mock import MagicMock
 
 import numpy as np
-from pulp import LpVariable, LpInteger, LpProblem, LpMinimize, lpSum, LpStatus, value
+from pulp import LpVariable, LpInteger, LpProblem, LpMinimize, lpSum, LpStatus, value, PULP_CBC_CMD, \
+    LpAffineExpression, LpStatusNotSolved, LpSolutionIntegerFeasible, getSolver
 
 from sorsched.data import SlotAssignment, Instrument, Slot, Student, Show, ShowAssignmentsImp, FixedDayInput, \
     FixedSlotSolution
 from sorsched.fixed_day_input import FixedDayInputImp
+from sorsched.flow import solve_fixed_day_flow
+from sorsched.presolve import presolve
 from sorsched.input_config import Config, ConfigImp
-from sorsched.assign_slots_to_shows import enumerate_slot_assignments
+from sorsched.assign_slots_to_shows import enumerate_slot_assignments, enumerate_canonical_slot_assignments, \
+    PruningStats
+from sorsched.problem import Problem, INSTRUMENTS
+from sorsched.profiling import timer, count, add_time, profile_run, RunSummary, Profile
 
+logger = logging.getLogger(__name__)
 
-def solve_fixed_day(conf: FixedDayInput, min_weight=0) -> FixedSlotSolution:
+
+# utilities closer than this are considered equal
+TOLERANCE = 1e-6
+
+
+class SearchStats(object):
+    """
+    Counts what happened to the fixed-day subproblems during a search over slot assignments
     """
-    Optimizes over student->show assignments given student-show preference scores
+
+    def __init__(self):
+        # subproblems enumerated so far, over all min weights
+        self.total = 0
+        self.evaluated = 0
+        # skipped because the upper bound can't beat the incumbent
+        self.pruned = 0
+        # evaluated, but infeasible or cut off by the incumbent
+        self.infeasible = 0
+        self.improved = 0
+        self.best_utility = -np.inf
+
+    def done(self) -> int:
+        return self.evaluated + self.pruned
+
+    def __repr__(self):
+        return '<SearchStats: total={}, evaluated={}, pruned={}, infeasible={}, improved={}>'.format(
+            self.total, self.evaluated, self.pruned, self.infeasible, self.improved)
+
+
+def upper_bound(conf: FixedDayInput, min_weight=0) -> float:
+    """
+    Cheap upper bound on the utility of a fixed-day subproblem: every student gets their favorite show among the ones
+    they are available for, ignoring show and instrument min/max
+    :param conf:
+    :param min_weight:
+    :return: -inf if some student has no show to go to
+    """
+    utility = conf.problem().utility
+    allowed = conf.available() & (utility >= min_weight)
+    if not allowed.any(axis=1).all():
+        return -np.inf
+    return float(np.where(allowed, utility, -np.inf).max(axis=1).sum(dtype=float))
+
+
+def solve_fixed_day(conf: FixedDayInput, min_weight=0, cutoff=None, initial_assignments: typing.Dict[str, str] = None,
+                    time_limit=None, gap=None, use_flow=True, solver_name=None) -> FixedSlotSolution:
+    """
+    Optimizes over student->show assignments given student-show preference scores. The subproblem is presolved
+    first: counting arguments reject it without building a model, students with a single show are fixed, and only
+    the instrument bounds that can still bind become constraints. Without any, this is a transportation problem,
+    solved exactly by solve_fixed_day_flow instead of CBC
     :param min_weight:
     :param conf:
+    :param cutoff: only look for solutions with at least this utility. Reported as infeasible if there is none
+    :param initial_assignments: student->show assignments to start the MIP from, e.g. the previous run's
+    :param time_limit: seconds CBC may run. If it stops early, the solution's bound is the cheap upper bound
+    :param gap: stop once the solution is within this relative gap of optimal
+    :param use_flow: solve transportation problems with min-cost flow
+    :param solver_name: any solver pulp.listSolvers(onlyAvailable=True) returns, instead of CBC. Only CBC starts from
+    initial_assignments
     :return:
     """
-    n_students = len(conf.students())
-    student_indexs = np.arange(n_students)
-    n_shows = len(conf.shows())
-    show_indexes = np.arange(n_shows)
+    count('fixed_day_solves')
+    problem = conf.problem()
+    with timer('presolve'):
+        reduced = presolve(conf, min_weight=min_weight)
+    if reduced.infeasible is not None:
+        logger.debug("Infeasible: %s", reduced.infeasible)
+        count('infeasible_without_solver')
+        return ShowAssignmentsImp(utility=-np.inf)
+    if use_flow and not reduced.binding.any():
+        return solve_fixed_day_flow(conf, min_weight=min_weight, cutoff=cutoff)
+    build_start = time.perf_counter()
+    utility = problem.utility
+    fixed_students = np.flatnonzero(reduced.fixed()).tolist()
+    fixed_shows = reduced.fixed_show[fixed_students].tolist()
+    fixed_utility = float(utility[fixed_students, fixed_shows].sum())
+    possible_assignments = [tuple(a) for a in np.argwhere(reduced.allowed).tolist()]
+    if not possible_assignments:
+        # presolve fixed everyone, and its counts already show the bounds hold
+        if cutoff is not None and fixed_utility < cutoff:
+            return ShowAssignmentsImp(utility=-np.inf)
+        return problem.to_solution(utility=fixed_utility, students=fixed_students, shows=fixed_shows)
+    by_show = dict([(j, []) for j in range(problem.n_shows())])
+    by_student = {}
+    for i, j in possible_assignments:
+        by_show[j].append((i, j))
+        by_student.setdefault(i, []).append((i, j))
 
-    possible_assignments = [(i, j) for i, j in product(*[student_indexs, show_indexes]) if
-                            conf.utility(student_index=i, show_index=j) >= min_weight]
     x = LpVariable.dicts("Assignment", possible_assignments, 0, 1, LpInteger)
     prob = LpProblem("Show Assignment Problem", LpMinimize)
-    # objective -- maximize utility
-    prob += sum([-conf.utility(student_index=i, show_index=j) * x[(i, j)] for i, j in possible_assignments])
+    # objective -- maximize utility of the students presolve didn't fix
+    prob += lpSum([-float(utility[i, j]) * x[(i, j)] for i, j in possible_assignments])
 
     # constraint -- each student can have only one show
-    for student_index in student_indexs:
-        hits = [x[(i, j)] for i,j in possible_assignments if i==student_index]
-        prob += lpSum(hits) == 1, ""
-
-    # constraint -- min max for each instrument
-    for show_index in show_indexes:
-        show = conf.shows()[show_index]
-        is_in_show = [x[(i, show_index)] for i,j in possible_assignments if j==show_index]
-        min_students, max_students = show.student_min_max()
+    for assignments in by_student.values():
+        prob += lpSum([x[a] for a in assignments]) == 1, ""
+
+    # constraint -- min max for each instrument, less what the fixed students already bring
+    for show_index, assignments in by_show.items():
+        is_in_show = [x[a] for a in assignments]
+        min_students, max_students = reduced.student_min_max[show_index].tolist()
         prob += lpSum(is_in_show) >= min_students
         prob += lpSum(is_in_show) <= max_students
-        for instrument in Instrument:
-            min_students, max_students = show.instrument_min_max()[
-                instrument] if instrument in show.instrument_min_max() else (0, 9999)
-            is_in_show_and_instrument = [x[(i, show_index)] for i,j in possible_assignments if j==show_index and
-                                         instrument in conf.students()[i].instruments()]
+        for m in np.flatnonzero(reduced.binding[show_index]).tolist():
+            min_students, max_students = reduced.instrument_min_max[show_index, m].tolist()
+            is_in_show_and_instrument = [x[(i, j)] for i, j in assignments if problem.plays[i, m]]
             prob += lpSum(is_in_show_and_instrument) >= min_students
             prob += lpSum(is_in_show_and_instrument) <= max_students
 
-    # constraint -- restricted shows
-    for show_index in show_indexes:
-        is_not_available = [x[(i, show_index)] * (
-            1 - int(conf.is_available(student_index=i, show_index=show_index))) for i,j in possible_assignments if
-                            j==show_index]
-        prob += lpSum(is_not_available) == 0, ""
-
-    # The problem data is written to an .lp file
-    with tempfile.NamedTemporaryFile() as f:
-        prob.writeLP(f.name)
-        prob.solve()
-        status = LpStatus[prob.status]
-        print("Status:", status)
+    warm_start = initial_assignments is not None
+    if warm_start:
+        for (i, j), v in x.items():
+            v.setInitialValue(int(initial_assignments.get(problem.student_names[i]) == problem.show_names[j]))
+    add_time('model_build', time.perf_counter() - build_start)
+    count('variables', len(x))
+    count('constraints', len(prob.constraints))
 
-    student_show_assignments = dict(
-        [(conf.students()[student_index].name(), conf.shows()[show_index].name()) for student_index, show_index in
-         possible_assignments
-         if x[(student_index, show_index)].value() == 1])
+    with timer('solver'):
+        if solver_name is not None and solver_name != PULP_CBC_CMD.name:
+            if cutoff is not None:
+                # only CBC takes a cutoff option
+                prob += prob.objective <= -(cutoff - fixed_utility) + TOLERANCE
+            prob.solve(getSolver(solver_name, msg=False, timeLimit=time_limit, gapRel=gap))
+        else:
+            options = ['cutoff {}'.format(-(cutoff - fixed_utility) + TOLERANCE)] if cutoff is not None else []
+            prob.solve(PULP_CBC_CMD(msg=False, options=options, warmStart=warm_start, timeLimit=time_limit,
+                                    gapRel=gap))
+        status = LpStatus[prob.status]
+        logger.debug("Status: %s", status)
+        count('status_{}'.format(status.lower()))
 
-    u = value(prob.objective) if status.lower()=='optimal' else -np.inf
-    return ShowAssignmentsImp(utility=u, assignments=student_show_assignments)
+    if prob.status == LpStatusNotSolved:
+        # out of time before finding anything
+        count('stopped_early')
+        return ShowAssignmentsImp(utility=-np.inf, bound=upper_bound(conf=conf, min_weight=min_weight))
+    chosen = [(i, j) for i, j in possible_assignments if x[(i, j)].value() == 1]
+    u = fixed_utility - value(prob.objective) if status.lower()=='optimal' else -np.inf
+    bound = None
+    if prob.sol_status == LpSolutionIntegerFeasible:
+        count('stopped_early')
+        bound = upper_bound(conf=conf, min_weight=min_weight)
+    elif gap is not None and u > -np.inf:
+        bound = u + gap * abs(u)
+    return problem.to_solution(utility=u, students=fixed_students + [i for i, _ in chosen],
+                               shows=fixed_shows + [j for _, j in chosen], bound=bound)
 
 
 def test_solve_fixed_day_instruments():
+    from unittest.mock import MagicMock
     Show.__abstractmethods__ = frozenset()
     metallica = Show()
     metallica.name = MagicMock(return_value='Metallica')
@@ -94,8 +191,10 @@ def test_solve_fixed_day_instruments():
     Slot.__abstractmethods__ = frozenset()
     mon = Slot()
     mon.name = MagicMock(return_value='Mon')
+    mon.max_shows = MagicMock(return_value=1)
     tue = Slot()
     tue.name = MagicMock(return_value='Tue')
+    tue.max_shows = MagicMock(return_value=1)
 
     slots = [mon, tue]
     Student.__abstractmethods__ = frozenset()
@@ -128,6 +227,7 @@ def test_solve_fixed_day_instruments():
 
 
 def test_solve_fixed_day_students():
+    from unittest.mock import MagicMock
     Show.__abstractmethods__ = frozenset()
     metallica = Show()
     metallica.name = MagicMock(return_value='Metallica')
@@ -144,8 +244,10 @@ def test_solve_fixed_day_students():
     Slot.__abstractmethods__ = frozenset()
     mon = Slot()
     mon.name = MagicMock(return_value='Mon')
+    mon.max_shows = MagicMock(return_value=1)
     tue = Slot()
     tue.name = MagicMock(return_value='Tue')
+    tue.max_shows = MagicMock(return_value=1)
 
     slots = [mon, tue]
     Student.__abstractmethods__ = frozenset()
@@ -178,32 +280,810 @@ def test_solve_fixed_day_students():
     assert result.student_show_assignment()['Chao'] == 'Metallica'
 
 
-def solve(conf: Config) -> Tuple[object, object]:
+def solve(conf: Config, min_pref_solver=None) -> Tuple[object, object]:
+    """
+    Find the best assignments, relaxing the minimum preference until a feasible solution is found
+    :param conf:
+    :param min_pref_solver: function (conf, min_weight) -> (slot assignment, solution). Defaults to enumerating
+    slot assignments
+    :return:
+    """
+    min_pref_solver = min_pref_solver or solve_min_pref
     n_choices = len(conf.shows())
     min_pref = 1
     sa = None
     sol = ShowAssignmentsImp(utility=-np.inf)
     while min_pref <= n_choices:
         min_weight = n_choices - min_pref + 1
-        sa, sol = solve_min_pref(conf=conf, min_weight=min_weight)
+        count('min_weights')
+        sa, sol = min_pref_solver(conf=conf, min_weight=min_weight)
         if sol.utility() > -np.inf:
             break
         min_pref+=1
     return sa, sol
 
 
-def solve_min_pref(conf, min_weight):
+def solve_profiled(conf: Config, fixed_day_solver=None, hook=None, cprofile=False, trace_memory=False) -> RunSummary:
+    """
+    Same as solve, but also records where the time went
+    :param conf:
+    :param fixed_day_solver: see solve_min_pref
+    :param hook: function (kind, name, value) called on every timer and counter update, or a logger
+    :param cprofile: also keep a cProfile report
+    :param trace_memory: also record the peak python memory of the solve
+    :return: the slot assignment and solution, with timers, counters and search stats
+    """
+
+    def solve_fn(conf, stats):
+        return solve(conf=conf, min_pref_solver=partial(solve_min_pref, stats=stats,
+                                                        fixed_day_solver=fixed_day_solver))
+
+    return profile_run(solve_fn, conf=conf, stats=SearchStats(), hook=hook, cprofile=cprofile,
+                       trace_memory=trace_memory)
+
+
+def solve_min_pref(conf, min_weight, stats: SearchStats = None, fixed_day_solver=None,
+                   initial_slot_assignment: SlotAssignment = None, initial_assignments: typing.Dict[str, str] = None):
+    """
+    Find the best slot assignment and student-show assignments for one min weight.
+    Slot assignments are solved in order of decreasing upper bound, and skipped when the bound can't beat the best
+    solution so far. Ties break on enumeration order, same as solving all of them in order
+    :param conf:
+    :param min_weight:
+    :param stats: filled with counts of evaluated and pruned subproblems
+    :param fixed_day_solver: function (conf, min_weight, cutoff, initial_assignments) -> FixedSlotSolution.
+    Defaults to solve_fixed_day
+    :param initial_slot_assignment: solved first to get a good incumbent, e.g. the previous run's. It only wins if no
+    enumerated slot assignment is as good
+    :param initial_assignments: student->show assignments every subproblem starts from
+    :return:
+    """
+    stats = stats if stats is not None else SearchStats()
+    fixed_day_solver = fixed_day_solver or solve_fixed_day
+    problem = Problem.from_config(conf)
+    with timer('enumerate'):
+        fixed_day_configs = list(get_fixed_day_configs(conf, problem=problem))
+    with timer('bound'):
+        candidates = [(upper_bound(conf=fixed_day_config, min_weight=min_weight), index, slot_assignments,
+                       fixed_day_config) for index, (slot_assignments, fixed_day_config) in
+                      enumerate(fixed_day_configs)]
+        candidates.sort(key=lambda c: (-c[0], c[1]))
+    stats.total += len(candidates)
+
     best_solution = ShowAssignmentsImp(utility=-np.inf)
     best_slot_assignments = None
-    for slot_assignments, fixed_day_config in get_fixed_day_configs(conf):
-        solution = solve_fixed_day(conf=fixed_day_config, min_weight=min_weight)
-        if solution.utility() > best_solution.utility():
+    best_index = None
+    if initial_slot_assignment is not None:
+        solution = fixed_day_solver(conf=FixedDayInputImp(conf=conf, slot_assignment=initial_slot_assignment,
+                                                          problem=problem),
+                                    min_weight=min_weight, initial_assignments=initial_assignments)
+        stats.total += 1
+        stats.evaluated += 1
+        if solution.utility() > -np.inf:
+            stats.improved += 1
+            count('incumbent_improvements')
+            stats.best_utility = solution.utility()
+            best_solution = solution
+            best_slot_assignments = initial_slot_assignment
+            best_index = len(candidates)
+
+    for bound, index, slot_assignments, fixed_day_config in candidates:
+        if not is_better(utility=bound, index=index, best_utility=best_solution.utility(), best_index=best_index):
+            stats.pruned += 1
+            count('pruned_subproblems')
+            continue
+        cutoff = best_solution.utility() if best_solution.utility() > -np.inf else None
+        solution = fixed_day_solver(conf=fixed_day_config, min_weight=min_weight, cutoff=cutoff,
+                                    initial_assignments=initial_assignments)
+        stats.evaluated += 1
+        if solution.utility() == -np.inf:
+            stats.infeasible += 1
+            count('infeasible_subproblems')
+        elif is_better(utility=solution.utility(), index=index, best_utility=best_solution.utility(),
+                       best_index=best_index):
+            stats.improved += 1
+            count('incumbent_improvements')
+            stats.best_utility = solution.utility()
             best_solution = solution
             best_slot_assignments = slot_assignments
+            best_index = index
     return best_slot_assignments, best_solution
 
 
-def get_fixed_day_configs(conf: Config) -> typing.Iterable[Tuple[SlotAssignment, FixedDayInput]]:
-    possible_show_slot_assignments = enumerate_slot_assignments(slots=conf.slots(), shows=conf.shows())
+# shortest time a fixed-day solve gets in an anytime search, in seconds
+MIN_TIME_SLICE = 0.05
+
+
+class AnytimeResult(object):
+    """
+    Best solution an anytime solve found within its time budget, and how good the optimum can be
+    """
+
+    def __init__(self, slot_assignment, solution: FixedSlotSolution, bound: float, explored: float, timed_out: bool,
+                 min_weight=None):
+        self.slot_assignment = slot_assignment
+        self.solution = solution
+        # no solution for this min weight has a higher utility
+        self.bound = bound
+        # fraction of slot assignments that were solved to the gap or pruned
+        self.explored = explored
+        self.timed_out = timed_out
+        self.min_weight = min_weight
+
+    def gap(self) -> float:
+        """
+        :return: relative gap between the bound and the solution, inf if there is no solution
+        """
+        utility = self.solution.utility()
+        if utility == -np.inf:
+            return np.inf
+        return (self.bound - utility) / max(abs(utility), TOLERANCE)
+
+    def __repr__(self):
+        return '<AnytimeResult: utility={}, bound={}, explored={:.2f}, timed_out={}>'.format(
+            self.solution.utility(), self.bound, self.explored, self.timed_out)
+
+
+def within_gap(bound, utility, gap=None) -> bool:
+    """
+    Whether a solution with this utility is good enough given the bound
+    :param bound:
+    :param utility:
+    :param gap: relative, or None to only accept solutions at the bound
+    :return:
+    """
+    if bound == -np.inf:
+        return True
+    if utility == -np.inf:
+        return False
+    return bound <= utility + (gap or 0) * abs(utility) + TOLERANCE
+
+
+def solve_anytime(conf: Config, time_limit: float, gap=None, fixed_day_solver=None,
+                  stats: SearchStats = None) -> AnytimeResult:
+    """
+    Same as solve, but stops after time_limit seconds with the best solution found so far. Each fixed-day solve gets
+    an even share of the time left, and may stop early with its best solution and a bound. Slot assignments whose
+    bound is within gap of the incumbent are skipped
+    :param conf:
+    :param time_limit: seconds for the whole search, relaxation of the min weight included
+    :param gap: relative gap at which subproblems and the search stop
+    :param fixed_day_solver: function (conf, min_weight, cutoff, initial_assignments, time_limit, gap) ->
+    FixedSlotSolution. Defaults to solve_fixed_day
+    :param stats: filled with counts of evaluated and pruned subproblems
+    :return:
+    """
+    deadline = time.monotonic() + time_limit
+    stats = stats if stats is not None else SearchStats()
+    fixed_day_solver = fixed_day_solver or solve_fixed_day
+    problem = Problem.from_config(conf)
+    with timer('enumerate'):
+        fixed_day_configs = list(get_fixed_day_configs(conf, problem=problem))
+    n_choices = len(conf.shows())
+    result = AnytimeResult(slot_assignment=None, solution=ShowAssignmentsImp(utility=-np.inf), bound=-np.inf,
+                           explored=1.0, timed_out=False)
+    for min_pref in range(1, n_choices + 1):
+        min_weight = n_choices - min_pref + 1
+        count('min_weights')
+        result = solve_anytime_min_pref(fixed_day_configs, min_weight=min_weight, deadline=deadline, gap=gap,
+                                        fixed_day_solver=fixed_day_solver, stats=stats)
+        if result.solution.utility() > -np.inf or result.timed_out:
+            break
+    return result
+
+
+def solve_anytime_min_pref(fixed_day_configs, min_weight, deadline: float, gap=None, fixed_day_solver=None,
+                           stats: SearchStats = None) -> AnytimeResult:
+    """
+    Anytime search over slot assignments for one min weight, see solve_anytime
+    :param fixed_day_configs: (slot assignment, fixed-day config) pairs
+    :param min_weight:
+    :param deadline: time.monotonic() at which to stop
+    :param gap:
+    :param fixed_day_solver:
+    :param stats:
+    :return:
+    """
+    stats = stats if stats is not None else SearchStats()
+    fixed_day_solver = fixed_day_solver or solve_fixed_day
+    with timer('bound'):
+        candidates = [(upper_bound(conf=fixed_day_config, min_weight=min_weight), index, slot_assignments,
+                       fixed_day_config) for index, (slot_assignments, fixed_day_config) in
+                      enumerate(fixed_day_configs)]
+        candidates.sort(key=lambda c: (-c[0], c[1]))
+    stats.total += len(candidates)
+
+    best_solution = ShowAssignmentsImp(utility=-np.inf)
+    best_slot_assignments = None
+    best_index = None
+    # bounds of the subproblems that weren't solved to optimality
+    open_bounds = []
+    settled = 0
+    timed_out = False
+    for position, (bound, index, slot_assignments, fixed_day_config) in enumerate(candidates):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            timed_out = True
+            open_bounds.extend([c[0] for c in candidates[position:]])
+            break
+        if not is_better(utility=bound, index=index, best_utility=best_solution.utility(), best_index=best_index):
+            stats.pruned += 1
+            count('pruned_subproblems')
+            settled += 1
+            continue
+        if gap is not None and within_gap(bound=bound, utility=best_solution.utility(), gap=gap):
+            stats.pruned += 1
+            count('pruned_subproblems')
+            settled += 1
+            open_bounds.append(bound)
+            continue
+        cutoff = best_solution.utility() if best_solution.utility() > -np.inf else None
+        time_slice = min(remaining, max(remaining / (len(candidates) - position), MIN_TIME_SLICE))
+        solution = fixed_day_solver(conf=fixed_day_config, min_weight=min_weight, cutoff=cutoff,
+                                    time_limit=time_slice, gap=gap)
+        stats.evaluated += 1
+        if within_gap(bound=solution.bound(), utility=solution.utility(), gap=gap):
+            settled += 1
+        if solution.bound() > solution.utility():
+            open_bounds.append(solution.bound())
+        if solution.utility() == -np.inf:
+            stats.infeasible += 1
+            count('infeasible_subproblems')
+        elif is_better(utility=solution.utility(), index=index, best_utility=best_solution.utility(),
+                       best_index=best_index):
+            stats.improved += 1
+            count('incumbent_improvements')
+            stats.best_utility = solution.utility()
+            best_solution = solution
+            best_slot_assignments = slot_assignments
+            best_index = index
+
+    return AnytimeResult(slot_assignment=best_slot_assignments, solution=best_solution,
+                         bound=max([best_solution.utility()] + open_bounds),
+                         explored=settled / len(candidates) if candidates else 1.0, timed_out=timed_out,
+                         min_weight=min_weight)
+
+
+def solve_incremental(conf: Config, previous_slot_assignment: SlotAssignment,
+                      previous_assignments: typing.Dict[str, str], stats: SearchStats = None,
+                      fixed_day_solver=None) -> Tuple[object, object, int]:
+    """
+    Re-solve after small edits, starting from the previous run's slot and student->show assignments. Gives the same
+    result as solve, but the previous solution is a good incumbent so most slot assignments get pruned
+    :param conf:
+    :param previous_slot_assignment:
+    :param previous_assignments: student->show
+    :param stats: filled with counts of evaluated and pruned subproblems
+    :param fixed_day_solver: see solve_min_pref. Should be the one the first run used, so both runs agree
+    :return: slot assignment, solution, number of students whose show changed
+    """
+    if not is_valid_slot_assignment(conf=conf, slot_assignment=previous_slot_assignment):
+        previous_slot_assignment = None
+    sa, sol = solve(conf=conf, min_pref_solver=partial(solve_min_pref, initial_slot_assignment=previous_slot_assignment,
+                                                       initial_assignments=previous_assignments, stats=stats,
+                                                       fixed_day_solver=fixed_day_solver))
+    return sa, sol, count_changed(previous_assignments=previous_assignments, solution=sol)
+
+
+def count_changed(previous_assignments: typing.Dict[str, str], solution: FixedSlotSolution) -> int:
+    """
+    :param previous_assignments: student->show
+    :param solution:
+    :return: number of students whose show is not the one in previous_assignments
+    """
+    assignments = solution.student_show_assignment() or {}
+    return len([student_name for student_name, show_name in assignments.items() if
+                previous_assignments.get(student_name) != show_name])
+
+
+def is_valid_slot_assignment(conf: Config, slot_assignment: SlotAssignment) -> bool:
+    """
+    Whether the slot assignment covers exactly the config's shows and respects max shows
+    :param conf:
+    :param slot_assignment:
+    :return:
+    """
+    if slot_assignment is None:
+        return False
+    if set(slot_assignment.show_slots().keys()) != set([show.name() for show in conf.shows()]):
+        return False
+    max_shows = dict([(slot.name(), slot.max_shows()) for slot in conf.slots()])
+    for slot_name in set(slot_assignment.show_slots().values()):
+        if slot_name not in max_shows or slot_assignment.num_shows(day_name=slot_name) > max_shows[slot_name]:
+            return False
+    return True
+
+
+def is_better(utility, index, best_utility, best_index) -> bool:
+    """
+    Whether a solution beats the incumbent. Equal utilities go to the one enumerated first
+    :param utility:
+    :param index: position of the solution's slot assignment in the enumeration
+    :param best_utility:
+    :param best_index:
+    :return:
+    """
+    if utility == -np.inf:
+        return False
+    if best_index is None or utility > best_utility + TOLERANCE:
+        return True
+    return utility >= best_utility - TOLERANCE and index < best_index
+
+
+def get_fixed_day_configs(conf: Config, symmetric=True, problem: Problem = None) -> typing.Iterable[
+    Tuple[SlotAssignment, FixedDayInput]]:
+    """
+    Enumerate the fixed-day subproblems. Slot assignments where a slot's shows need more students or players of an
+    instrument than the slot has are cut while enumerating
+    :param conf:
+    :param symmetric: skip slot assignments that only differ by swapping interchangeable slots. They have the same
+    optimal utility as the one that is kept
+    :param problem: array form of conf shared by the subproblems. Built once here if not given
+    :return:
+    """
+    if problem is None:
+        with timer('problem'):
+            problem = Problem.from_config(conf)
+    stats = PruningStats()
+    if symmetric:
+        possible_show_slot_assignments = (slot_assignments for slot_assignments, _ in
+                                          enumerate_canonical_slot_assignments(slots=conf.slots(), shows=conf.shows(),
+                                                                               students=conf.students(), stats=stats))
+    else:
+        possible_show_slot_assignments = enumerate_slot_assignments(slots=conf.slots(), shows=conf.shows(),
+                                                                    students=conf.students(), stats=stats)
     for slot_assignments in possible_show_slot_assignments:
-        yield slot_assignments, FixedDayInputImp(conf=conf, slot_assignment=slot_assignments)
+        count('slot_assignments')
+        yield slot_assignments, FixedDayInputImp(conf=conf, slot_assignment=slot_assignments, problem=problem)
+    count('slot_placements', stats.placements)
+    count('pruned_slot_placements', stats.pruned())
+
+
+_worker_conf = None
+_worker_problem = None
+
+
+def _init_worker(conf: Config):
+    global _worker_conf, _worker_problem
+    _worker_conf = conf
+    _worker_problem = Problem.from_config(conf)
+
+
+def _solve_fixed_day_task(task) -> Tuple[float, typing.Dict[str, str]]:
+    """
+    Solve one fixed-day subproblem in a worker process. The config is sent once per worker when the pool starts, so
+    a task is only the show->slot mapping and the min weight
+    :param task: (show slots, min weight)
+    :return: (utility, student-show assignments)
+    """
+    show_slots, min_weight = task
+    fixed_day_config = FixedDayInputImp(conf=_worker_conf, slot_assignment=SlotAssignment(d=show_slots),
+                                        problem=_worker_problem)
+    solution = solve_fixed_day(conf=fixed_day_config, min_weight=min_weight)
+    return solution.utility(), solution.student_show_assignment()
+
+
+def solve_min_pref_parallel(conf: Config, min_weight, executor: ProcessPoolExecutor = None, n_workers=None,
+                            stats: SearchStats = None):
+    """
+    Same as solve_min_pref, but solves the fixed-day subproblems in a process pool. Results are reduced in
+    enumeration order, so ties break the same way as solve_min_pref
+    :param conf:
+    :param min_weight:
+    :param executor: pool whose workers were started with _init_worker(conf). Started here if not given
+    :param n_workers: number of worker processes if the pool is started here. Defaults to the number of cpus
+    :param stats: filled with counts of evaluated subproblems, as the results come back
+    :return:
+    """
+    stats = stats if stats is not None else SearchStats()
+    if executor is None:
+        snapshot = ConfigImp.snapshot(conf)
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(snapshot,)) as executor:
+            return solve_min_pref_parallel(conf=snapshot, min_weight=min_weight, executor=executor, stats=stats)
+
+    slot_assignments = [slot_assignment for slot_assignment, _ in get_fixed_day_configs(conf)]
+    tasks = [(slot_assignment.show_slots(), min_weight) for slot_assignment in slot_assignments]
+    best_solution = ShowAssignmentsImp(utility=-np.inf)
+    best_slot_assignments = None
+    stats.total += len(tasks)
+    for slot_assignment, (utility, assignments) in zip(slot_assignments, executor.map(_solve_fixed_day_task, tasks)):
+        stats.evaluated += 1
+        if utility == -np.inf:
+            stats.infeasible += 1
+        if utility > best_solution.utility():
+            best_solution = ShowAssignmentsImp(utility=utility, assignments=assignments)
+            best_slot_assignments = slot_assignment
+            stats.improved += 1
+            stats.best_utility = max(stats.best_utility, utility)
+    return best_slot_assignments, best_solution
+
+
+def solve_parallel(conf: Config, n_workers=None, stats: SearchStats = None) -> Tuple[object, object]:
+    """
+    Same as solve, but the fixed-day subproblems are solved in a pool of n_workers processes
+    :param conf:
+    :param n_workers: defaults to the number of cpus
+    :param stats: filled with counts of evaluated subproblems
+    :return:
+    """
+    snapshot = ConfigImp.snapshot(conf)
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(snapshot,)) as executor:
+        return solve(conf=snapshot, min_pref_solver=partial(solve_min_pref_parallel, executor=executor, stats=stats))
+
+
+def build_joint_problem(conf: Config, min_weight=0, problem: Problem = None):
+    """
+    Build one MILP that chooses show->slot and student->show assignments together.
+    y[(show, slot)] says the show rehearses in the slot, x[(student, show)] says the student is in the show. A student
+    can only be in a show that rehearses in one of their available slots.
+    :param conf:
+    :param min_weight:
+    :param problem: array form of conf. Built if not given
+    :return: MILP, x, y, and the Problem whose indexes x and y use
+    """
+    problem = problem if problem is not None else Problem.from_config(conf)
+    utility = problem.utility
+    student_indexes = range(problem.n_students())
+    show_indexes = range(problem.n_shows())
+    slot_indexes = range(len(problem.slot_names))
+    available_slots = [np.flatnonzero(row).tolist() for row in problem.available]
+
+    students, shows = np.nonzero(utility >= min_weight)
+    possible_assignments = list(zip(students.tolist(), shows.tolist()))
+    possible_slots = list(product(show_indexes, slot_indexes))
+    x = LpVariable.dicts("Assignment", possible_assignments, 0, 1, LpInteger)
+    y = LpVariable.dicts("Slot", possible_slots, 0, 1, LpInteger)
+    prob = LpProblem("Joint Assignment Problem", LpMinimize)
+    # objective -- maximize utility
+    prob += lpSum([-float(utility[i, j]) * x[(i, j)] for i, j in possible_assignments])
+
+    # constraint -- each show gets exactly one slot
+    for j in show_indexes:
+        prob += lpSum([y[(j, k)] for k in slot_indexes]) == 1
+
+    # constraint -- max shows for each slot
+    for k in slot_indexes:
+        prob += lpSum([y[(j, k)] for j in show_indexes]) <= int(problem.max_shows[k])
+
+    by_student = dict([(i, []) for i in student_indexes])
+    by_show = dict([(j, []) for j in show_indexes])
+    for i, j in possible_assignments:
+        by_student[i].append((i, j))
+        by_show[j].append((i, j))
+
+    # constraint -- each student can have only one show, and only if they are available on the show's slot
+    for i in student_indexes:
+        prob += lpSum([x[a] for a in by_student[i]]) == 1
+        for _, j in by_student[i]:
+            prob += x[(i, j)] <= lpSum([y[(j, k)] for k in available_slots[i]])
+
+    # constraint -- min max for each show and instrument
+    for j in show_indexes:
+        min_students, max_students = problem.student_min_max[j].tolist()
+        prob += lpSum([x[a] for a in by_show[j]]) >= min_students
+        prob += lpSum([x[a] for a in by_show[j]]) <= max_students
+        for m in range(len(INSTRUMENTS)):
+            min_students, max_students = problem.instrument_min_max[j, m].tolist()
+            is_in_show_and_instrument = [x[(i, j)] for i, j in by_show[j] if problem.plays[i, m]]
+            prob += lpSum(is_in_show_and_instrument) >= min_students
+            prob += lpSum(is_in_show_and_instrument) <= max_students
+
+    return prob, x, y, problem
+
+
+def solve_joint_min_pref(conf: Config, min_weight) -> Tuple[SlotAssignment, FixedSlotSolution]:
+    """
+    Same as solve_min_pref, but solves one joint MILP instead of one MILP per slot assignment
+    :param conf:
+    :param min_weight:
+    :return:
+    """
+    with timer('model_build'):
+        prob, x, y, problem = build_joint_problem(conf=conf, min_weight=min_weight)
+    count('variables', len(x) + len(y))
+    count('constraints', len(prob.constraints))
+    with timer('solver'):
+        prob.solve(PULP_CBC_CMD(msg=False))
+    status = LpStatus[prob.status]
+    logger.debug("Status: %s", status)
+    count('status_{}'.format(status.lower()))
+    if status.lower() != 'optimal':
+        return None, ShowAssignmentsImp(utility=-np.inf)
+
+    slot_assignment = SlotAssignment()
+    for (j, k), v in y.items():
+        if v.value() > 0.5:
+            slot_assignment.add(day_name=problem.slot_names[k], show_name=problem.show_names[j])
+    chosen = [(i, j) for (i, j), v in x.items() if v.value() > 0.5]
+    return slot_assignment, problem.to_solution(utility=-value(prob.objective), students=[i for i, _ in chosen],
+                                                shows=[j for _, j in chosen])
+
+
+def solve_joint(conf: Config) -> Tuple[object, object]:
+    return solve(conf=conf, min_pref_solver=solve_joint_min_pref)
+
+
+def is_feasible(conf: Config, min_weight) -> bool:
+    """
+    Whether some slot assignment admits a student->show assignment using only pairs at or above min weight.
+    Solves the joint model with no objective, so CBC stops at the first feasible solution
+    :param conf:
+    :param min_weight:
+    :return:
+    """
+    problem = Problem.from_config(conf)
+    # a student with no show at or above min weight rules it out before any model is built
+    if not (problem.utility >= min_weight).any(axis=1).all():
+        return False
+    prob, x, y, _ = build_joint_problem(conf=conf, min_weight=min_weight, problem=problem)
+    prob.setObjective(LpAffineExpression())
+    prob.solve(PULP_CBC_CMD(msg=False))
+    return LpStatus[prob.status].lower() == 'optimal'
+
+
+def solve_lexicographic(conf: Config, min_pref_solver=None) -> Tuple[object, object]:
+    """
+    Same result as solve, but finds the strictest feasible min weight first and only optimizes for that one.
+    Feasibility only gets easier as the min weight goes down, so the strictest feasible one is found by binary search
+    over feasibility checks instead of optimizing every min weight in turn
+    :param conf:
+    :param min_pref_solver: function (conf, min_weight) -> (slot assignment, solution). Defaults to enumerating
+    slot assignments
+    :return:
+    """
+    min_pref_solver = min_pref_solver or solve_min_pref
+    n_choices = len(conf.shows())
+    # invariant: everything above hi is infeasible, lo is feasible or 0
+    lo, hi = 0, n_choices
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if is_feasible(conf=conf, min_weight=mid):
+            lo = mid
+        else:
+            hi = mid - 1
+    if lo == 0:
+        return None, ShowAssignmentsImp(utility=-np.inf)
+    return min_pref_solver(conf=conf, min_weight=lo)
+
+
+SOLVERS = {
+    'enumerate': solve,
+    'joint': solve_joint,
+    'lexicographic': solve_lexicographic,
+    'parallel': solve_parallel,
+}
+
+
+def test_solve_fixed_day_presolve():
+    from dbtest.fixtures import mock_config
+    conf = mock_config(
+        preferences={'Ramona': {'Met': 2, 'Led': 1}, 'Jennifer': {'Met': 1, 'Led': 2}, 'Chao': {'Met': 1, 'Led': 2},
+                     'Wes': {'Met': 2, 'Led': 1}},
+        instruments={'Ramona': Instrument.Drums, 'Jennifer': Instrument.Drums, 'Chao': Instrument.Guitar,
+                     'Wes': Instrument.Guitar},
+        available_slots={'Ramona': ['Mon', 'Tue'], 'Jennifer': ['Tue'], 'Chao': ['Mon', 'Tue'],
+                         'Wes': ['Mon', 'Tue']},
+        show_min_max={'Met': (1, 3), 'Led': (1, 3)},
+        slot_max_shows={'Mon': 1, 'Tue': 1},
+        instrument_bounds={'Met': {Instrument.Drums: (2, 5), Instrument.Guitar: (0, 1)}})
+    # Jennifer can only make Met on Tue, so only one drummer is available on Mon
+    on_mon = FixedDayInputImp(conf=conf, slot_assignment=SlotAssignment(d={'Met': 'Mon', 'Led': 'Tue'}))
+    reduced = presolve(on_mon)
+    assert reduced.infeasible == 'show Met has fewer Drums players available than its min'
+    profile = Profile()
+    with profile.activate():
+        assert solve_fixed_day(on_mon).utility() == -np.inf
+    assert profile.counters['infeasible_without_solver'] == 1
+    assert profile.counters['presolve_infeasible'] == 1
+    assert 'solver' not in profile.timers
+
+    on_tue = FixedDayInputImp(conf=conf, slot_assignment=SlotAssignment(d={'Met': 'Tue', 'Led': 'Mon'}))
+    reduced = presolve(on_tue, min_weight=1)
+    assert reduced.infeasible is None
+    assert reduced.fixed_show.tolist() == [-1, 0, -1, -1]
+    # Jennifer is in, so Met needs one more drummer out of one left
+    assert reduced.instrument_min_max[0, INSTRUMENTS.index(Instrument.Drums)].tolist() == [1, 4]
+    assert reduced.binding[0].tolist() == [i in (Instrument.Drums, Instrument.Guitar) for i in INSTRUMENTS]
+    result = solve_fixed_day(on_tue, use_flow=False)
+    assert result.student_show_assignment() == {'Ramona': 'Met', 'Jennifer': 'Met', 'Chao': 'Led', 'Wes': 'Met'}
+    assert result.utility() == 7
+
+
+def test_solve_joint_matches_enumeration():
+    from dbtest.fixtures import weekend_config
+    conf = weekend_config()
+    sa, sol = solve(conf)
+    joint_sa, joint_sol = solve_joint(conf)
+    assert joint_sol.utility() == sol.utility(), (joint_sol, sol)
+    for student_name, show_name in joint_sol.student_show_assignment().items():
+        slot_name = joint_sa.show_slot(show_name)
+        student = [s for s in conf.students() if s.name() == student_name][0]
+        assert slot_name in student.available_slots(), (joint_sa, joint_sol)
+
+
+def test_solve_min_pref_symmetric():
+    from dbtest.fixtures import weekend_config
+    conf = weekend_config()
+    n_symmetric = len(list(get_fixed_day_configs(conf)))
+    n_raw = len(list(get_fixed_day_configs(conf, symmetric=False)))
+    assert n_symmetric < n_raw, (n_symmetric, n_raw)
+
+
+def test_solve_parallel_matches_serial():
+    from dbtest.fixtures import weekend_config
+    conf = weekend_config()
+    sa, sol = solve(conf)
+    stats = SearchStats()
+    parallel_sa, parallel_sol = solve_parallel(conf, n_workers=2, stats=stats)
+    assert stats.evaluated == stats.total > 0 and stats.best_utility == sol.utility()
+    assert parallel_sa.show_slots() == sa.show_slots(), (parallel_sa, sa)
+    assert parallel_sol.utility() == sol.utility()
+    assert parallel_sol.student_show_assignment() == sol.student_show_assignment()
+
+
+def test_solve_min_pref_prunes():
+    from dbtest.fixtures import weekend_config
+    conf = weekend_config()
+    min_weight = 2
+    stats = SearchStats()
+    sa, sol = solve_min_pref(conf, min_weight=min_weight, stats=stats)
+    assert stats.pruned > 0, stats
+    assert stats.done() == stats.total == len(list(get_fixed_day_configs(conf)))
+
+    best_utility = -np.inf
+    best_sa = None
+    for slot_assignment, fixed_day_config in get_fixed_day_configs(conf):
+        utility = solve_fixed_day(fixed_day_config, min_weight=min_weight).utility()
+        assert utility <= upper_bound(fixed_day_config, min_weight=min_weight)
+        if utility > best_utility:
+            best_utility = utility
+            best_sa = slot_assignment
+    assert sol.utility() == best_utility
+    assert sa.show_slots() == best_sa.show_slots()
+
+
+def test_solve_lexicographic_matches_solve():
+    from unittest.mock import patch
+    from dbtest.fixtures import mock_config, weekend_config
+    conf = weekend_config()
+    sa, sol = solve(conf)
+    lex_sa, lex_sol = solve_lexicographic(conf)
+    assert lex_sa.show_slots() == sa.show_slots()
+    assert lex_sol.utility() == sol.utility()
+    assert lex_sol.student_show_assignment() == sol.student_show_assignment()
+
+    # everyone wants Led, which takes at most 2, so the first choice threshold is infeasible
+    conf = mock_config(
+        preferences={'Ramona': {'Led': 2, 'Met': 1}, 'Jennifer': {'Led': 2, 'Met': 1}, 'Chao': {'Led': 2, 'Met': 1}},
+        instruments={'Ramona': Instrument.Vocals, 'Jennifer': Instrument.Drums, 'Chao': Instrument.Guitar},
+        available_slots={'Ramona': ['Mon', 'Tue'], 'Jennifer': ['Mon', 'Tue'], 'Chao': ['Mon', 'Tue']},
+        show_min_max={'Led': (1, 2), 'Met': (1, 2)},
+        slot_max_shows={'Mon': 1, 'Tue': 1},
+    )
+    assert not is_feasible(conf, min_weight=2)
+    assert is_feasible(conf, min_weight=1)
+    # nobody scores a show 3, which is seen without building the model
+    with patch(__name__ + '.build_joint_problem', side_effect=AssertionError('model built')):
+        assert not is_feasible(conf, min_weight=3)
+    assert solve_lexicographic(conf)[1].utility() == solve(conf)[1].utility() == 5
+
+
+def test_solve_incremental():
+    from dbtest.fixtures import weekend_config
+    conf = weekend_config()
+    sa, sol = solve(conf)
+    resolved_sa, resolved_sol, n_changed = solve_incremental(conf, previous_slot_assignment=sa,
+                                                             previous_assignments=sol.student_show_assignment())
+    assert resolved_sa.show_slots() == sa.show_slots()
+    assert resolved_sol.student_show_assignment() == sol.student_show_assignment()
+    assert n_changed == 0
+
+    # a stale slot assignment is ignored
+    stale = SlotAssignment(d={'Led': 'Wed'})
+    assert solve_incremental(conf, previous_slot_assignment=stale,
+                             previous_assignments={})[1].utility() == sol.utility()
+
+    # the subproblems go to the fixed-day solver it is given, e.g. the app's cache
+    calls = []
+
+    def fixed_day_solver(conf, **kwargs):
+        calls.append(kwargs['initial_assignments'])
+        return solve_fixed_day(conf, **kwargs)
+
+    assert solve_incremental(conf, previous_slot_assignment=sa, previous_assignments=sol.student_show_assignment(),
+                             fixed_day_solver=fixed_day_solver)[1].utility() == sol.utility()
+    assert calls and all(c == sol.student_show_assignment() for c in calls)
+
+
+def test_solve_picks_best_slot_assignment():
+    from dbtest.fixtures import weekend_config
+    conf = weekend_config()
+    sa, sol = solve(conf)
+    for slot_assignment, fixed_day_config in get_fixed_day_configs(conf, symmetric=False):
+        n_choices = len(conf.shows())
+        assert solve_fixed_day(fixed_day_config, min_weight=n_choices).utility() <= sol.utility()
+
+
+def test_fixed_day_availability_index():
+    from dbtest.fixtures import weekend_config
+    conf = weekend_config()
+    for slot_assignment, fixed_day_config in get_fixed_day_configs(conf, symmetric=False):
+        for j, show in enumerate(conf.shows()):
+            slot_name = slot_assignment.show_slot(show.name())
+            expected = [i for i, student in enumerate(conf.students()) if slot_name in student.available_slots()]
+            assert fixed_day_config.eligible_students(j).tolist() == expected
+            for i in range(len(conf.students())):
+                assert fixed_day_config.is_available(student_index=i, show_index=j) == (i in expected)
+
+
+def test_solve_profiled():
+    # everyone likes both shows the same, so presolve fixes nobody and the drums bound needs the MILP
+    from dbtest.fixtures import mock_config
+    conf = mock_config(
+        preferences=dict([(name, {'Met': 1, 'Led': 1}) for name in ['Ramona', 'Jennifer', 'Chao', 'Wes']]),
+        instruments={'Ramona': Instrument.Drums, 'Jennifer': Instrument.Drums, 'Chao': Instrument.Guitar,
+                     'Wes': Instrument.Guitar},
+        available_slots=dict([(name, ['Mon', 'Tue']) for name in ['Ramona', 'Jennifer', 'Chao', 'Wes']]),
+        show_min_max={'Met': (1, 3), 'Led': (1, 3)},
+        slot_max_shows={'Mon': 1, 'Tue': 1},
+        instrument_bounds={'Met': {Instrument.Drums: (1, 1)}})
+    events = []
+    summary = solve_profiled(conf, hook=lambda kind, name, value: events.append(name), cprofile=True,
+                             trace_memory=True)
+    assert summary.solution.utility() == solve(conf)[1].utility()
+    for name in ['enumerate', 'bound', 'presolve', 'model_build', 'solver']:
+        assert summary.timers[name] > 0, name
+    assert summary.counters['fixed_day_solves'] == summary.stats.evaluated
+    assert summary.counters['incumbent_improvements'] == summary.stats.improved
+    assert summary.counters['variables'] > 0 and summary.counters['constraints'] > 0
+    assert 'incumbent_improvements' in events
+    assert 'status_optimal' in events
+    assert 'solve_fixed_day' in summary.cprofile
+    assert summary.to_dict()['search']['evaluated'] == summary.stats.evaluated
+    assert summary.peak_memory > 0 and not tracemalloc.is_tracing()
+    assert solve_profiled(conf).peak_memory is None
+
+
+def test_solve_anytime():
+    from dbtest.fixtures import weekend_config
+    conf = weekend_config()
+    sa, sol = solve(conf)
+    result = solve_anytime(conf, time_limit=60)
+    assert result.solution.utility() == sol.utility()
+    assert not result.timed_out
+    assert result.explored == 1.0
+    assert result.bound == sol.utility()
+
+    # out of time before the first subproblem, the bound is the best cheap bound
+    result = solve_anytime(conf, time_limit=0)
+    assert result.timed_out
+    assert result.solution.utility() == -np.inf
+    assert result.explored == 0
+    assert result.bound >= sol.utility()
+
+
+def test_solve_fixed_day_flow_matches_milp():
+    from dbtest.fixtures import mock_config
+    rng = np.random.default_rng(0)
+    names = ['S{}'.format(i) for i in range(12)]
+    show_names = ['A', 'B', 'C']
+    for _ in range(4):
+        conf = mock_config(
+            preferences=dict([(name, dict(zip(show_names, (rng.permutation(3) + 1).tolist()))) for name in names]),
+            instruments=dict([(name, Instrument.Guitar) for name in names]),
+            available_slots=dict([(name, [slot for slot in ['Mon', 'Tue', 'Wed'] if rng.random() < 0.7]) for name in
+                                  names]),
+            show_min_max={'A': (2, 5), 'B': (3, 4), 'C': (1, 6)},
+            slot_max_shows={'Mon': 1, 'Tue': 1, 'Wed': 1})
+        for slot_assignment, fixed_day_config in get_fixed_day_configs(conf):
+            for min_weight in [1, 2]:
+                expected = solve_fixed_day(fixed_day_config, min_weight=min_weight, use_flow=False)
+                profile = Profile()
+                with profile.activate():
+                    result = solve_fixed_day(fixed_day_config, min_weight=min_weight)
+                # no MILP was built for it
+                assert 'model_build' not in profile.timers
+                assert result.utility() == expected.utility()
+                if result.utility() > -np.inf:
+                    sizes = [list(result.student_show_assignment().values()).count(name) for name in show_names]
+                    assert 2 <= sizes[0] <= 5 and 3 <= sizes[1] <= 4 and 1 <= sizes[2] <= 6
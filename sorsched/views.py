@@ -1,91 +1,120 @@
+from functools import partial
+import typing
 from typing import Dict
 
-from flask import render_template, request, redirect, flash
+from flask import render_template, request, redirect, flash, jsonify, abort, url_for, session as browser_session
 from sqlalchemy.exc import OperationalError
 
 from sorsched import app, db
+from sorsched.backends import get_fixed_day_solver, BackendStats
+from sorsched.cache import FixedDayCache
 from sorsched.canned_inputs import seed
 from sorsched.forms import ShowForm, AssignmentForm, OverviewForm, InstrumentMinMaxForm, \
     StudentForm, InstrumentIndicatorForm, SlotAvailabilityForm, ShowPreferenceForm
+from sorsched.heuristic import solve_heuristic
+from sorsched.highs_solver import solve_highs
 from sorsched.input_config import ConfigImp
+from sorsched.jobs import JobManager, Job
+from sorsched.matrix_model import solve_matrix
 from sorsched.models import Show, Slot, Student, ShowPreference, Instrument, ShowInstrument, SlotAvailable, \
-    StudentInstrument, StudentShowAssignment, ShowSlotAssignment
+    StudentInstrument, StudentShowAssignment, ShowSlotAssignment, AssignmentRun, DEFAULT_PROGRAM
 from sorsched.nav import NAV_ITEMS
-from sorsched.solver2 import solve
+from sorsched.overview import show_overview, slot_names, student_page
+from sorsched.results import save_assignments, load_assignments
+from sorsched.data import SlotAssignment
+from sorsched.solver2 import SOLVERS, solve_parallel, solve, solve_min_pref, solve_incremental, SearchStats, \
+    solve_anytime
 
 
-def start_over():
+# fixed-day results, shared by all runs of the enumerate solver
+fixed_day_cache = FixedDayCache(
+    fixed_day_solver=get_fixed_day_solver(app.config['SOLVER_BACKEND'], portfolio=app.config['SOLVER_PORTFOLIO'],
+                                          stats=BackendStats(app.config['SOLVER_BACKEND_STATS'])),
+    maxsize=app.config['SOLVER_CACHE_SIZE'], directory=app.config['SOLVER_CACHE_DIR'])
+job_manager = JobManager(max_workers=app.config['JOB_WORKERS'],
+                         max_per_program=app.config['JOB_WORKERS_PER_PROGRAM'])
+
+# tables scoped by program, children first
+PROGRAM_MODELS = [StudentShowAssignment, ShowSlotAssignment, AssignmentRun, ShowPreference, SlotAvailable,
+                  StudentInstrument, ShowInstrument, Student, Show, Slot]
+
+
+def current_program() -> str:
+    """
+    The program this request works on. ?program= switches to another one for the rest of the browser session
+    :return:
+    """
+    program = request.args.get('program')
+    if program:
+        browser_session['program'] = program
+    return browser_session.get('program', DEFAULT_PROGRAM)
+
+
+def start_over(session, program=DEFAULT_PROGRAM):
     """
-    Wipe out database of everything
+    Wipe out everything of the program. Other programs are left alone
+    :param session:
+    :param program:
     :return:
     """
-    db.drop_all()
-    db.create_all()
+    for model in PROGRAM_MODELS:
+        session.query(model).filter(model.program == program).delete(synchronize_session=False)
+    session.commit()
 
 
 @app.route('/', methods=['POST', 'GET'])
 @app.route('/index', methods=['POST', 'GET'])
 def index():
+    create_tables_if_not_exist()
+    program = current_program()
     form = OverviewForm()
     if form.validate_on_submit():
         if form.start_over.data:
-            start_over()
+            start_over(session=db.session, program=program)
         elif form.seed.data:
-            seed(session=db.session)
+            seed(session=db.session, program=program)
             db.session.commit()
         elif form.run.data:
-            run_optimization(session=db.session)
-            db.session.commit()
-            return redirect('/assignments')
-
-    create_tables_if_not_exist()
-
-    shows = list(db.session.query(Show).all())
-    slots = list(db.session.query(Slot).all())
-    students = list(db.session.query(Student).all())
-    preferences = get_preferred_shows()
-    assigned_students = dict([(show.name, len(show.student_assignments))for show in shows])
+            job = submit_optimization(session=db.session, program=program)
+            return redirect(url_for('assignments', job=job.id))
+
+    page = max(request.args.get('page', 1, type=int), 1)
+    shows = show_overview(db.session, program=program)
+    slots = slot_names(db.session, program=program)
+    students, has_next = student_page(db.session, page=page, per_page=app.config['STUDENTS_PER_PAGE'],
+                                      program=program)
     return render_template(
-        'index.html', shows=shows, slots=slots, students=students, preferences=preferences,
-        assigned_students=assigned_students, navitems=NAV_ITEMS, active_navitem="home", form=form)
+        'index.html', shows=shows, slots=slots, students=students, page=page, has_next=has_next, program=program,
+        navitems=NAV_ITEMS, active_navitem="home", form=form)
 
 
 def create_tables_if_not_exist():
     try:
         db.session.query(Show).first()
     except OperationalError:
-        start_over()
-
-
-def get_preferred_shows():
-    preferences = {}
-    for x in db.session.query(ShowPreference).all():
-        if x.student_name not in preferences:
-            preferences[x.student_name] = x
-        if preferences[x.student_name].preference < x.preference:
-            preferences[x.student_name] = x
-    return preferences
+        db.session.rollback()
+        db.create_all()
 
 
 @app.route('/edit_show', methods=['GET', 'POST'])
 def edit_show():
     form = ShowForm()
     if form.validate_on_submit():
-        edit_show_from_form(form)
+        edit_show_from_form(form, program=current_program())
         return redirect('/')
     name = request.args.get('name')
-    fill_show_form(form=form, show_name=name)
+    fill_show_form(form=form, show_name=name, program=current_program())
     return render_template('edit_show.html', form=form, navitems=NAV_ITEMS, active_navitem="shows")
 
 
-def fill_show_form(form, show_name):
-    show = db.session.query(Show).filter(Show.name == show_name).first()
+def fill_show_form(form, show_name, program=DEFAULT_PROGRAM):
+    show = db.session.query(Show).filter(Show.program == program, Show.name == show_name).first()
     assert show, 'show {} does not exist'.format(show_name)
     form.name.data = show.name
     form.min_students.data = show.min_students
     form.max_students.data = show.max_students
     for instrument, min_max in db.session.query(Instrument, ShowInstrument).outerjoin(ShowInstrument).filter(
-                    ShowInstrument.show_name == show.name).all():
+                    ShowInstrument.program == program, ShowInstrument.show_name == show.name).all():
         iform = InstrumentMinMaxForm()
         iform.instrument_name = instrument.name
         if min_max:
@@ -94,15 +123,16 @@ def fill_show_form(form, show_name):
         form.instrument_min_max.append_entry(iform)
 
 
-def edit_show_from_form(form):
-    show = db.session.query(Show).filter(Show.name == form.name.data).first()
+def edit_show_from_form(form, program=DEFAULT_PROGRAM):
+    show = db.session.query(Show).filter(Show.program == program, Show.name == form.name.data).first()
     if form.delete_show.data:
-        delete_show(show_name=show.name,session=db.session)
+        delete_show(show_name=show.name,session=db.session,program=program)
     else:
         show.min_students = int(form.min_students.data)
         show.max_students = int(form.max_students.data)
         for iform in form.instrument_min_max.entries:
-            show_instrument = db.session.query(ShowInstrument).filter(ShowInstrument.show_name == show.name).filter(
+            show_instrument = db.session.query(ShowInstrument).filter(
+                ShowInstrument.program == program, ShowInstrument.show_name == show.name).filter(
                 ShowInstrument.instrument_name == iform.data['instrument_name']
             ).first()
             show_instrument.min_instruments = int(iform.data['min_instruments'])
@@ -110,21 +140,23 @@ def edit_show_from_form(form):
     db.session.commit()
 
 
-def delete_show(show_name,session):
-    session.query(ShowPreference).filter(ShowPreference.show_name==show_name).delete()
-    session.query(StudentShowAssignment).filter(ShowPreference.show_name==show_name).delete()
-    session.query(Show).filter(Show.name==show_name).delete()
+def delete_show(show_name,session,program=DEFAULT_PROGRAM):
+    for model in [ShowPreference, StudentShowAssignment, ShowSlotAssignment, ShowInstrument]:
+        session.query(model).filter(model.program==program, model.show_name==show_name).delete()
+    session.query(Show).filter(Show.program==program, Show.name==show_name).delete()
 
 
 @app.route('/add_show', methods=['GET', 'POST'])
 def add_show():
     form = ShowForm()
+    program = current_program()
     if form.validate_on_submit():
         show_name = form.name.data
         show = Show(
             name=show_name,
             min_students=int(form.min_students.data),
-            max_students=int(form.max_students.data)
+            max_students=int(form.max_students.data),
+            program=program
         )
         db.session.add(show)
         for iform in form.instrument_min_max.entries:
@@ -132,12 +164,14 @@ def add_show():
                 show_name=show.name,
                 instrument_name=iform.data['instrument_name'],
                 min_instruments=int(iform.data['min_instruments']),
-                max_instruments=int(iform.data['max_instruments'])
+                max_instruments=int(iform.data['max_instruments']),
+                program=program
             )
             db.session.add(show_instrument)
 
-        for student in db.session.query(Student).all():
-            db.session.add(ShowPreference(student_name=student.name,show_name=show_name,preference=0.0))
+        for student in db.session.query(Student).filter(Student.program == program).all():
+            db.session.add(ShowPreference(student_name=student.name,show_name=show_name,preference=0.0,
+                                          program=program))
 
         db.session.commit()
         return redirect('/')
@@ -145,106 +179,119 @@ def add_show():
     return render_template('edit_show.html', form=form, navitems=NAV_ITEMS, active_navitem="shows")
 
 
-def update_student(session, form: StudentForm):
+def update_student(session, form: StudentForm, program=DEFAULT_PROGRAM):
     """
     Edit the student from the content of the form
     :param session:
     :param form:
+    :param program:
     :return:
     """
     # Student
     student_name = form.name.data
-    student = session.query(Student).filter(Student.name == student_name).first()
+    student = session.query(Student).filter(Student.program == program, Student.name == student_name).first()
     assert student is not None, 'Student {} not found'.format(student_name)
 
     # Instruments
-    session.query(StudentInstrument).filter(StudentInstrument.student_name == student_name).delete()
+    session.query(StudentInstrument).filter(StudentInstrument.program == program,
+                                            StudentInstrument.student_name == student_name).delete()
     for f in form.instruments.entries:
         student_plays = f.data['student_plays']
         if not student_plays:
             continue
         instrument_name = f.data['instrument_name']
-        session.add(StudentInstrument(student_name=student_name, instrument_name=instrument_name))
+        session.add(StudentInstrument(student_name=student_name, instrument_name=instrument_name, program=program))
 
     # Slots
-    session.query(SlotAvailable).filter(SlotAvailable.student_name == student_name).delete()
+    session.query(SlotAvailable).filter(SlotAvailable.program == program,
+                                        SlotAvailable.student_name == student_name).delete()
     for f in form.slot_availabilities.entries:
         student_is_available = f.data['student_is_available']
         if not student_is_available:
             continue
         slot_name = f.data['slot_name']
-        session.add(SlotAvailable(student_name=student_name, slot_name=slot_name))
+        session.add(SlotAvailable(student_name=student_name, slot_name=slot_name, program=program))
 
     # Shows
-    session.query(ShowPreference).filter(ShowPreference.student_name == student_name).delete()
+    session.query(ShowPreference).filter(ShowPreference.program == program,
+                                         ShowPreference.student_name == student_name).delete()
     for f in form.show_preferences.entries:
         show_name = f.data['show_name']
         preference = float(f.data['preference'])
-        session.add(ShowPreference(student_name=student_name, show_name=show_name, preference=preference))
+        session.add(ShowPreference(student_name=student_name, show_name=show_name, preference=preference,
+                                   program=program))
 
 
-def get_student_instruments(session, student_name) -> Dict[str, bool]:
+def get_student_instruments(session, student_name, program=DEFAULT_PROGRAM) -> Dict[str, bool]:
     """
     Get the list of instruments a student plays, but also list the ones she doesn't play
     :param session:
     :param student_name:
+    :param program:
     :return:
     """
-    stmt = session.query(StudentInstrument).filter(StudentInstrument.student_name == student_name).subquery()
+    stmt = session.query(StudentInstrument).filter(StudentInstrument.program == program,
+                                                   StudentInstrument.student_name == student_name).subquery()
     query = session.query(Instrument.name.label('instrument_name'), stmt.c.student_name).outerjoin(stmt,
                                                                                                    stmt.c.instrument_name == Instrument.name)
     return dict([(x.instrument_name, x.student_name is not None) for x in query.all()])
 
 
-def get_student_slot_availabilities(session, student_name) -> Dict[str, bool]:
+def get_student_slot_availabilities(session, student_name, program=DEFAULT_PROGRAM) -> Dict[str, bool]:
     """
     Get the list of slots, and for each one whether the student is available
     :param session:
     :param student_name:
+    :param program:
     :return:
     """
-    stmt = session.query(SlotAvailable).filter(SlotAvailable.student_name == student_name).subquery()
-    query = session.query(Slot.name.label('slot_name'), stmt.c.student_name).outerjoin(stmt,
-                                                                                       stmt.c.slot_name == Slot.name)
+    stmt = session.query(SlotAvailable).filter(SlotAvailable.program == program,
+                                               SlotAvailable.student_name == student_name).subquery()
+    query = session.query(Slot.name.label('slot_name'), stmt.c.student_name).outerjoin(
+        stmt, stmt.c.slot_name == Slot.name).filter(Slot.program == program)
     return dict([(x.slot_name, x.student_name is not None) for x in query.all()])
 
 
-def get_student_show_preferences(session, student_name) -> Dict[str, float]:
+def get_student_show_preferences(session, student_name, program=DEFAULT_PROGRAM) -> Dict[str, float]:
     """
     Get the show preferences for the student. Put zero if not found
     :param session:
     :param student_name:
+    :param program:
     :return:
     """
-    stmt = session.query(ShowPreference).filter(ShowPreference.student_name == student_name).subquery()
-    query = session.query(Show.name.label('show_name'), stmt.c.preference).outerjoin(stmt,
-                                                                                     stmt.c.show_name == Show.name)
+    stmt = session.query(ShowPreference).filter(ShowPreference.program == program,
+                                                ShowPreference.student_name == student_name).subquery()
+    query = session.query(Show.name.label('show_name'), stmt.c.preference).outerjoin(
+        stmt, stmt.c.show_name == Show.name).filter(Show.program == program)
     return dict([(x.show_name, x.preference if x.preference is not None else 0.0) for x in query.all()])
 
 
-def fill_student_form(form: StudentForm, session):
+def fill_student_form(form: StudentForm, session, program=DEFAULT_PROGRAM):
     """
     Fill the form according to what's in the database
     :param session:
     :param form:
+    :param program:
     :return:
     """
     student_name = form.name.data
-    instruments = get_student_instruments(session=session, student_name=student_name)
+    instruments = get_student_instruments(session=session, student_name=student_name, program=program)
     for instrument_name, student_plays in instruments.items():
         f = InstrumentIndicatorForm()
         f.instrument_name = instrument_name
         f.student_plays = student_plays
         form.instruments.append_entry(f)
 
-    slot_availabilities = get_student_slot_availabilities(session=session, student_name=student_name)
+    slot_availabilities = get_student_slot_availabilities(session=session, student_name=student_name,
+                                                          program=program)
     for slot_name, student_is_available in slot_availabilities.items():
         f = SlotAvailabilityForm()
         f.slot_name = slot_name
         f.student_is_available = student_is_available
         form.slot_availabilities.append_entry(f)
 
-    show_preferences = get_student_show_preferences(session=session, student_name=student_name)
+    show_preferences = get_student_show_preferences(session=session, student_name=student_name, program=program)
     for show_name, preference in show_preferences.items():
         f = ShowPreferenceForm()
         f.show_name = show_name
@@ -252,22 +299,22 @@ def fill_student_form(form: StudentForm, session):
         form.show_preferences.append_entry(f)
 
 
-def delete_student(student_name, session):
-    session.query(SlotAvailable).filter(SlotAvailable.student_name==student_name).delete()
-    session.query(StudentInstrument).filter(StudentInstrument.student_name==student_name).delete()
-    session.query(ShowPreference).filter(ShowPreference.student_name==student_name).delete()
-    session.query(Student).filter(Student.name == student_name).delete()
+def delete_student(student_name, session, program=DEFAULT_PROGRAM):
+    for model in [SlotAvailable, StudentInstrument, ShowPreference, StudentShowAssignment]:
+        session.query(model).filter(model.program==program, model.student_name==student_name).delete()
+    session.query(Student).filter(Student.program == program, Student.name == student_name).delete()
 
 
 
 @app.route('/edit_student', methods=['POST', 'GET'])
 def edit_student():
     form = StudentForm()
+    program = current_program()
     if form.validate_on_submit():
         if form.delete_student.data:
-            delete_student(student_name=form.name.data, session=db.session)
+            delete_student(student_name=form.name.data, session=db.session, program=program)
         else:
-            update_student(session=db.session, form=form)
+            update_student(session=db.session, form=form, program=program)
         db.session.commit()
         return redirect('/')
     else:
@@ -275,7 +322,7 @@ def edit_student():
         flash_errors(form)
 
     form.name.data = request.args.get('name')
-    fill_student_form(form=form, session=db.session)
+    fill_student_form(form=form, session=db.session, program=program)
     return render_template('edit_student.html', form=form, navitems=NAV_ITEMS, active_navitem="students")
 
 
@@ -289,27 +336,29 @@ def flash_errors(form):
             ))
 
 
-def save_student_form(form: StudentForm, session):
+def save_student_form(form: StudentForm, session, program=DEFAULT_PROGRAM):
     student_name = form.name.data
-    student = Student(name=student_name)
+    student = Student(name=student_name, program=program)
 
     instruments = []
     for f in form.instruments.entries:
         if f.data['student_plays']:
             instrument_name = f.data['instrument_name']
-            instruments.append(StudentInstrument(student_name=student_name, instrument_name=instrument_name))
+            instruments.append(StudentInstrument(student_name=student_name, instrument_name=instrument_name,
+                                                 program=program))
 
     show_preferences = []
     for f in form.show_preferences.entries:
         show_name = f.data['show_name']
         preference = float(f.data['preference'])
-        show_preferences.append(ShowPreference(show_name=show_name, student_name=student_name, preference=preference))
+        show_preferences.append(ShowPreference(show_name=show_name, student_name=student_name, preference=preference,
+                                               program=program))
 
     slot_availabilities = []
     for f in form.slot_availabilities.entries:
         if f.data['student_is_available']:
             slot_name = f.data['slot_name']
-            slot_availabilities.append(SlotAvailable(student_name=student_name, slot_name=slot_name))
+            slot_availabilities.append(SlotAvailable(student_name=student_name, slot_name=slot_name, program=program))
 
     session.add(student)
     session.add_all(instruments)
@@ -320,16 +369,17 @@ def save_student_form(form: StudentForm, session):
 @app.route('/add_student', methods=['POST', 'GET'])
 def add_student():
     form = StudentForm()
+    program = current_program()
     if form.validate_on_submit():
         if form.save_student.data:
-            save_student_form(form=form, session=db.session)
+            save_student_form(form=form, session=db.session, program=program)
             db.session.commit()
             return redirect('/')
     else:
         # noinspection PyTypeChecker
         flash_errors(form)
 
-    fill_student_form(form=form, session=db.session)
+    fill_student_form(form=form, session=db.session, program=program)
     return render_template('edit_student.html', form=form, navitems=NAV_ITEMS, active_navitem="students")
 
 
@@ -342,6 +392,33 @@ def build_show_form(form: ShowForm):
         form.instrument_min_max.append_entry(iform)
 
 
+def get_solver(stats: SearchStats = None):
+    """
+    The solve function picked in the app config
+    :param stats: filled with search progress, if the solver enumerates slot assignments
+    :return:
+    """
+    method = app.config['SOLVER_METHOD']
+    if method == 'parallel':
+        return partial(solve_parallel, n_workers=app.config['SOLVER_WORKERS'], stats=stats)
+    if method == 'highs':
+        return partial(solve_highs, stats=stats)
+    if method == 'matrix':
+        return partial(solve_matrix, stats=stats)
+    if method == 'heuristic':
+        return partial(solve_heuristic, stats=stats)
+    if method == 'enumerate':
+        return partial(solve, min_pref_solver=partial(solve_min_pref, fixed_day_solver=fixed_day_cache, stats=stats))
+    if method == 'anytime':
+        def solve_fn(conf):
+            result = solve_anytime(conf, time_limit=app.config['SOLVER_TIME_LIMIT'], gap=app.config['SOLVER_GAP'],
+                                   fixed_day_solver=fixed_day_cache, stats=stats)
+            return result.slot_assignment, result.solution
+
+        return solve_fn
+    return SOLVERS[method]
+
+
 class Assignment(object):
     """
     Data object to pass to template
@@ -353,36 +430,112 @@ class Assignment(object):
         self.slot_name = slot_name
 
 
-def run_optimization(session):
+def load_previous_assignments(session, program=DEFAULT_PROGRAM):
+    """
+    Read the saved results of the program's last run
+    :param session:
+    :param program:
+    :return: slot assignment or None if there are no saved results, student->show assignments
+    """
+    show_slots = dict([(x.show_name, x.slot_name) for x in
+                       session.query(ShowSlotAssignment).filter(ShowSlotAssignment.program == program).all()])
+    student_shows = dict([(x.student_name, x.show_name) for x in
+                          session.query(StudentShowAssignment).filter(StudentShowAssignment.program == program).all()])
+    return (SlotAssignment(d=show_slots) if show_slots else None), student_shows
+
+
+def run_optimization(session, incremental=False, program=DEFAULT_PROGRAM):
     """
     Solve for optimal assignments!
+    :param session:
+    :param incremental: start from the saved results of the last run, if any
+    :param program:
     :return:
     """
     # flash("here is where we solve for optimal solution, but now it's unimplemented")
-    conf = ConfigImp.load_from_db(session=session)
-    slot_assignment, optimal_solution = solve(conf)
+    conf = ConfigImp.load_from_db(session=session, program=program)
+    previous_slot_assignment, previous_assignments = load_previous_assignments(session=session, program=program)
+    if incremental and previous_slot_assignment is not None:
+        slot_assignment, optimal_solution, n_changed = solve_incremental(
+            conf=conf, previous_slot_assignment=previous_slot_assignment, previous_assignments=previous_assignments,
+            fixed_day_solver=fixed_day_cache)
+        flash('{} students changed shows'.format(n_changed))
+    else:
+        solve = get_solver()
+        slot_assignment, optimal_solution = solve(conf)
+    save_assignments(session=session, slot_assignment=slot_assignment, optimal_solution=optimal_solution,
+                     program=program)
+
+
+def submit_optimization(session, incremental=False, program=DEFAULT_PROGRAM) -> Job:
+    """
+    Queue a solve of the program's current config in the background, on the worker pool shared by all programs.
+    Results are saved when it's done
+    :param session:
+    :param incremental: start from the saved results of the last run, if any
+    :param program:
+    :return:
+    """
+    conf = ConfigImp.load_from_db(session=session, program=program)
+    previous_slot_assignment, previous_assignments = load_previous_assignments(session=session, program=program)
+    if incremental and previous_slot_assignment is not None:
+        return job_manager.submit_incremental(conf=conf, previous_slot_assignment=previous_slot_assignment,
+                                              previous_assignments=previous_assignments, on_done=save_job_results,
+                                              program=program, fixed_day_solver=fixed_day_cache)
+
+    def solve_fn(conf, stats):
+        return get_solver(stats=stats)(conf)
+
+    return job_manager.submit(conf=conf, solve_fn=solve_fn, on_done=save_job_results, program=program)
 
-    # save show-slot assignments
-    session.query(ShowSlotAssignment).delete()
-    for show_name, slot_name in slot_assignment.show_slots().items():
-        session.add(ShowSlotAssignment(show_name=show_name,slot_name=slot_name))
 
-    # save student-show assignments
-    session.query(StudentShowAssignment).delete()
-    for student_name, show_name in optimal_solution.student_show_assignment().items():
-        session.add(StudentShowAssignment(student_name=student_name,show_name=show_name))
+def save_job_results(job: Job):
+    """
+    Write a finished job's assignments in one transaction
+    :param job:
+    :return:
+    """
+    if job.slot_assignment is None:
+        raise ValueError('no feasible assignment')
+    with app.app_context():
+        save_assignments(session=db.session, slot_assignment=job.slot_assignment, optimal_solution=job.solution,
+                         program=job.program)
+        db.session.commit()
 
 
 @app.route('/assignments', methods=['POST', 'GET'])
 def assignments():
     form = AssignmentForm()
+    program = current_program()
     if form.validate_on_submit():
-        run_optimization(session=db.session)
-        db.session.commit()
+        job = submit_optimization(session=db.session, incremental=form.rerun.data, program=program)
+        return redirect(url_for('assignments', job=job.id))
+
+    job = get_program_job(request.args.get('job'), program=program)
+    if job is not None and job.status == Job.FAILED:
+        flash('optimization failed: {}'.format(job.error.strip().splitlines()[-1]))
+    if job is not None and job.status == Job.DONE and job.n_changed is not None:
+        flash('{} students changed shows'.format(job.n_changed))
+
+    version, rows = load_assignments(db.session, program=program)
+    asses = [Assignment(student_name=x.student_name, show_name=x.show_name, slot_name=x.slot_name) for x in rows]
+    return render_template('assignments.html', assignments=asses, version=version, form=form, job=job,
+                           navitems=NAV_ITEMS, active_navitem="assignments")
+
+
+def get_program_job(job_id, program=DEFAULT_PROGRAM) -> typing.Optional[Job]:
+    """
+    :param job_id:
+    :param program:
+    :return: the job, None if there is none or it belongs to another program
+    """
+    job = job_manager.get(job_id)
+    return job if job is not None and job.program == program else None
+
 
-    asses = []
-    slot_ass = dict([(x.show_name,x.slot_name) for x in db.session.query(ShowSlotAssignment).all()])
-    for show_ass in db.session.query(StudentShowAssignment).all():
-        asses.append(Assignment(student_name=show_ass.student_name, show_name=show_ass.show_name, slot_name=slot_ass[show_ass.show_name]))
-    return render_template('assignments.html', assignments=asses, form=form, navitems=NAV_ITEMS,
-                           active_navitem="assignments")
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_progress(job_id):
+    job = get_program_job(job_id, program=current_program())
+    if job is None:
+        abort(404)
+    return jsonify(job.progress())